@@ -0,0 +1,71 @@
+"""连接线图层与逐图元绘制的性能对比
+
+用法（在 src 目录下运行）:
+    python -m benchmarks.bench_connection_layer --edges 10000
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtCore import QRectF
+
+from editor.scene import NodeScene
+from nodes.base_nodes import InputNode, OutputNode
+from .flows import OUT_0, IN_0
+
+
+def build_scene(edge_count, columns=50):
+    """构建包含 edge_count 条连接线的场景（每对 Input/Output 节点一条）"""
+    scene = NodeScene()
+    for i in range(edge_count):
+        row, col = divmod(i, columns)
+        source = InputNode()
+        target = OutputNode()
+        scene.addItem(source)
+        scene.addItem(target)
+        source.setPos(col * 400, row * 80)
+        target.setPos(col * 400 + 220, row * 80 + 20)
+        scene.create_connection(source, target, OUT_0, IN_0)
+    return scene
+
+
+def time_render(scene, rect, repeat):
+    """把场景的 rect 区域渲染到图片，返回每次渲染的平均耗时（毫秒）"""
+    image = QImage(1920, 1080, QImage.Format_ARGB32_Premultiplied)
+    timings = []
+    for _ in range(repeat):
+        painter = QPainter(image)
+        start = time.perf_counter()
+        scene.render(painter, QRectF(image.rect()), rect)
+        timings.append(time.perf_counter() - start)
+        painter.end()
+    return sum(timings) / len(timings) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--edges', type=int, default=5000, help='连接线数量')
+    parser.add_argument('--repeat', type=int, default=5, help='每种模式的渲染次数')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    scene = build_scene(args.edges)
+    rect = scene.itemsBoundingRect()
+
+    # 只测量连接线的绘制开销，节点和网格保持不变
+    per_item = time_render(scene, rect, args.repeat)
+    scene.set_connection_layer_enabled(True)
+    layered = time_render(scene, rect, args.repeat)
+
+    print(f"连接线数量: {args.edges}")
+    print(f"逐图元绘制: {per_item:.1f} ms/帧")
+    print(f"图层批量绘制: {layered:.1f} ms/帧")
+    print(f"加速比: {per_item / layered:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""端口邻接表：旧的字符串端口名 + 列表与新的整数端口 id + 集合的对比
+
+用法（在 src 目录下运行）:
+    python -m benchmarks.bench_port_adjacency --connections 20000
+
+旧实现按 "out_0" / "in_3" 形式的端口名区分方向，连接线存放在列表里，
+每次查询端口位置都要 split('_') 再 int()，移除连接需要线性查找。
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+
+from editor.connection import Connection
+from model.graph import port_id
+from nodes.base_nodes import ProcessNode
+
+
+class LegacyPorts:
+    """旧实现的端口连接登记（仅用于对比）"""
+
+    def __init__(self):
+        self.connections_in = []
+        self.connections_out = []
+
+    def add_connection(self, connection, port_name):
+        if port_name.startswith('out_'):
+            self.connections_out.append(connection)
+        elif port_name.startswith('in_'):
+            self.connections_in.append(connection)
+
+    def remove_connection(self, connection, port_name):
+        if port_name.startswith('out_') and connection in self.connections_out:
+            self.connections_out.remove(connection)
+        elif port_name.startswith('in_') and connection in self.connections_in:
+            self.connections_in.remove(connection)
+
+    def connections_on(self, port_name):
+        index = int(port_name.split('_')[1])
+        connections = self.connections_out if port_name.startswith('out_') else self.connections_in
+        return [conn for conn in connections if int(conn.port_name.split('_')[1]) == index]
+
+
+class LegacyConnection:
+    __slots__ = ('port_name',)
+
+    def __init__(self, port_name):
+        self.port_name = port_name
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_legacy(count, ports, queries, order):
+    hub = LegacyPorts()
+    connections = [LegacyConnection(f"in_{i % ports}") for i in range(count)]
+    add = timed(lambda: [hub.add_connection(conn, conn.port_name) for conn in connections])
+    query = timed(lambda: [hub.connections_on(f"in_{i % ports}") for i in range(queries)])
+    remove = timed(lambda: [hub.remove_connection(connections[i], connections[i].port_name) for i in order])
+    return add, query, remove
+
+
+def run_indexed(count, ports, queries, order):
+    hub = ProcessNode()
+    for _ in range(ports - 1):
+        hub.add_input_port("input")
+    connections = []
+    for i in range(count):
+        connection = Connection()
+        connection.end_port = port_id(False, i % ports)
+        connections.append(connection)
+    add = timed(lambda: [hub.add_connection(conn, conn.end_port) for conn in connections])
+    query = timed(lambda: [hub.connections_on(port_id(False, i % ports)) for i in range(queries)])
+    remove = timed(lambda: [hub.remove_connection(connections[i], connections[i].end_port) for i in order])
+    return add, query, remove
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, default=20000, help='连接到同一节点的连接线数量')
+    parser.add_argument('--ports', type=int, default=8, help='该节点的输入端口数量')
+    parser.add_argument('--queries', type=int, default=1000, help='按端口查询连接线的次数')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    order = list(range(args.connections))
+    random.Random(0).shuffle(order)
+
+    legacy = run_legacy(args.connections, args.ports, args.queries, order)
+    indexed = run_indexed(args.connections, args.ports, args.queries, order)
+
+    print(f"连接线数量: {args.connections}，端口数量: {args.ports}")
+    print(f"{'操作':<10}{'旧实现(ms)':>14}{'新实现(ms)':>14}{'加速比':>10}")
+    for name, old, new in zip(('添加', '按端口查询', '移除'), legacy, indexed):
+        print(f"{name:<10}{old:>14.2f}{new:>14.2f}{old / max(new, 1e-6):>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
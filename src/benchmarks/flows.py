@@ -0,0 +1,164 @@
+"""基准测试用的合成流程"""
+import math
+import random
+
+from model.graph import bulk_update, port_id
+from nodes.base_nodes import node_class
+
+NODE_SPACING_X = 200  # 节点水平间距
+NODE_SPACING_Y = 90   # 节点垂直间距
+
+# 合成流程只使用每个节点的第一个端口
+OUT_0 = port_id(True, 0)
+IN_0 = port_id(False, 0)
+
+
+def chain_layout(node_count, chain_length=5):
+    """合成流程的布局
+
+    每条链为 Input -> Process ... -> Output，共 chain_length 个节点，
+    链与链在平面上排成近似正方形的网格。
+
+    Yields:
+        (节点类型, x, y, 是否为链的第一个节点)
+    """
+    chain_length = max(2, chain_length)
+    chain_count = max(1, math.ceil(node_count / chain_length))
+    # 让整体布局接近正方形
+    chains_per_column = max(1, round(math.sqrt(chain_count * chain_length * NODE_SPACING_X / NODE_SPACING_Y)))
+
+    remaining = node_count
+    for chain in range(chain_count):
+        length = min(chain_length, remaining)
+        if length <= 0:
+            break
+        remaining -= length
+        column, row = divmod(chain, chains_per_column)
+        origin_x = column * (chain_length + 1) * NODE_SPACING_X
+        origin_y = row * NODE_SPACING_Y
+        for i in range(length):
+            if i == 0:
+                node_type = 'Input'
+            elif i == length - 1:
+                node_type = 'Output'
+            else:
+                node_type = 'Process'
+            yield node_type, origin_x + i * NODE_SPACING_X, origin_y, i == 0
+
+
+def build_flow(scene, node_count, chain_length=5):
+    """在场景中构建由若干条链组成的流程（布局见 chain_layout）
+
+    Returns:
+        (nodes, connections)
+    """
+    nodes = []
+    connections = []
+    previous = None
+    for node_type, x, y, chain_start in chain_layout(node_count, chain_length):
+        node = node_class(node_type)()
+        node.setPos(x, y)
+        scene.addItem(node)
+        nodes.append(node)
+        if not chain_start and previous.ports_out and node.ports_in:
+            connections.append(scene.create_connection(previous, node, OUT_0, IN_0))
+        previous = node
+    scene.flush_connection_updates()
+    return nodes, connections
+
+
+def build_flow_model(graph, node_count, chain_length=5):
+    """只在 FlowGraph 模型中构建同样的流程（不创建任何 Qt 对象）
+
+    Returns:
+        graph
+    """
+    previous = None
+    with bulk_update():
+        for node_type, x, y, chain_start in chain_layout(node_count, chain_length):
+            record = graph.add_node(node_type, x=x, y=y)
+            if node_type != 'Input':
+                record.add_port(False, "input")
+            if node_type != 'Output':
+                record.add_port(True, "output")
+            if not chain_start:
+                graph.add_edge(previous.id, 0, record.id, 0)
+            previous = record
+    return graph
+
+
+def add_cross_connections(scene, nodes, count, seed=0):
+    """在场景中随机加入 count 条连接不同链的连接线（固定随机种子，可能形成环），让流程需要重新布局"""
+    rng = random.Random(seed)
+    sources = [node for node in nodes if node.ports_out]
+    targets = [node for node in nodes if node.ports_in]
+    for _ in range(count):
+        source = rng.choice(sources)
+        target = rng.choice(targets)
+        if source is not target:
+            scene.create_connection(source, target, OUT_0, IN_0)
+    scene.flush_connection_updates()
+
+
+def add_cross_edges(graph, count, seed=0):
+    """只在模型中加入同样的随机连接
+
+    Returns:
+        graph
+    """
+    rng = random.Random(seed)
+    sources = [record.id for record in graph.nodes.values() if record.outputs]
+    targets = [record.id for record in graph.nodes.values() if record.inputs]
+    for _ in range(count):
+        source = rng.choice(sources)
+        target = rng.choice(targets)
+        if source != target:
+            graph.add_edge(source, 0, target, 0)
+    return graph
+
+
+def _feedback_loops(types, count):
+    """在链上挑出 count 处连续的两个 Process 节点 (a, b)，按序号均匀分布"""
+    spots = [i for i in range(len(types) - 2)
+             if types[i] == 'Process' and types[i + 1] == 'Process' and types[i + 2] != 'Input']
+    if not spots or count <= 0:
+        return []
+    stride = max(1, len(spots) // count)
+    return spots[::stride][:count]
+
+
+def add_feedback_connections(scene, nodes, count):
+    """在场景中加入 count 处反馈环：链上的 a -> b 之外再连 b -> a（回边）和 a -> b 的下一个节点（分支）"""
+    for i in _feedback_loops([node.record.type for node in nodes], count):
+        a, b, c = nodes[i], nodes[i + 1], nodes[i + 2]
+        scene.create_connection(b, a, OUT_0, IN_0)
+        scene.create_connection(a, c, OUT_0, IN_0)
+    scene.flush_connection_updates()
+
+
+def add_feedback_edges(graph, count):
+    """只在模型中加入同样的反馈环
+
+    Returns:
+        graph
+    """
+    ids = list(graph.nodes)
+    for i in _feedback_loops([graph.nodes[node_id].type for node_id in ids], count):
+        a, b, c = ids[i], ids[i + 1], ids[i + 2]
+        graph.add_edge(b, 0, a, 0)
+        graph.add_edge(a, 0, c, 0)
+    return graph
+
+
+def add_hub_edges(graph):
+    """只在模型中把第一个节点（视图原点处的 Input）连到其余每个有输入端口的节点，构成连接极多的中心节点
+
+    Returns:
+        graph
+    """
+    hub = next(iter(graph.nodes))
+    with bulk_update():
+        for node_id, record in graph.nodes.items():
+            if node_id != hub and record.inputs:
+                graph.add_edge(hub, 0, node_id, 0)
+    return graph
@@ -0,0 +1,133 @@
+"""运行编辑器性能基准并与基线比较
+
+在 src 目录下运行:
+    python -m benchmarks.run                         # 默认规模，与 benchmarks/baseline.json 比较
+    python -m benchmarks.run --sizes 100 1000 100000
+    python -m benchmarks.run --only render_viewport grid_draw
+    python -m benchmarks.run --only model_build --sizes 1250000   # 纯模型，约 100 万条连接
+    python -m benchmarks.run --save-baseline         # 用本次结果覆盖基线
+
+结果以 JSON 写入 --output，最短耗时超过基线 (1 + tolerance) 倍的用例视为回归，
+此时进程以状态码 1 退出。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+
+from .suite import BENCHMARKS
+
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def run_benchmarks(names, sizes, repeat, log=print):
+    """运行指定的基准用例，返回 {"名称@规模": 统计结果}"""
+    results = {}
+    for name in names:
+        func = BENCHMARKS[name]
+        for size in sizes:
+            timings = func(size, repeat)
+            result = {
+                'size': size,
+                'repeat': len(timings),
+                'mean_ms': statistics.mean(timings) * 1000,
+                'median_ms': statistics.median(timings) * 1000,
+                'min_ms': min(timings) * 1000,
+                'max_ms': max(timings) * 1000,
+            }
+            results[f'{name}@{size}'] = result
+            log(f'{name:<20} {size:>8}  median {result["median_ms"]:10.2f} ms  min {result["min_ms"]:10.2f} ms')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较，返回 (比较结果列表, 是否存在回归)
+
+    使用最短耗时比较，它受系统噪声的影响最小。
+    """
+    rows = []
+    regressed = False
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            rows.append((key, result['min_ms'], None, None, 'new'))
+            continue
+        ratio = result['min_ms'] / base['min_ms'] if base['min_ms'] else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'REGRESSION'
+            regressed = True
+        elif ratio < 1 - tolerance:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((key, result['min_ms'], base['min_ms'], ratio, status))
+    return rows, regressed
+
+
+def environment():
+    """记录运行环境，便于解读结果"""
+    return {
+        'python': platform.python_version(),
+        'pyside6': PySide6.__version__,
+        'platform': platform.platform(),
+        'qpa': os.environ.get('QT_QPA_PLATFORM'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='编辑器性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='流程节点数量')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='只运行指定用例')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的重复次数')
+    parser.add_argument('--output', default='bench_results.json', help='结果 JSON 文件')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许相对基线变慢的比例')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(names, args.sizes, args.repeat)
+
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'结果已写入 {args.output}')
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f).get('results', {})
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': baseline}, f, indent=2, ensure_ascii=False)
+        print(f'基线已更新: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('没有基线文件，跳过比较（使用 --save-baseline 创建）')
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+    rows, regressed = compare(results, baseline, args.tolerance)
+    print()
+    print(f'{"用例":<28} {"本次(ms)":>12} {"基线(ms)":>12} {"比例":>8}  状态')
+    for key, current, base, ratio, status in rows:
+        base_text = f'{base:12.2f}' if base is not None else f'{"-":>12}'
+        ratio_text = f'{ratio:8.2f}' if ratio is not None else f'{"-":>8}'
+        print(f'{key:<28} {current:12.2f} {base_text} {ratio_text}  {status}')
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,646 @@
+"""编辑器核心的性能基准用例
+
+每个用例接收流程规模 size 和重复次数 repeat，返回每次测量的耗时（秒）。
+构建场景等准备工作不计入耗时。
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from PySide6.QtWidgets import QApplication, QGraphicsView
+from PySide6.QtCore import Qt, QPoint, QPointF, QRectF
+from PySide6.QtGui import QImage, QPainter, QWheelEvent
+from PySide6.QtTest import QTest
+
+from editor.scene import NodeScene
+from editor.view import NodeView
+from nodes.base_nodes import InputNode, OutputNode
+from model.graph import FlowGraph
+from model.flow_file import save_flow, load_flow
+from model.flow_binary import BinaryFlow, save_flow_binary, load_flow_binary
+from model.journal import FlowJournal
+from model.layout import layered_layout
+from model.search import SearchIndex
+from model.validation import FlowValidator
+from model.lineage import LineageTrace
+from model.runtime import FlowRuntime
+from .flows import (build_flow, build_flow_model, add_cross_connections, add_cross_edges,
+                    add_feedback_connections, add_feedback_edges, add_hub_edges, OUT_0, IN_0)
+
+VIEW_SIZE = (1920, 1080)  # 渲染基准使用的视口大小
+
+# 已注册的基准用例 {名称: 函数}
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册基准用例的装饰器"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def timed(func):
+    """执行 func 并返回耗时（秒）"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def make_view(scene):
+    """创建固定大小、已显示的视图"""
+    view = NodeView(scene)
+    view.resize(*VIEW_SIZE)
+    view.show()
+    QApplication.processEvents()
+    return view
+
+
+def fit_flow(view):
+    """缩放视图使整个流程可见"""
+    bounds = view.scene().itemsBoundingRect()
+    view.setSceneRect(bounds)
+    view.fitInView(bounds, Qt.KeepAspectRatio)
+
+
+def render_view(view):
+    """把视图的整个视口渲染到图片"""
+    image = QImage(view.viewport().size(), QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    view.render(painter, QRectF(image.rect()), view.viewport().rect())
+    painter.end()
+
+
+@benchmark('scene_construction')
+def bench_scene_construction(size, repeat):
+    timings = []
+    for _ in range(repeat):
+        scene = NodeScene()
+        timings.append(timed(lambda: build_flow(scene, size)))
+        scene.clear()
+    return timings
+
+
+@benchmark('render_viewport')
+def bench_render_viewport(size, repeat):
+    """缩放到整个流程可见后渲染整个视口"""
+    scene = NodeScene()
+    build_flow(scene, size)
+    view = make_view(scene)
+    fit_flow(view)
+    render_view(view)  # 预热缓存
+    timings = [timed(lambda: render_view(view)) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('render_connection_layer')
+def bench_render_connection_layer(size, repeat):
+    """与 render_viewport 相同，但启用连接线图层批量绘制"""
+    scene = NodeScene()
+    build_flow(scene, size)
+    scene.set_connection_layer_enabled(True)
+    view = make_view(scene)
+    view.setSceneRect(scene.itemsBoundingRect())
+    view.fitInView(scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+    render_view(view)
+    timings = [timed(lambda: render_view(view)) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('render_connection_layer_zoomed')
+def bench_render_connection_layer_zoomed(size, repeat):
+    """启用连接线图层，以原始比例显示流程的一角并重绘 20 次（只有少数连接线可见）"""
+    scene = NodeScene()
+    build_flow(scene, size)
+    scene.set_connection_layer_enabled(True)
+    view = make_view(scene)
+    view.centerOn(QPointF(VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2))
+    viewport = view.viewport()
+    viewport.repaint()
+
+    def repaint():
+        for _ in range(20):
+            viewport.repaint()
+
+    timings = [timed(repaint) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('drag_selection')
+def bench_drag_selection(size, repeat):
+    """选中全部节点后用鼠标拖动 10 步"""
+    scene = NodeScene()
+    nodes, _ = build_flow(scene, size)
+    view = make_view(scene)
+    viewport = view.viewport()
+    for node in nodes:
+        node.setSelected(True)
+
+    # 在第一个节点的主体上按下鼠标（避开端口）
+    anchor = nodes[0]
+    view.centerOn(anchor)
+    QApplication.processEvents()
+
+    def drag():
+        start = view.mapFromScene(anchor.scenePos() + QPointF(anchor.width / 2, anchor.height / 4))
+        QTest.mousePress(viewport, Qt.LeftButton, Qt.NoModifier, start)
+        for step in range(1, 11):
+            QTest.mouseMove(viewport, start + QPoint(step * 3, step * 2))
+            QApplication.processEvents()
+        QTest.mouseRelease(viewport, Qt.LeftButton, Qt.NoModifier, start + QPoint(30, 20))
+        QApplication.processEvents()
+
+    timings = [timed(drag) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('hover_dense_edges')
+def bench_hover_dense_edges(size, repeat):
+    """在密集的连接线束上移动鼠标 50 次（悬停命中检测）
+
+    size 个 Input 节点排成一列（每 100 个一轮重叠），全部连接到远处的 10 个
+    Output 节点，连接线在视口中央交织成一束。
+    关闭视口重绘，只测量鼠标事件分发和悬停命中检测本身。
+    """
+    scene = NodeScene()
+    targets = []
+    for i in range(10):
+        target = OutputNode()
+        target.setPos(1200, i * 90)
+        scene.addItem(target)
+        targets.append(target)
+    for i in range(size):
+        source = InputNode()
+        source.setPos(0, (i % 100) * 90)
+        scene.addItem(source)
+        scene.create_connection(source, targets[i % len(targets)], OUT_0, IN_0)
+    scene.flush_connection_updates()
+
+    view = make_view(scene)
+    viewport = view.viewport()
+    view.centerOn(QPointF(670, 300))
+    QApplication.processEvents()
+    view.setViewportUpdateMode(QGraphicsView.NoViewportUpdate)
+
+    def hover():
+        for step in range(50):
+            QTest.mouseMove(viewport, QPoint(viewport.width() // 2 - 100 + step * 4,
+                                             viewport.height() // 2 + (step % 10) * 6))
+            QApplication.processEvents()
+
+    hover()  # 预热
+    timings = [timed(hover) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('delete_selected')
+def bench_delete_selected(size, repeat):
+    """删除一半节点（连同它们的连接线）"""
+    timings = []
+    for _ in range(repeat):
+        scene = NodeScene()
+        nodes, _ = build_flow(scene, size)
+        for node in nodes[::2]:
+            node.setSelected(True)
+        timings.append(timed(scene.delete_selected))
+        scene.clear()
+    return timings
+
+
+@benchmark('undo_redo_delete')
+def bench_undo_redo_delete(size, repeat):
+    """撤销再重做"删除一半节点"（恢复并再次删除节点和连接线图元）"""
+    timings = []
+    for _ in range(repeat):
+        scene = NodeScene()
+        nodes, _ = build_flow(scene, size)
+        for node in nodes[::2]:
+            node.setSelected(True)
+        scene.delete_selected()
+
+        def undo_redo():
+            scene.undo_stack.undo()
+            scene.undo_stack.redo()
+
+        timings.append(timed(undo_redo))
+        scene.clear()
+    return timings
+
+
+@benchmark('paste')
+def bench_paste(size, repeat):
+    """在已有 size 个节点的场景中执行 20 次粘贴"""
+    scene = NodeScene()
+    nodes, _ = build_flow(scene, size)
+    nodes[0].copy_to_clipboard()
+
+    def paste():
+        for _ in range(20):
+            scene.paste_from_clipboard()
+
+    timings = [timed(paste) for _ in range(repeat)]
+    QApplication.clipboard().clear()
+    return timings
+
+
+@benchmark('paste_selection')
+def bench_paste_selection(size, repeat):
+    """复制 size 个节点（连同它们之间的连接）后整体粘贴一次"""
+    timings = []
+    for _ in range(repeat):
+        scene = NodeScene()
+        view = make_view(scene)
+        nodes, _ = build_flow(scene, size)
+        for node in nodes:
+            node.setSelected(True)
+        scene.copy_selection()
+        timings.append(timed(scene.paste_from_clipboard))
+        view.close()
+        scene.clear()
+    QApplication.clipboard().clear()
+    return timings
+
+
+def run_zoom_steps(size, repeat, **options):
+    """通过 wheelEvent 放大 5 步再缩小 5 步，每步都重绘视口（处于交互模式）"""
+    scene = NodeScene()
+    build_flow(scene, size)
+    view = make_view(scene)
+    fit_flow(view)
+    view.set_interaction_options(smooth_zoom=False, **options)  # 每一格立即缩放，便于计时
+    viewport = view.viewport()
+    center = QPointF(viewport.width() / 2, viewport.height() / 2)
+
+    def wheel(delta):
+        event = QWheelEvent(center, view.mapToGlobal(center), QPoint(0, 0), QPoint(0, delta),
+                            Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False)
+        view.wheelEvent(event)
+        viewport.repaint()
+
+    def zoom():
+        for _ in range(5):
+            wheel(120)
+        for _ in range(5):
+            wheel(-120)
+
+    timings = []
+    for _ in range(repeat):
+        timings.append(timed(zoom))
+        view.end_interaction()
+    view.close()
+    return timings
+
+
+@benchmark('zoom_steps')
+def bench_zoom_steps(size, repeat):
+    """通过 wheelEvent 放大 5 步再缩小 5 步，每步都重绘视口
+
+    保持引入交互模式之前的测量方式（默认视图位置、每格立即缩放、完整质量绘制），
+    与历史基线可比。
+    """
+    scene = NodeScene()
+    build_flow(scene, size)
+    view = make_view(scene)
+    view.set_interaction_options(smooth_zoom=False)
+    viewport = view.viewport()
+    center = QPointF(viewport.width() / 2, viewport.height() / 2)
+
+    def wheel(delta):
+        event = QWheelEvent(center, view.mapToGlobal(center), QPoint(0, 0), QPoint(0, delta),
+                            Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False)
+        view.wheelEvent(event)
+        view.end_interaction()  # 不使用交互模式的降级绘制
+        viewport.repaint()
+
+    def zoom():
+        for _ in range(5):
+            wheel(120)
+        for _ in range(5):
+            wheel(-120)
+
+    timings = [timed(zoom) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('zoom_steps_interactive')
+def bench_zoom_steps_interactive(size, repeat):
+    """从显示整个流程的视图开始，交互模式下逐格缩放（降低绘制质量）"""
+    return run_zoom_steps(size, repeat)
+
+
+@benchmark('zoom_steps_snapshot')
+def bench_zoom_steps_snapshot(size, repeat):
+    """交互模式下逐格缩放，只变换绘制交互开始时的视口快照"""
+    return run_zoom_steps(size, repeat, snapshot=True)
+
+
+@benchmark('zoom_steps_full_quality')
+def bench_zoom_steps_full_quality(size, repeat):
+    """不进入交互模式，以完整质量逐格缩放（对照组）"""
+    scene = NodeScene()
+    build_flow(scene, size)
+    view = make_view(scene)
+    fit_flow(view)
+    viewport = view.viewport()
+
+    def zoom():
+        for factor in [1.25] * 5 + [0.8] * 5:
+            view.zoom_by(factor)
+            viewport.repaint()
+
+    timings = [timed(zoom) for _ in range(repeat)]
+    view.close()
+    return timings
+
+
+@benchmark('grid_draw')
+def bench_grid_draw(size, repeat):
+    """在 4K 画布上以三种缩放比例绘制网格背景（与流程规模无关）"""
+    scene = NodeScene()
+    image = QImage(3840, 2160, QImage.Format_ARGB32_Premultiplied)
+
+    def draw():
+        for scale in (1.0, 0.5, 0.1):
+            painter = QPainter(image)
+            painter.scale(scale, scale)
+            scene.drawBackground(painter, QRectF(0, 0, image.width() / scale, image.height() / scale))
+            painter.end()
+
+    draw()  # 预热图块缓存
+    return [timed(draw) for _ in range(repeat)]
+
+
+@benchmark('model_build')
+def bench_model_build(size, repeat):
+    """只在 FlowGraph 模型中构建流程（无 Qt 图元；size=1250000 时约 100 万条连接）"""
+    return [timed(lambda: build_flow_model(FlowGraph(), size)) for _ in range(repeat)]
+
+
+@benchmark('model_remove_nodes')
+def bench_model_remove_nodes(size, repeat):
+    """在模型中删除一半节点（连同它们的连接）"""
+    timings = []
+    for _ in range(repeat):
+        graph = build_flow_model(FlowGraph(), size)
+        doomed = list(graph.nodes)[::2]
+
+        def remove():
+            for node_id in doomed:
+                graph.remove_node(node_id)
+
+        timings.append(timed(remove))
+    return timings
+
+
+@benchmark('layout_model')
+def bench_layout_model(size, repeat):
+    """在模型上计算分层布局（另有 size/5 条随机的跨链连接和 size/50 处带分支的反馈环）"""
+    graph = add_cross_edges(build_flow_model(FlowGraph(), size), size // 5)
+    add_feedback_edges(graph, size // 50)
+    return [timed(lambda: layered_layout(graph)) for _ in range(repeat)]
+
+
+@benchmark('auto_layout')
+def bench_auto_layout(size, repeat):
+    """对场景中的整个流程执行自动布局（计算布局并移动全部节点图元；连接同 layout_model）"""
+    scene = NodeScene()
+    nodes, _ = build_flow(scene, size)
+    add_cross_connections(scene, nodes, size // 5)
+    add_feedback_connections(scene, nodes, size // 50)
+    origins = {node.node_id: (node.x(), node.y()) for node in nodes}
+    timings = []
+    for _ in range(repeat):
+        scene.move_nodes(origins)
+        timings.append(timed(scene.auto_layout))
+    scene.clear()
+    return timings
+
+
+SEARCH_QUERIES = ['process', 'proc', 'cess', '4242', '42', '7', 'output 99', 'input', 'xyz', 'any']
+
+
+@benchmark('search_nodes')
+def bench_search_nodes(size, repeat):
+    """在已建好的搜索索引上依次执行 10 个查询（前缀、子串、多词；每个节点的标题不同）"""
+    graph = build_flow_model(FlowGraph(), size)
+    for record in graph.nodes.values():
+        record.title = f"{record.type} {record.id}"
+    index = SearchIndex()
+    index.rebuild(graph)
+
+    def search():
+        for query in SEARCH_QUERIES:
+            index.search(query)
+
+    return [timed(search) for _ in range(repeat)]
+
+
+@benchmark('validate_flow')
+def bench_validate_flow(size, repeat):
+    """全量校验整个流程（另有 size/5 条随机的跨链连接，其中一部分会形成环）"""
+    graph = add_cross_edges(build_flow_model(FlowGraph(), size), size // 5)
+    validator = FlowValidator(graph)
+    return [timed(validator.validate) for _ in range(repeat)]
+
+
+@benchmark('lineage_trace')
+def bench_lineage_trace(size, repeat):
+    """从中间的节点追踪上下游血缘（另有 size 条随机的跨链连接，结果覆盖流程的大部分）"""
+    graph = add_cross_edges(build_flow_model(FlowGraph(), size), size)
+    node_id = list(graph.nodes)[size // 2]
+    return [timed(lambda: LineageTrace(graph, node_id).run()) for _ in range(repeat)]
+
+
+@benchmark('flow_runtime')
+def bench_flow_runtime(size, repeat):
+    """在 10 个节点的线性流程上执行 size 条整数消息（每个 Process 节点加一）
+
+    吞吐量为 size / 耗时；size 为 10000 时耗时低于 100 ms 即达到每秒 10 万条消息。
+    这个吞吐量依赖默认的分批传递（每批 256 条）：batch_size=1 时每条消息都单独经过
+    队列和任务切换，只有每秒约 3-4 万条。
+    """
+    graph = build_flow_model(FlowGraph(), 10, chain_length=10)
+    source = next(iter(graph.nodes))
+    runtime = FlowRuntime(graph, {'Process': lambda message: message + 1})
+    return [timed(lambda: runtime.execute({source: range(size)})) for _ in range(repeat)]
+
+
+def run_load_flow(size, repeat, attribute):
+    """保存一个 size 规模的流程文件，计时 scene.load_flow 直到 loader 的 attribute 被设置"""
+    graph = build_flow_model(FlowGraph(), size)
+    fd, path = tempfile.mkstemp(suffix='.flow')
+    os.close(fd)
+    try:
+        # 保存时的显示区域：流程开头部分，缩放比例 1
+        save_flow(graph, path, {'center': [VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2], 'scale': 1.0})
+        scene = NodeScene()
+        view = make_view(scene)
+        timings = []
+        for _ in range(repeat):
+            loader = scene.load_flow(path, view)
+            while getattr(loader, attribute) is None:
+                QApplication.processEvents()
+            timings.append(getattr(loader, attribute) / 1000)
+            loader.stop()
+            scene.clear()
+        return timings
+    finally:
+        os.remove(path)
+
+
+@benchmark('load_flow_first_frame')
+def bench_load_flow_first_frame(size, repeat):
+    """从文件加载流程，直到保存时的可见区域已创建并绘制（首帧可交互）"""
+    return run_load_flow(size, repeat, 'first_frame_ms')
+
+
+@benchmark('load_flow_full')
+def bench_load_flow_full(size, repeat):
+    """从文件加载流程，直到全部节点和连接线图元创建完毕"""
+    return run_load_flow(size, repeat, 'total_ms')
+
+
+def run_flow_file(size, repeat, save, load=None):
+    """在临时文件上计时保存（load 为 None 时）或加载 size 规模的流程模型"""
+    graph = build_flow_model(FlowGraph(), size)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        if load is None:
+            return [timed(lambda: save(graph, path)) for _ in range(repeat)]
+        save(graph, path)
+        return [timed(lambda: load(path)) for _ in range(repeat)]
+    finally:
+        os.remove(path)
+
+
+@benchmark('flow_save_json')
+def bench_flow_save_json(size, repeat):
+    """把流程模型保存为 JSON 流程文件"""
+    return run_flow_file(size, repeat, save_flow)
+
+
+@benchmark('flow_save_binary')
+def bench_flow_save_binary(size, repeat):
+    """把流程模型保存为二进制流程文件"""
+    return run_flow_file(size, repeat, save_flow_binary)
+
+
+@benchmark('flow_load_json')
+def bench_flow_load_json(size, repeat):
+    """从 JSON 流程文件加载完整的流程模型"""
+    return run_flow_file(size, repeat, save_flow, load_flow)
+
+
+@benchmark('flow_load_binary')
+def bench_flow_load_binary(size, repeat):
+    """从二进制流程文件加载完整的流程模型"""
+    return run_flow_file(size, repeat, save_flow_binary, load_flow_binary)
+
+
+@benchmark('flow_positions_binary')
+def bench_flow_positions_binary(size, repeat):
+    """mmap 打开二进制流程文件并读取全部节点位置（不构建模型）"""
+    def read_positions(path):
+        with BinaryFlow(path) as flow:
+            list(zip(flow.node_x.tolist(), flow.node_y.tolist()))
+
+    return run_flow_file(size, repeat, save_flow_binary, read_positions)
+
+
+@benchmark('journal_flush')
+def bench_journal_flush(size, repeat):
+    """在 size 规模的流程上移动 100 个节点、添加 10 个节点并连线后写出自动保存日志
+
+    与 flow_save_json / flow_save_binary 对比：耗时只与编辑量有关，与流程规模无关。
+    """
+    graph = build_flow_model(FlowGraph(), size)
+    directory = tempfile.mkdtemp()
+    journal = FlowJournal(directory)
+    try:
+        journal.reset(graph)
+        node_ids = list(graph.nodes)
+        timings = []
+        for _ in range(repeat):
+            for node_id in node_ids[:100]:
+                graph.move_node(node_id, 1.0, 2.0)
+                journal.node_moved(node_id)
+            for i in range(10):
+                record = graph.add_node('Process', x=i * 10.0, y=-100.0)
+                record.add_port(False, "input")
+                record.add_port(True, "output")
+                journal.node_added(record)
+                journal.edge_added(graph.add_edge(node_ids[0], 0, record.id, 0))
+            timings.append(timed(journal.flush))
+        return timings
+    finally:
+        journal.close()
+        shutil.rmtree(directory)
+
+
+@benchmark('virtual_first_frame')
+def bench_virtual_first_frame(size, repeat):
+    """在虚拟化模式下显示 size 个节点的模型，直到视口内的图元创建并绘制完毕"""
+    return _virtual_first_frame(size, repeat, hub=False)
+
+
+@benchmark('virtual_first_frame_hub')
+def bench_virtual_first_frame_hub(size, repeat):
+    """同 virtual_first_frame，但视口内的一个节点连到其余全部节点（远端只绘制连接，不创建图元）"""
+    return _virtual_first_frame(size, repeat, hub=True)
+
+
+def _virtual_first_frame(size, repeat, hub):
+    scene = NodeScene()
+    view = make_view(scene)
+    scene.set_virtualized(view)
+    timings = []
+    for _ in range(repeat):
+        # show_graph 会清空场景原来的模型，每轮使用新构建的模型
+        graph = build_flow_model(FlowGraph(), size)
+        if hub:
+            add_hub_edges(graph)
+        started = time.perf_counter()
+        loader = scene.show_graph(graph, view, {'center': [VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2], 'scale': 1.0},
+                                  started)
+        while loader.first_frame_ms is None:
+            QApplication.processEvents()
+        timings.append(loader.first_frame_ms / 1000)
+    view.close()
+    return timings
+
+
+@benchmark('virtual_pan')
+def bench_virtual_pan(size, repeat):
+    """虚拟化模式下向右平移 20 次（每次半个视口），每次都创建/回收图元并重绘视口"""
+    graph = build_flow_model(FlowGraph(), size)
+    scene = NodeScene()
+    view = make_view(scene)
+    scene.set_virtualized(view)
+    loader = scene.show_graph(graph, view, {'center': [VIEW_SIZE[0] / 2, VIEW_SIZE[1] / 2], 'scale': 1.0})
+    while loader.first_frame_ms is None:
+        QApplication.processEvents()
+    bar = view.horizontalScrollBar()
+    origin = bar.value()
+
+    def pan():
+        for _ in range(20):
+            bar.setValue(bar.value() + VIEW_SIZE[0] // 2)
+            scene.virtualizer.refresh()
+            view.viewport().repaint()
+
+    timings = []
+    for _ in range(repeat):
+        bar.setValue(origin)
+        scene.virtualizer.refresh()
+        timings.append(timed(pan))
+    view.close()
+    return timings
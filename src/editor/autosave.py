@@ -0,0 +1,58 @@
+import os
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from model.journal import FlowJournal
+
+AUTOSAVE_INTERVAL_MS = 2000          # 写出日志的间隔（毫秒）
+COMPACT_THRESHOLD = 4 * 1024 * 1024  # 日志段超过这个字节数时在后台合并为快照
+AUTOSAVE_DIR = os.path.join(os.path.expanduser('~'), '.node_editor', 'autosave')
+
+
+class Autosave(QObject):
+    """定时把场景的编辑日志写入自动保存目录
+
+    场景的模型编辑由 NodeScene.journal 记录，这里只负责定时 flush() 和触发压缩：
+    每次写出的只是上一轮的编辑，与流程规模无关；日志段过大时在后台线程合并为快照。
+    """
+    saved = Signal(int)  # 本次写出的字节数
+
+    def __init__(self, scene, directory=AUTOSAVE_DIR, interval_ms=AUTOSAVE_INTERVAL_MS,
+                 compact_threshold=COMPACT_THRESHOLD, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.journal = FlowJournal(directory)
+        self.compact_threshold = compact_threshold
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def start(self, resume=False):
+        """开始记录场景的编辑
+
+        Args:
+            resume: 场景中是刚由自动保存目录恢复的流程，在已有日志之后继续记录；
+                    否则以当前流程为起点重新开始
+        """
+        if resume:
+            self.journal.resume(self.scene.graph)
+        else:
+            self.journal.reset(self.scene.graph)
+        self.scene.journal = self.journal
+        self._timer.start()
+
+    def stop(self):
+        """写出剩余的编辑并停止记录"""
+        self._timer.stop()
+        if self.scene.journal is self.journal:
+            self.scene.journal = None
+        self.journal.close()
+
+    def flush(self):
+        """写出上一轮的编辑，日志段过大时开始后台压缩"""
+        written = self.journal.flush()
+        if written:
+            self.saved.emit(written)
+        if self.journal.segment_size() > self.compact_threshold:
+            self.journal.compact()
+        return written
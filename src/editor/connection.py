@@ -1,17 +1,51 @@
 import math
 from PySide6.QtWidgets import QGraphicsPathItem, QGraphicsItem, QMenu
 from PySide6.QtCore import Qt, QPointF
-from PySide6.QtGui import QPainterPath, QPen, QPainter, QColor, QBrush
+from PySide6.QtGui import QPainterPath, QPainterPathStroker, QPen, QPainter, QColor, QBrush
+from .lod import lod_level, is_interacting, LOD_MINIMAL, LOD_FULL
+from .profiler import profiler
+from model.graph import port_index, port_name, parse_port_name
 
 CONNECTION_COLORS = {
     'normal': QColor(158, 158, 158),         # 中灰色
     'hover': QColor(97, 97, 97),             # 深灰色
     'selected': QColor(33, 33, 33),          # 更深的灰色
     'invalid': QColor(244, 67, 54),          # 错误提示红色
-    'preview': QColor(189, 189, 189)         # 浅灰色预览
+    'preview': QColor(189, 189, 189),        # 浅灰色预览
+    'dimmed': QColor(158, 158, 158, 50)      # 血缘高亮时淡化的连接
 }
 
+# itemChange 中比较的枚举值（每次通过 QGraphicsItem 属性访问枚举都有可观的开销）
+_SCENE_CHANGE = QGraphicsItem.ItemSceneChange
+_SCENE_HAS_CHANGED = QGraphicsItem.ItemSceneHasChanged
+_CONNECTION_FLAGS = QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemSendsGeometryChanges
+
+# 各状态共用的画笔，避免每次绘制都新建 QPen
+_STATE_PENS = {}
+
+
+def connection_pen(state, cosmetic=False):
+    """获取指定视觉状态的连接线画笔（缓存复用）"""
+    key = (state, cosmetic)
+    pen = _STATE_PENS.get(key)
+    if pen is None:
+        pen = QPen(CONNECTION_COLORS[state])
+        pen.setCapStyle(Qt.RoundCap)  # 圆形线帽
+        pen.setJoinStyle(Qt.RoundJoin)  # 圆形连接
+        if cosmetic:
+            pen.setWidth(0)
+        else:
+            pen.setWidth(4 if state == 'selected' else 3)  # 选中时线条更粗
+        # 如果是预览状态,使用虚线样式
+        if state == 'preview':
+            pen.setStyle(Qt.DashLine)
+        _STATE_PENS[key] = pen
+    return pen
+
+
 class Connection(QGraphicsPathItem):
+    HIT_TOLERANCE = 2  # 命中检测时距离曲线的最大距离（与原先按画笔宽度描边的命中区域一致）
+    
     def __init__(self, start_item=None, end_item=None, parent=None):
         super().__init__(parent)
         
@@ -19,27 +53,29 @@ class Connection(QGraphicsPathItem):
         self.end_item = end_item
         self.start_pos = None
         self.end_pos = None
-        self.start_port_name = None
-        self.end_port_name = None
+        self.start_port = None  # 起始节点的输出端口 id
+        self.end_port = None    # 结束节点的输入端口 id
+        self.edge_id = None  # 模型中对应的连接 id（加入 NodeScene 后才有）
         
         # 设置连接状态颜色
         self.current_color = CONNECTION_COLORS['normal']
+        self.color_state = 'normal'
+        
+        # 是否由场景的连接线图层统一绘制
+        self.layer_managed = False
         
         # 设置线条样式
+        # 注意：实际绘制使用 connection_pen()，这支画笔只决定包围矩形和命中区域的宽度
         self._pen = QPen(self.current_color)
-        self._pen.setWidth(3)  # 增加线条宽度
+        self._pen.setWidth(self.HIT_TOLERANCE * 2)
         self._pen.setCapStyle(Qt.RoundCap)  # 圆形线帽
         self._pen.setJoinStyle(Qt.RoundJoin)  # 圆形连接
         self.setPen(self._pen)
         
         # 设置连线属性
-        self.setZValue(0)  # 确保连线在网格之上，节点之下
+        self.setZValue(-1)  # 确保连线在网格之上，节点之下
         self.setAcceptHoverEvents(True)
-        self.setFlag(QGraphicsItem.ItemIsSelectable)
-        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)  # 确保几何变化时得到通知
-        
-        # 设置连线为完全不透明
-        self.setOpacity(1.0)
+        self.setFlags(_CONNECTION_FLAGS)  # 可选择，并在几何变化时得到通知
         
         # 连接状态
         self.is_valid = True
@@ -48,47 +84,44 @@ class Connection(QGraphicsPathItem):
         # 箭头路径
         self._arrow_path = None
         
+        # 贝塞尔曲线本身（图元的 path() 还包含箭头，用于计算包围矩形）
+        self._curve_path = QPainterPath()
+        
+        # 命中检测形状缓存（在 updatePath 中失效）
+        self._hit_shape = None
+        
+    def itemChange(self, change, value):
+        """加入或离开场景时通知场景（用于连接线图层等索引）"""
+        if change == _SCENE_CHANGE:
+            old_scene = self.scene()
+            if old_scene is not None and hasattr(old_scene, '_detach_connection'):
+                old_scene._detach_connection(self)
+        elif change == _SCENE_HAS_CHANGED:
+            if value is not None and hasattr(value, '_attach_connection'):
+                value._attach_connection(self)
+        return value
+        
+    def reset(self):
+        """清除端点和状态（图元离开场景后由虚拟化场景复用）"""
+        self.start_item = self.end_item = None
+        self.start_pos = self.end_pos = None
+        self.start_port = self.end_port = None
+        self.edge_id = None
+        self.setSelected(False)
+        if not self.is_valid:
+            self.set_problem(None)
+        if self.color_state != 'normal':
+            self.set_state('normal')
+
     def set_state(self, state):
         """设置连接线状态及其对应的颜色"""
         if state in CONNECTION_COLORS:
             self.current_color = CONNECTION_COLORS[state]
+            self.color_state = state
             self._pen.setColor(self.current_color)
             self.setPen(self._pen)
             self.update()
             
-    def update_line(self):
-        """更新连接线位置"""
-        if not self.scene():
-            return
-            
-        try:
-            # 获取起点位置
-            if self.start_item and self.start_port_name:
-                port_num = int(self.start_port_name.split('_')[1])
-                new_start_pos = self.start_item.get_port_pos(True, port_num)
-                if new_start_pos:
-                    self.start_pos = new_start_pos
-                
-            # 获取终点位置
-            if self.end_item and self.end_port_name:
-                port_num = int(self.end_port_name.split('_')[1])
-                new_end_pos = self.end_item.get_port_pos(False, port_num)
-                if new_end_pos:
-                    self.end_pos = new_end_pos
-                
-            # 如果有效，更新路径
-            if self.start_pos and self.end_pos:
-                self.updatePath()
-            
-            # 强制更新视图
-            self.update()
-            if self.scene():
-                self.scene().update()
-                    
-        except (ValueError, IndexError, AttributeError) as e:
-            # 如果出现错误，保持现有位置不变
-            pass
-            
     def updatePath(self):
         """更新连线路径"""
         if not self.start_pos or not self.end_pos:
@@ -145,11 +178,20 @@ class Connection(QGraphicsPathItem):
         # 保存箭头路径
         self._arrow_path = arrow_path
         
+        # 图元的几何路径 = 曲线 + 箭头，包围矩形由 Qt 在 C++ 中计算并缓存，
+        # 不必每次查询都回调 Python
+        self._curve_path = path
+        self._hit_shape = None  # 命中形状在第一次需要时才重新计算
+        geometry = QPainterPath(path)
+        geometry.addPath(arrow_path)
+        
         # 设置最终路径
-        self.setPath(path)
+        self.setPath(geometry)
         
-        # 确保连线始终在节点下方
-        self.setZValue(-1)
+        # 通知连接线图层几何已变化
+        layer = getattr(self.scene(), 'connection_layer', None)
+        if layer is not None and self.layer_managed:
+            layer.connection_geometry_changed(self)
         
     def calculateEndAngle(self, ctrl_point, end_point):
         """计算曲线末端的切线角度"""
@@ -165,82 +207,128 @@ class Connection(QGraphicsPathItem):
         self.end_pos = pos
         self.updatePath()
 
-    def update_start_item(self, item, port_name=None):
-        """更新连线的起始节点和端口"""
+    def update_start_item(self, item, port=None):
+        """更新连线的起始节点和端口（端口 id 或 "out_0" 形式的名称）"""
         self.start_item = item
-        if port_name is not None:
-            self.start_port_name = port_name
+        if port is not None:
+            self.start_port = parse_port_name(port) if isinstance(port, str) else port
             self.update_line()
 
-    def update_end_item(self, item, port_name=None):
-        """更新连线的结束节点和端口"""
+    def update_end_item(self, item, port=None):
+        """更新连线的结束节点和端口（端口 id 或 "in_0" 形式的名称）"""
         self.end_item = item
-        if port_name is not None:
-            self.end_port_name = port_name
+        if port is not None:
+            self.end_port = parse_port_name(port) if isinstance(port, str) else port
             self.update_line()
         
+    @property
+    def start_port_name(self):
+        """起始端口的名称（用于显示和序列化）"""
+        return port_name(self.start_port) if self.start_port is not None else None
+        
+    @start_port_name.setter
+    def start_port_name(self, name):
+        self.start_port = parse_port_name(name) if name else None
+        
+    @property
+    def end_port_name(self):
+        """结束端口的名称（用于显示和序列化）"""
+        return port_name(self.end_port) if self.end_port is not None else None
+        
+    @end_port_name.setter
+    def end_port_name(self, name):
+        self.end_port = parse_port_name(name) if name else None
+        
     def update_line(self):
         """更新连线的路径"""
-        if self.start_item and self.start_port_name:
-            port_index = int(self.start_port_name.split('_')[1])
-            self.start_pos = self.start_item.get_port_pos(True, port_index)
+        if self.start_item and self.start_port is not None:
+            self.start_pos = self.start_item.get_port_pos(True, port_index(self.start_port))
             
-        if self.end_item and self.end_port_name:
-            port_index = int(self.end_port_name.split('_')[1])
-            self.end_pos = self.end_item.get_port_pos(False, port_index)
+        if self.end_item and self.end_port is not None:
+            self.end_pos = self.end_item.get_port_pos(False, port_index(self.end_port))
             
         if self.start_pos and self.end_pos:
             self.updatePath()
         
+    def curve_path(self):
+        """连接线的贝塞尔曲线（不含箭头）"""
+        return self._curve_path
+        
+    def shape(self):
+        """描边后的命中形状（缓存，路径变化时才重新计算）"""
+        if self._hit_shape is None:
+            stroker = QPainterPathStroker()
+            stroker.setWidth(self.HIT_TOLERANCE * 2)
+            stroker.setCapStyle(Qt.RoundCap)
+            shape = stroker.createStroke(self._curve_path)
+            if self._arrow_path is not None:
+                shape.addPath(self._arrow_path)
+            shape.setFillRule(Qt.WindingFill)
+            self._hit_shape = shape
+        return self._hit_shape
+        
+    def contains(self, point):
+        """点命中测试（悬停、右键菜单）直接使用缓存的命中形状"""
+        shape = self._hit_shape if self._hit_shape is not None else self.shape()
+        return shape.contains(point)
+        
+    def visual_state(self, lineage=None):
+        """返回连接线当前的视觉状态（对应 CONNECTION_COLORS 的键）
+        
+        Args:
+            lineage: 场景当前高亮的血缘（LineageTrace），不在其中的连接为 'dimmed'
+        """
+        if self.isSelected():
+            return 'selected'
+        if lineage is not None and self.edge_id not in lineage.edges:
+            return 'dimmed'
+        if not self.is_valid:
+            return 'invalid'
+        if self.is_preview:
+            return 'preview'
+        return self.color_state
+        
     def paint(self, painter: QPainter, option, widget=None):
+        # 由连接线图层统一绘制时，自身不再绘制
+        if self.layer_managed:
+            return
+            
         if self.start_pos and self.end_pos:
-            # 设置抗锯齿
-            painter.setRenderHint(QPainter.Antialiasing)
+            level = lod_level(painter, option, widget)
             
-            # 根据状态选择颜色
-            if self.isSelected():
-                color = CONNECTION_COLORS['selected']
-                line_width = 3
-            elif not self.is_valid:
-                color = CONNECTION_COLORS['invalid']
-                line_width = 2
-            elif self.is_preview:
-                color = CONNECTION_COLORS['preview']
-                line_width = 2
-            else:
-                color = self.current_color
-                line_width = 2
+            # 设置抗锯齿（缩得很小或正在缩放/平移时关闭）
+            painter.setRenderHint(QPainter.Antialiasing,
+                                  level != LOD_MINIMAL and not is_interacting(widget))
             
-            # 绘制主线条
-            main_pen = QPen(color)
-            main_pen.setWidth(3)  # 增加线条宽度为固定值3
-            main_pen.setCapStyle(Qt.RoundCap)  # 圆形线帽
-            main_pen.setJoinStyle(Qt.RoundJoin)  # 圆形连接
-            if self.isSelected():
-                main_pen.setWidth(4)  # 选中时线条更粗
+            # 根据状态选择画笔
+            state = self.visual_state(getattr(self.scene(), 'lineage', None))
             
-            # 如果是预览状态,使用虚线样式
-            if self.is_preview:
-                main_pen.setStyle(Qt.DashLine)
+            if level == LOD_MINIMAL:
+                # 缩得很小时用直线段代替贝塞尔曲线，不画箭头
+                painter.setPen(connection_pen(state, cosmetic=True))
+                painter.drawLine(self.start_pos, self.end_pos)
+                return
             
-            painter.setPen(main_pen)
-            painter.drawPath(self.path())
+            painter.setPen(connection_pen(state))
+            painter.drawPath(self._curve_path)
             
-            # 只有在非预览状态下才绘制箭头
-            if not self.is_preview and hasattr(self, '_arrow_path'):
+            # 只有在完整细节且非预览状态下才绘制箭头
+            if level == LOD_FULL and not self.is_preview and self._arrow_path is not None:
                 painter.setPen(Qt.NoPen)
-                painter.setBrush(QBrush(color))
+                painter.setBrush(CONNECTION_COLORS[state])
                 painter.drawPath(self._arrow_path)
                 
     def hoverEnterEvent(self, event):
         """鼠标悬停时改变颜色"""
         self.current_color = CONNECTION_COLORS['hover']
+        self.color_state = 'hover'
         self.update()
         super().hoverEnterEvent(event)
         
     def hoverLeaveEvent(self, event):
         """鼠标离开时恢复颜色"""
         self.current_color = CONNECTION_COLORS['normal']
+        self.color_state = 'normal'
         self.update()
         super().hoverLeaveEvent(event)
         
@@ -249,6 +337,12 @@ class Connection(QGraphicsPathItem):
         self.is_valid = valid
         self.update()
         
+    def set_problem(self, problem):
+        """设置校验问题：None 或 (严重程度, 说明文字)，有问题的连接以 'invalid' 状态显示"""
+        self.setToolTip(problem[1] if problem is not None else "")
+        if self.is_valid != (problem is None):
+            self.set_valid(problem is None)
+        
     def set_preview(self, is_preview):
         """设置是否为预览状态"""
         self.is_preview = is_preview
@@ -268,12 +362,20 @@ class Connection(QGraphicsPathItem):
             
     def delete(self):
         """删除连接线"""
+        scene = self.scene()
+        if hasattr(scene, 'remove_items'):
+            scene.remove_items([self])
+            return
         # 通知节点移除连接
         if self.start_item and hasattr(self.start_item, 'remove_connection'):
-            self.start_item.remove_connection(self, self.start_port_name)
+            self.start_item.remove_connection(self, self.start_port)
         if self.end_item and hasattr(self.end_item, 'remove_connection'):
-            self.end_item.remove_connection(self, self.end_port_name)
+            self.end_item.remove_connection(self, self.end_port)
             
         # 从场景中移除
         if self.scene():
             self.scene().removeItem(self)
+
+
+# 启用分析器时统计连接线绘制耗时
+profiler.register(Connection, 'paint', 'connections')
@@ -0,0 +1,147 @@
+from PySide6.QtWidgets import QGraphicsItem
+from PySide6.QtCore import Qt, QRectF, QLineF
+from PySide6.QtGui import QPainter, QPainterPath
+from .connection import CONNECTION_COLORS, connection_pen
+from .lod import lod_level, is_interacting, LOD_MINIMAL, LOD_FULL
+from .profiler import profiler
+
+# 绘制顺序：选中和悬停的连接线画在最上面
+STATE_ORDER = ('dimmed', 'normal', 'preview', 'invalid', 'hover', 'selected')
+
+
+class ConnectionLayer(QGraphicsItem):
+    """统一绘制所有连接线的场景图元
+
+    每条连接线仍然是独立的图元（负责选择、悬停和右键菜单），但不再自己绘制。
+    本图层按视觉状态把可见区域内的连接线分组，每组只设置一次画笔、调用一次绘制。
+    只重绘一部分时，通过场景的空间索引找出与重绘区域相交的连接线，不遍历全部连接线。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._connections = set()
+        self._bounds = QRectF()
+        self.bounds_stale = False  # 移除了位于边界上的连接线，边界可以收缩（由场景调用 refresh_bounds()）
+
+        # 与连接线处于同一层，位于节点之下
+        self.setZValue(-1)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # 需要 exposedRect
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setAcceptHoverEvents(False)
+
+    def add(self, connection):
+        """接管一条连接线的绘制"""
+        self._connections.add(connection)
+        connection.layer_managed = True
+        self.connection_geometry_changed(connection)
+
+    def remove(self, connection):
+        """归还连接线的绘制"""
+        if connection in self._connections:
+            self._connections.discard(connection)
+            connection.layer_managed = False
+            rect = connection.sceneBoundingRect()
+            self.update(rect)
+            # 完全在边界内部的连接线不影响边界；贴着边界的要重新计算（批量删除后只算一次）
+            inner = self._bounds.adjusted(1, 1, -1, -1)
+            if not inner.contains(rect):
+                self.bounds_stale = True
+
+    def clear(self):
+        """归还所有连接线的绘制"""
+        for connection in self._connections:
+            connection.layer_managed = False
+        self._connections.clear()
+        self.prepareGeometryChange()
+        self._bounds = QRectF()
+        self.bounds_stale = False
+
+    def refresh_bounds(self):
+        """按当前的连接线重新计算图层边界（例如批量删除之后）"""
+        self.bounds_stale = False
+        bounds = QRectF()
+        for connection in self._connections:
+            bounds = bounds.united(connection.sceneBoundingRect())
+        if bounds != self._bounds:
+            self.prepareGeometryChange()
+            self._bounds = bounds
+
+    def connections(self):
+        return set(self._connections)
+
+    def __len__(self):
+        return len(self._connections)
+
+    def connection_geometry_changed(self, connection):
+        """连接线路径变化后扩展图层边界（旧区域和新区域的重绘由连接线自身触发）"""
+        rect = connection.sceneBoundingRect()
+        if rect.isEmpty() or self._bounds.contains(rect):
+            return
+        self.prepareGeometryChange()
+        self._bounds = self._bounds.united(rect) if not self._bounds.isEmpty() else rect
+
+    def boundingRect(self):
+        return self._bounds
+
+    def paint(self, painter: QPainter, option, widget=None):
+        exposed = option.exposedRect
+        level = lod_level(painter, option, widget)
+
+        # 按视觉状态分组
+        scene = self.scene()
+        lineage = getattr(scene, 'lineage', None)
+        if exposed.contains(self._bounds):
+            # 整个图层都要重绘（例如显示整个流程）：不需要逐条判断相交
+            candidates = self._connections
+        else:
+            # 局部重绘：由场景的 BSP 索引找出相交的图元，再挑出本图层管理的连接线
+            managed = self._connections
+            candidates = [item for item in scene.items(exposed, Qt.IntersectsItemBoundingRect)
+                          if item in managed]
+        groups = {}
+        for connection in candidates:
+            if connection.start_pos is None or connection.end_pos is None:
+                continue
+            if not connection.isVisible():
+                continue
+            groups.setdefault(connection.visual_state(lineage), []).append(connection)
+
+        if not groups:
+            return
+
+        painter.setRenderHint(QPainter.Antialiasing,
+                              level != LOD_MINIMAL and not is_interacting(widget))
+        painter.setBrush(Qt.NoBrush)
+        for state in STATE_ORDER:
+            members = groups.get(state)
+            if not members:
+                continue
+
+            if level == LOD_MINIMAL:
+                # 缩得很小时一次画完所有直线段
+                painter.setPen(connection_pen(state, cosmetic=True))
+                painter.drawLines([QLineF(c.start_pos, c.end_pos) for c in members])
+                continue
+
+            path = QPainterPath()
+            for connection in members:
+                path.addPath(connection.curve_path())
+            painter.setPen(connection_pen(state))
+            painter.drawPath(path)
+
+            # 箭头同样合并成一条路径填充
+            if level == LOD_FULL and state != 'preview':
+                arrows = QPainterPath()
+                arrows.setFillRule(Qt.WindingFill)  # 重叠的箭头不会互相抵消
+                for connection in members:
+                    if connection._arrow_path is not None and not connection.is_preview:
+                        arrows.addPath(connection._arrow_path)
+                if not arrows.isEmpty():
+                    painter.setPen(Qt.NoPen)
+                    painter.setBrush(CONNECTION_COLORS[state])
+                    painter.drawPath(arrows)
+                    painter.setBrush(Qt.NoBrush)
+
+
+# 启用分析器时统计连接线图层绘制耗时
+profiler.register(ConnectionLayer, 'paint', 'connections')
@@ -0,0 +1,124 @@
+import math
+from collections import OrderedDict
+from PySide6.QtCore import Qt, QRect, QPointF
+from PySide6.QtGui import QImage, QPainter, QPixmap, QColor
+
+
+class GridRenderer:
+    """网格背景渲染器
+
+    把一个可重复的网格图块预先渲染成位图，绘制时只需一次平铺填充。
+    缩放过小时会自动隐藏次要网格点，并逐级稀疏主网格点。
+    """
+    MIN_DOT_SPACING = 6   # 屏幕上相邻网格点的最小像素间距
+    MAX_TILES = 16        # 最多缓存的图块数量（按缩放级别区分）
+    SCALE_STEPS = 8       # 每两倍缩放划分的缓存档位数
+
+    def __init__(self, grid_size=20, grid_squares=5,
+                 color=QColor(240, 240, 240), color_main=QColor(220, 220, 220)):
+        self.grid_size = grid_size        # 网格大小
+        self.grid_squares = grid_squares  # 主网格间隔
+        self.color = QColor(color)        # 次要网格点颜色
+        self.color_main = QColor(color_main)  # 主网格点颜色
+        self._tiles = OrderedDict()       # {(缩放档位, dpr): (pixmap, 周期)}
+        self.tile_builds = 0              # 图块重建次数（用于调试）
+
+    def configure(self, grid_size=None, grid_squares=None, color=None, color_main=None):
+        """修改网格参数，只有参数真正变化时才丢弃已缓存的图块"""
+        changed = False
+        if grid_size is not None and grid_size != self.grid_size:
+            self.grid_size = grid_size
+            changed = True
+        if grid_squares is not None and grid_squares != self.grid_squares:
+            self.grid_squares = grid_squares
+            changed = True
+        if color is not None and QColor(color) != self.color:
+            self.color = QColor(color)
+            changed = True
+        if color_main is not None and QColor(color_main) != self.color_main:
+            self.color_main = QColor(color_main)
+            changed = True
+        if changed:
+            self._tiles.clear()
+        return changed
+
+    def layout_for_scale(self, scale):
+        """根据缩放比例计算网格点布局
+
+        Returns:
+            (show_minor, period): 是否绘制次要网格点，以及图块的周期（场景坐标）
+        """
+        major = self.grid_size * self.grid_squares
+        if self.grid_size * scale >= self.MIN_DOT_SPACING:
+            return True, major
+        # 次要网格点太密时只保留主网格点，必要时继续按 grid_squares 倍稀疏
+        step = major
+        while step * scale < self.MIN_DOT_SPACING:
+            step *= self.grid_squares
+        return False, step
+
+    def _scale_bucket(self, scale):
+        """把缩放比例量化到有限的档位上，避免每次缩放都生成新图块"""
+        if scale <= 0:
+            return 0
+        return round(math.log2(scale) * self.SCALE_STEPS)
+
+    def tile(self, scale, dpr=1.0):
+        """获取（必要时生成）指定缩放比例下的网格图块"""
+        key = (self._scale_bucket(scale), round(dpr, 2))
+        cached = self._tiles.get(key)
+        if cached is not None:
+            self._tiles.move_to_end(key)
+            return cached
+
+        bucket_scale = 2 ** (key[0] / self.SCALE_STEPS)
+        show_minor, period = self.layout_for_scale(bucket_scale)
+        tile_px = max(1, round(period * bucket_scale * dpr))
+        ratio = tile_px / period  # 图块像素与场景坐标的精确比例，平铺时不会累积误差
+
+        image = QImage(tile_px, tile_px, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        if show_minor:
+            count = self.grid_squares
+            for i in range(count):
+                px = round(i * self.grid_size * ratio)
+                for j in range(count):
+                    py = round(j * self.grid_size * ratio)
+                    # 位于主网格线上的点使用主网格颜色
+                    color = self.color_main if i == 0 or j == 0 else self.color
+                    painter.fillRect(QRect(px, py, 1, 1), color)
+        else:
+            painter.fillRect(QRect(0, 0, 1, 1), self.color_main)
+        painter.end()
+
+        pixmap = QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(ratio)
+        self.tile_builds += 1
+
+        self._tiles[key] = (pixmap, period)
+        while len(self._tiles) > self.MAX_TILES:
+            self._tiles.popitem(last=False)
+        return pixmap, period
+
+    def draw(self, painter: QPainter, rect):
+        """用一次平铺填充绘制网格"""
+        transform = painter.worldTransform()
+        scale = math.hypot(transform.m11(), transform.m12())
+        device = painter.device()
+        dpr = device.devicePixelRatioF() if device else 1.0
+
+        pixmap, period = self.tile(scale, dpr)
+
+        # 让图块与场景原点对齐
+        offset_x = math.fmod(rect.left(), period)
+        offset_y = math.fmod(rect.top(), period)
+        if offset_x < 0:
+            offset_x += period
+        if offset_y < 0:
+            offset_y += period
+
+        painter.save()
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        painter.drawTiledPixmap(rect, pixmap, QPointF(offset_x, offset_y))
+        painter.restore()
@@ -0,0 +1,38 @@
+# 细节层次（LOD）分级
+# 缩放得越小，节点和连接线在屏幕上占的像素越少，绘制文字和渐变就越浪费
+LOD_MINIMAL = 0   # 纯色矩形 / 直线段，无文字、端口和箭头
+LOD_REDUCED = 1   # 简化绘制，无文字、无渐变、无箭头
+LOD_FULL = 2      # 完整细节
+
+# 默认阈值（levelOfDetailFromTransform 的返回值，1.0 表示未缩放）
+DEFAULT_LOD_THRESHOLDS = {
+    'minimal': 0.35,  # 低于此值使用 LOD_MINIMAL
+    'reduced': 0.6,   # 低于此值使用 LOD_REDUCED
+}
+
+
+def lod_thresholds(widget):
+    """获取绘制目标视图上配置的 LOD 阈值
+
+    Args:
+        widget: paint() 收到的 widget，通常是视图的 viewport
+    """
+    view = widget.parentWidget() if widget is not None else None
+    return getattr(view, 'lod_thresholds', DEFAULT_LOD_THRESHOLDS)
+
+
+def is_interacting(widget):
+    """绘制目标视图是否正处于缩放/平移的交互模式"""
+    view = widget.parentWidget() if widget is not None else None
+    return getattr(view, 'interacting', False)
+
+
+def lod_level(painter, option, widget=None):
+    """根据当前变换计算应该使用的细节层次（交互模式下最多为 LOD_REDUCED）"""
+    lod = option.levelOfDetailFromTransform(painter.worldTransform())
+    thresholds = lod_thresholds(widget)
+    if lod < thresholds['minimal']:
+        return LOD_MINIMAL
+    if lod < thresholds['reduced'] or is_interacting(widget):
+        return LOD_REDUCED
+    return LOD_FULL
@@ -0,0 +1,127 @@
+import time
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from model.graph import port_id
+from nodes.base_nodes import node_class
+
+MATERIALIZE_BUDGET_MS = 8  # 每个空闲时间片内创建图元的最长耗时（毫秒）
+NODE_EXTENT = (140, 60)    # 判断节点是否可见时使用的节点大小
+
+
+class SceneMaterializer(QObject):
+    """按批为模型中的节点和连接创建场景图元
+
+    模型已经完整加载，图元在空闲时间片中分批创建：先创建视图将要显示的区域内的节点，
+    再按与视图中心的距离由近到远创建其余节点。连接线在两端节点都已创建时随之创建。
+    这样窗口在整个流程出现在画布上之前就可以操作。
+    """
+    progress = Signal(int, int)      # 已创建节点数, 节点总数
+    firstFrameReady = Signal(float)  # 可见区域已创建并绘制（距开始加载的毫秒数）
+    finished = Signal(float)         # 全部图元已创建（距开始加载的毫秒数）
+
+    def __init__(self, scene, view=None, started=None, budget_ms=MATERIALIZE_BUDGET_MS, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.view = view
+        self.started = time.perf_counter() if started is None else started
+        self.budget_ms = budget_ms
+        self.first_frame_ms = None  # 首帧可交互的耗时
+        self.total_ms = None        # 全部创建完毕的耗时
+        self.created = 0
+        self.total = 0
+        self._pending = deque()
+        self._visible_remaining = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        """确定创建顺序并开始在空闲时间片中创建图元"""
+        graph = self.scene.graph
+        rect = None
+        if self.view is not None:
+            rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+            if rect.isEmpty():
+                rect = None
+        if rect is not None:
+            center = rect.center()
+            cx, cy = center.x(), center.y()
+            # 记录保存的是节点左上角，可见范围向左上扩展一个节点大小
+            left, top = rect.left() - NODE_EXTENT[0], rect.top() - NODE_EXTENT[1]
+            right, bottom = rect.right(), rect.bottom()
+        else:
+            cx = cy = 0.0
+
+        # 可见区域内的节点排在最前，其余按与视图中心的距离由近到远
+        keys = []
+        for record in graph.nodes.values():
+            x, y = record.x, record.y
+            hidden = rect is None or not (left <= x <= right and top <= y <= bottom)
+            keys.append((hidden, (x - cx) ** 2 + (y - cy) ** 2, record.id))
+        keys.sort()
+        self._visible_remaining = sum(1 for hidden, _, _ in keys if not hidden)
+        self._pending = deque(node_id for _, _, node_id in keys)
+        self.total = len(self._pending)
+        self.created = 0
+        self._timer.start()
+
+    def stop(self):
+        """停止创建（剩余的节点不再创建图元）"""
+        self._timer.stop()
+        self._pending.clear()
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def _tick(self):
+        scene = self.scene
+        graph = scene.graph
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        pending = self._pending
+        while pending and time.perf_counter() < deadline:
+            record = graph.node(pending.popleft())
+            if record is None or scene.node_item(record.id) is not None:
+                # 加载期间已被删除，或已经有图元
+                continue
+            self._materialize(record)
+            self.created += 1
+            if self._visible_remaining:
+                self._visible_remaining -= 1
+                if not self._visible_remaining:
+                    break
+
+        self.progress.emit(self.created, self.total)
+        if self.first_frame_ms is None and not self._visible_remaining:
+            self._report_first_frame()
+        if not pending:
+            self._timer.stop()
+            scene.flush_connection_updates()
+            self.total_ms = (time.perf_counter() - self.started) * 1000
+            self.finished.emit(self.total_ms)
+
+    def _materialize(self, record):
+        """创建节点图元，并为两端都已存在的连接创建连接线"""
+        scene = self.scene
+        graph = scene.graph
+        node = node_class(record.type).from_record(record)
+        scene.addItem(node)
+        for port in record.port_ids():
+            for edge in graph.port_edges(record.id, port):
+                if scene.connection_item(edge.id) is not None:
+                    continue
+                source = scene.node_item(edge.source)
+                target = scene.node_item(edge.target)
+                if source is None or target is None:
+                    continue
+                scene.create_connection(source, target, port_id(True, edge.source_port),
+                                        port_id(False, edge.target_port), edge_id=edge.id)
+
+    def _report_first_frame(self):
+        """可见区域的图元已全部创建：立即绘制一帧并记录耗时"""
+        self.scene.flush_connection_updates()
+        if self.view is not None:
+            self.view.viewport().repaint()
+        self.first_frame_ms = (time.perf_counter() - self.started) * 1000
+        self.firstFrameReady.emit(self.first_frame_ms)
@@ -1,6 +1,19 @@
 from PySide6.QtWidgets import QGraphicsItem, QMenu, QApplication
 from PySide6.QtCore import Qt, QRectF, QPointF, QMimeData
-from PySide6.QtGui import QPainter, QPen, QBrush, QColor, QLinearGradient
+from PySide6.QtGui import QPainter, QPen, QBrush, QColor, QLinearGradient, QPixmap, QPainterPath
+from .lod import lod_level, LOD_MINIMAL, LOD_REDUCED
+from .render_cache import node_render_cache
+from .profiler import profiler
+from model.graph import NodeRecord, types_compatible, port_id, port_name, parse_port_name
+from model.validation import ERROR, WARNING
+from model.lineage import UPSTREAM, DOWNSTREAM, BOTH
+
+# itemChange 中比较的枚举值（每次通过 QGraphicsItem 属性访问枚举都有可观的开销）
+_POSITION_HAS_CHANGED = QGraphicsItem.ItemPositionHasChanged
+_SCENE_CHANGE = QGraphicsItem.ItemSceneChange
+_SCENE_HAS_CHANGED = QGraphicsItem.ItemSceneHasChanged
+_NODE_FLAGS = (QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsMovable
+               | QGraphicsItem.ItemSendsGeometryChanges | QGraphicsItem.ItemIsFocusable)
 
 # 节点主题颜色
 NODE_COLORS = {
@@ -29,38 +42,127 @@ NODE_COLORS = {
         'text': QColor('#CCCCCC')        # 浅灰色文字
     }
 }
+
+LINEAGE_DIM_OPACITY = 0.25  # 血缘高亮时结果之外的节点的不透明度
+
+# 校验问题标记的颜色
+PROBLEM_COLORS = {
+    ERROR: QColor('#D64541'),    # 红色
+    WARNING: QColor('#E0A030'),  # 琥珀色
+}
 import json
+import math
+
+
+def as_port_id(port):
+    """接受端口 id 或 "out_0" / "in_0" 形式的端口名（兼容旧接口），返回端口 id"""
+    if isinstance(port, str):
+        return parse_port_name(port)
+    return port
+
 
 class Node(QGraphicsItem):
     PORT_SIZE = 10  # 增大端口大小
     PORT_OFFSET = PORT_SIZE / 2  # 端口偏移量
     PORT_CLICK_RANGE = 15  # 增大端口点击检测范围
+    RENDER_CACHE_MAX_ZOOM = 4.0   # 超过该缩放倍数时不使用位图缓存
+    RENDER_CACHE_ZOOM_STEPS = 4   # 每两倍缩放划分的缓存档位数
     
     def __init__(self, title="Node", parent=None):
         super().__init__(parent)
-        self.title = title
+        # 节点的数据（标题、端口、属性、位置）保存在模型记录中，图元只负责显示和交互；
+        # 加入 NodeScene 时记录会登记到场景的 FlowGraph
+        node_type = self.__class__.__name__.replace('Node', '') or 'Node'
+        self.record = NodeRecord(node_type, title)
         self.width = 140  # 保持宽度
         self.height = 60  # 修改高度为60
-        self.ports_in = []         # 输入端口名称列表
-        self.ports_out = []        # 输出端口名称列表
-        self.port_types = {}       # 存储端口类型信息 {port_name: type_info}
         self.highlighted_port = None  # (is_output, index)
-        self.connections_in = []   # 存储输入连接
-        self.connections_out = []  # 存储输出连接
-        self.properties = {}       # 存储节点的自定义属性
+        self.connections = {}      # 各端口上的连接线 {port_id: {Connection, ...}}
+        self.use_render_cache = True  # 是否使用共享的外观位图缓存
+        self.problem = None        # 校验问题的严重程度（None 表示没有问题），由场景设置
         
-        # 设置标志以启用拖拽和选择
-        self.setFlag(QGraphicsItem.ItemIsSelectable)
-        self.setFlag(QGraphicsItem.ItemIsMovable)
+        # 可拖拽、可选择、可获得焦点，并发送几何变化通知
+        # （一次设置全部标志：每次 setFlag 都会经过两次 itemChange，粘贴或加载大量节点时很可观）
+        self.setFlags(_NODE_FLAGS)
         
         # 设置节点在连接线之上
         self.setZValue(1)
-        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)  # 确保几何变化通知
-        self.setFlag(QGraphicsItem.ItemIsFocusable)  # 启用焦点
         self.setAcceptHoverEvents(True)
         
-        # 创建上下文菜单
-        self.context_menu = QMenu()
+    @classmethod
+    def from_record(cls, record):
+        """创建绑定到已有模型记录的节点图元（标题、端口、属性和位置都来自记录）"""
+        node = cls()
+        node.record = record
+        node.setPos(record.x, record.y)
+        return node
+
+    def rebind(self, record):
+        """把不在场景中的图元改为绑定到另一条模型记录（虚拟化场景复用图元）"""
+        self.record = record
+        self.highlighted_port = None
+        self.connections = {}
+        self.problem = None
+        self.setToolTip("")
+        self.setSelected(False)
+        self.setPos(record.x, record.y)
+        self.prepareGeometryChange()
+        self.update()
+
+    @property
+    def node_id(self):
+        """模型中的节点 id（尚未加入场景时为 None）"""
+        return self.record.id
+        
+    @property
+    def title(self):
+        return self.record.title
+        
+    @title.setter
+    def title(self, title):
+        self.record.title = title
+        
+    @property
+    def ports_in(self):
+        """输入端口名称列表"""
+        return self.record.inputs
+        
+    @property
+    def ports_out(self):
+        """输出端口名称列表"""
+        return self.record.outputs
+        
+    @property
+    def connections_in(self):
+        """所有输入端口上的连接线"""
+        return [conn for port, conns in self.connections.items() if not port & 1 for conn in conns]
+        
+    @property
+    def connections_out(self):
+        """所有输出端口上的连接线"""
+        return [conn for port, conns in self.connections.items() if port & 1 for conn in conns]
+        
+    @property
+    def properties(self):
+        """节点的自定义属性"""
+        return self.record.properties
+        
+    @property
+    def port_types(self):
+        """端口类型信息 {port_name: type_info}（由模型中的端口类型列表生成）"""
+        types = {f"in_{i}": t for i, t in enumerate(self.record.input_types)}
+        types.update((f"out_{i}", t) for i, t in enumerate(self.record.output_types))
+        return types
+        
+    @port_types.setter
+    def port_types(self, types):
+        record = self.record
+        for name, port_type in types.items():
+            direction, _, index = name.partition('_')
+            index = int(index)
+            port_types = record.output_types if direction == 'out' else record.input_types
+            if 0 <= index < len(port_types):
+                port_types[index] = port_type
         
     def isPortHighlighted(self, is_output, index):
         return self.highlighted_port == (is_output, index)
@@ -73,19 +175,130 @@ class Node(QGraphicsItem):
         self.update()
         
     def boundingRect(self):
-        return QRectF(0, 0, self.width, self.height)
+        # 端口圆点伸出节点边缘，包围矩形需要包含它们，否则局部重绘会留下残影
+        margin = self.PORT_OFFSET + 2
+        return QRectF(-margin, -margin, self.width + 2 * margin, self.height + 2 * margin)
+        
+    def shape(self):
+        """命中检测形状：节点主体加上端口圆点"""
+        path = QPainterPath()
+        path.addRoundedRect(QRectF(0, 0, self.width, self.height), 12, 12)
+        for is_output, count in ((False, len(self.ports_in)), (True, len(self.ports_out))):
+            for i in range(count):
+                path.addEllipse(self.port_local_pos(is_output, i), self.PORT_OFFSET, self.PORT_OFFSET)
+        return path
     
     def paint(self, painter: QPainter, option, widget=None):
         # 获取节点颜色主题
         node_type = self.__class__.__name__.replace('Node', '')
         colors = NODE_COLORS.get(node_type, NODE_COLORS['default'])
+        bg_color = colors['bg_selected'] if self.isSelected() else colors['bg']
         
+        # 场景正在高亮血缘时淡化结果之外的节点（绘制前设置，位图缓存不受影响）
+        lineage = getattr(self.scene(), 'lineage', None)
+        if lineage is not None and self.record.id not in lineage.nodes:
+            painter.setOpacity(LINEAGE_DIM_OPACITY)
+        
+        # 根据缩放程度选择细节层次
+        level = lod_level(painter, option, widget)
+        if level == LOD_MINIMAL:
+            # 缩得很小时只画纯色矩形
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.fillRect(QRectF(0, 0, self.width, self.height), bg_color)
+        elif level == LOD_REDUCED:
+            # 中等缩放：纯色圆角矩形和端口，不画渐变和文字
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(colors['border'])
+            painter.setBrush(bg_color)
+            painter.drawRoundedRect(0, 0, self.width, self.height, 12, 12)
+            self.paint_ports(painter)
+        elif not (self.use_render_cache and self.paint_cached(painter, option, bg_color)):
+            # 完整细节：优先使用共享的位图缓存
+            self.paint_body(painter, colors, bg_color)
+            
+        if self.problem is not None:
+            # 问题标记不进入位图缓存（有问题的节点通常很少）
+            self.paint_problem(painter, level)
+            
+    def paint_problem(self, painter: QPainter, level):
+        """在右上角绘制校验问题标记"""
+        color = PROBLEM_COLORS[self.problem]
+        if level == LOD_MINIMAL:
+            painter.fillRect(QRectF(self.width - 24, 0, 24, 24), color)
+            return
+        painter.setRenderHint(QPainter.Antialiasing, level != LOD_REDUCED)
+        center = QPointF(self.width - 12, 12)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(color)
+        painter.drawEllipse(center, 7, 7)
+        if level != LOD_REDUCED:
+            painter.setPen(Qt.white)
+            font = painter.font()
+            font.setPointSize(8)
+            font.setBold(True)
+            painter.setFont(font)
+            painter.drawText(QRectF(center.x() - 7, center.y() - 7, 14, 14), Qt.AlignCenter, "!")
+            
+    def set_problem(self, problem):
+        """设置校验问题：None 或 (严重程度, 说明文字)"""
+        severity, text = problem if problem is not None else (None, "")
+        self.setToolTip(text)
+        if severity != self.problem:
+            self.problem = severity
+            self.update()
+        
+    def render_cache_key(self, zoom_bucket, dpr):
+        """节点外观的缓存键（第一、四项分别是节点类和标题，供失效时匹配）"""
+        return (self.__class__, self.isSelected(), self.highlighted_port, self.title,
+                zoom_bucket, dpr, len(self.ports_in), len(self.ports_out),
+                self.width, self.height)
+        
+    def paint_cached(self, painter: QPainter, option, bg_color):
+        """从缓存中绘制节点外观，返回 False 表示需要直接绘制"""
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod <= 0 or lod > self.RENDER_CACHE_MAX_ZOOM:
+            # 放得太大时位图会过大，直接绘制更划算
+            return False
+        device = painter.device()
+        dpr = round(device.devicePixelRatioF(), 2) if device else 1.0
+        zoom_bucket = round(math.log2(lod) * self.RENDER_CACHE_ZOOM_STEPS)
+        key = self.render_cache_key(zoom_bucket, dpr)
+        
+        pixmap = node_render_cache.get(key)
+        if pixmap is None:
+            pixmap = self.render_to_pixmap(2 ** (zoom_bucket / self.RENDER_CACHE_ZOOM_STEPS), dpr, bg_color)
+            node_render_cache.put(key, pixmap)
+            
+        margin = self.PORT_SIZE
+        painter.drawPixmap(QPointF(-margin, -margin), pixmap)
+        return True
+        
+    def render_to_pixmap(self, scale, dpr, bg_color):
+        """把节点外观渲染成位图（含端口伸出的边距）"""
+        margin = self.PORT_SIZE
+        ratio = scale * dpr
+        pixmap = QPixmap(math.ceil((self.width + 2 * margin) * ratio),
+                         math.ceil((self.height + 2 * margin) * ratio))
+        pixmap.fill(Qt.transparent)
+        
+        painter = QPainter(pixmap)
+        painter.scale(ratio, ratio)
+        painter.translate(margin, margin)
+        node_type = self.__class__.__name__.replace('Node', '')
+        self.paint_body(painter, NODE_COLORS.get(node_type, NODE_COLORS['default']), bg_color)
+        painter.end()
+        
+        # 让位图的逻辑尺寸等于场景尺寸
+        pixmap.setDevicePixelRatio(ratio)
+        return pixmap
+        
+    def paint_body(self, painter: QPainter, colors, bg_color):
+        """完整细节地绘制节点外观"""
         # 设置抗锯齿
         painter.setRenderHint(QPainter.Antialiasing)
         
         # 创建渐变背景
         gradient = QLinearGradient(0, 0, 0, self.height)
-        bg_color = colors['bg_selected'] if self.isSelected() else colors['bg']
         gradient.setColorAt(0, bg_color.lighter(110))
         gradient.setColorAt(1, bg_color)
         
@@ -111,27 +324,52 @@ class Node(QGraphicsItem):
         # 绘制标题文本（完全居中）
         painter.drawText(title_rect, Qt.AlignCenter, self.title)
         
-        # 计算中心线的y坐标
-        center_y = self.height / 2
-        
         # 绘制输入输出端口
-        for i, port in enumerate(self.ports_in):
-            port_pos = QPointF(0, center_y)  # 将端口放在左侧中心
-            # 绘制端口高亮效果
-            if self.isPortHighlighted(False, i):
-                painter.setBrush(QBrush(Qt.yellow))
-            else:
-                painter.setBrush(QBrush(Qt.white))
-            painter.drawEllipse(port_pos, self.PORT_SIZE/2, self.PORT_SIZE/2)
-            
-        for i, port in enumerate(self.ports_out):
-            port_pos = QPointF(self.width, center_y)  # 将端口放在右侧中心
-            # 绘制端口高亮效果
-            if self.isPortHighlighted(True, i):
-                painter.setBrush(QBrush(Qt.yellow))
-            else:
-                painter.setBrush(QBrush(Qt.white))
-            painter.drawEllipse(port_pos, self.PORT_SIZE/2, self.PORT_SIZE/2)
+        self.paint_ports(painter)
+        
+    def set_field(self, field, value):
+        """修改节点的标题、端口名称或自定义属性，返回旧值
+        
+        Args:
+            field: "title"、("port", is_output, 端口序号) 或 ("property", 属性名)
+        """
+        if field == "title":
+            old = self.title
+            self.title = value
+            # 旧标题对应的外观缓存已不再需要
+            self.invalidate_render_cache(old)
+        elif field[0] == "port":
+            _, is_output, index = field
+            ports = self.ports_out if is_output else self.ports_in
+            if not 0 <= index < len(ports):
+                return None
+            old = ports[index]
+            ports[index] = value
+            self.invalidate_render_cache()
+        else:
+            old = self.properties.get(field[1])
+            self.properties[field[1]] = value
+        # 通知场景（自动保存日志、撤销记录）
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'node_field_changed'):
+            scene.node_field_changed(self, field, old, value)
+        return old
+        
+    def invalidate_render_cache(self, title=None):
+        """丢弃该节点外观的缓存（标题或端口名被修改时调用）"""
+        node_render_cache.invalidate(self.__class__, self.title if title is None else title)
+        self.update()
+        
+    def paint_ports(self, painter: QPainter):
+        """绘制输入输出端口"""
+        for is_output, count in ((False, len(self.ports_in)), (True, len(self.ports_out))):
+            for i in range(count):
+                # 绘制端口高亮效果
+                if self.isPortHighlighted(is_output, i):
+                    painter.setBrush(QBrush(Qt.yellow))
+                else:
+                    painter.setBrush(QBrush(Qt.white))
+                painter.drawEllipse(self.port_local_pos(is_output, i), self.PORT_SIZE/2, self.PORT_SIZE/2)
             
     def add_input_port(self, name, port_type="any"):
         """添加输入端口
@@ -139,10 +377,8 @@ class Node(QGraphicsItem):
             name: 端口名称
             port_type: 端口类型 (例如: "number", "string", "any")
         """
-        self.ports_in.append(name)
-        port_name = f"in_{len(self.ports_in)-1}"
-        self.port_types[port_name] = port_type
-        self.update()
+        self.record.add_port(False, name, port_type)
+        self.ports_changed()
         
     def add_output_port(self, name, port_type="any"):
         """添加输出端口
@@ -150,174 +386,209 @@ class Node(QGraphicsItem):
             name: 端口名称
             port_type: 端口类型 (例如: "number", "string", "any")
         """
-        self.ports_out.append(name)
-        port_name = f"out_{len(self.ports_out)-1}"
-        self.port_types[port_name] = port_type
+        self.record.add_port(True, name, port_type)
+        self.ports_changed()
+        
+    def port_local_pos(self, is_output, index):
+        """端口在节点本地坐标中的位置（多个端口沿左右边缘均匀分布）"""
+        count = len(self.ports_out) if is_output else len(self.ports_in)
+        x = self.width if is_output else 0
+        # 只有一个端口时位于垂直中心
+        y = self.height * (index + 1) / (max(count, 1) + 1)
+        return QPointF(x, y)
+        
+    def ports_changed(self):
+        """端口增减后刷新外观、端口索引和已有连接线的位置"""
+        self.prepareGeometryChange()
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'port_index'):
+            scene.port_index.mark_dirty(self)
+            scene.node_ports_changed(self)
+        self.update_connections()
         self.update()
         
     def get_port_pos(self, is_output, index):
         """获取端口的位置（场景坐标）"""
         # 节点本地坐标中的端口位置
-        x = self.width if is_output else 0
-        y = self.height / 2  # 总是在垂直中心
+        local = self.port_local_pos(is_output, index)
         
         # 获取节点在场景中的位置
         node_pos = self.scenePos()
         
         # 计算端口在场景中的绝对位置
-        return QPointF(node_pos.x() + x, node_pos.y() + y)
+        return QPointF(node_pos.x() + local.x(), node_pos.y() + local.y())
         
     def get_port_at(self, pos):
         """获取指定位置的端口"""
         local_pos = self.mapFromScene(pos)
         port_radius = self.PORT_CLICK_RANGE  # 使用更大的检测范围
-        center_y = self.height / 2
         
-        # 检查输入端口（左侧中心）
-        port_pos = QPointF(0, center_y)
-        if (local_pos - port_pos).manhattanLength() < port_radius and len(self.ports_in) > 0:
-            return (False, 0)  # 只有一个输入端口
-                
-        # 检查输出端口（右侧中心）
-        port_pos = QPointF(self.width, center_y)
-        if (local_pos - port_pos).manhattanLength() < port_radius and len(self.ports_out) > 0:
-            return (True, 0)  # 只有一个输出端口
-                
-        return None
+        best = None
+        for is_output, count in ((False, len(self.ports_in)), (True, len(self.ports_out))):
+            for index in range(count):
+                distance = (local_pos - self.port_local_pos(is_output, index)).manhattanLength()
+                if distance < port_radius:
+                    port_radius = distance
+                    best = (is_output, index)
+        return best
         
     def get_port_at_pos(self, pos):
         """获取指定位置的端口名称"""
         port_info = self.get_port_at(pos)
         if port_info:
-            is_output, index = port_info
-            if is_output:
-                return f"out_{index}"
-            else:
-                return f"in_{index}"
+            return port_name(port_id(*port_info))
         return None
         
-    def get_port_position(self, port_name):
-        """获取指定端口名称的位置"""
-        if not port_name or not self.scene():
+    def port_pos(self, port):
+        """端口 id 对应的位置（场景坐标），端口不存在时返回 None"""
+        if port is None or not self.record.has_port(port):
             return None
-            
-        try:
-            if port_name.startswith('out_'):
-                index = int(port_name.split('_')[1])
-                if 0 <= index < len(self.ports_out):
-                    return self.get_port_pos(True, index)
-            elif port_name.startswith('in_'):
-                index = int(port_name.split('_')[1])
-                if 0 <= index < len(self.ports_in):
-                    return self.get_port_pos(False, index)
-        except ValueError:
-            pass
-            
-        return None
+        return self.get_port_pos(port & 1, port >> 1)
         
-    def add_connection(self, connection, port_name):
-        """添加连接线到节点"""
-        if port_name.startswith('out_'):
-            self.connections_out.append(connection)
-        elif port_name.startswith('in_'):
-            self.connections_in.append(connection)
-            
-    def remove_connection(self, connection, port_name):
-        """移除连接线"""
-        if port_name.startswith('out_') and connection in self.connections_out:
-            self.connections_out.remove(connection)
-        elif port_name.startswith('in_') and connection in self.connections_in:
-            self.connections_in.remove(connection)
+    def get_port_position(self, port):
+        """获取指定端口（端口 id 或端口名称）的位置"""
+        if port is None or port == '' or not self.scene():
+            return None
+        return self.port_pos(as_port_id(port))
+        
+    def add_connection(self, connection, port):
+        """把连接线登记到端口（端口 id 或端口名称）上"""
+        port = as_port_id(port)
+        if port is None:
+            return
+        connections = self.connections.get(port)
+        if connections is None:
+            self.connections[port] = {connection}
+        else:
+            connections.add(connection)
             
-    def update_connections(self):
-        """更新所有连接线"""
-        for connection in self.connections_out:
-            if hasattr(connection, 'update_line'):
-                connection.update_line()
-        for connection in self.connections_in:
-            if hasattr(connection, 'update_line'):
-                connection.update_line()
+    def remove_connection(self, connection, port):
+        """从端口上移除连接线"""
+        port = as_port_id(port)
+        connections = self.connections.get(port)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.connections[port]
                 
-    def can_connect_to(self, port_name, other_node, other_port_name):
-        """检查是否可以与另一个节点的端口建立连接"""
-        # 检查端口类型兼容性
-        if port_name not in self.port_types or other_port_name not in other_node.port_types:
-            return False
+    def connections_on(self, port):
+        """某个端口上的连接线集合（只读）"""
+        return self.connections.get(as_port_id(port), frozenset())
             
-        my_type = self.port_types[port_name]
-        other_type = other_node.port_types[other_port_name]
+    def can_connect_to(self, port, other_node, other_port):
+        """检查是否可以与另一个节点的端口建立连接"""
+        # 检查端口类型兼容性（"any" 与任何类型兼容，否则类型必须匹配）
+        return types_compatible(self.port_type(port), other_node.port_type(other_port))
         
-        # 如果任一端是 "any" 类型,则允许连接
-        if my_type == "any" or other_type == "any":
-            return True
-            
-        # 否则类型必须匹配
-        return my_type == other_type
+    def port_type(self, port):
+        """端口（端口 id 或端口名称）的类型，端口不存在时返回 None"""
+        port = as_port_id(port)
+        if port is None:
+            return None
+        return self.record.port_type_of(port)
         
-    def on_connection_made(self, port_name, connection):
+    def on_connection_made(self, port, connection):
         """当连接建立时调用"""
         # 检查连接的有效性
         if connection.start_item and connection.end_item:
             if connection.start_item.can_connect_to(
-                connection.start_port_name,
+                connection.start_port,
                 connection.end_item,
-                connection.end_port_name
+                connection.end_port
             ):
-                self.add_connection(connection, port_name)
+                self.add_connection(connection, port)
                 return True
             return False
         return True
             
     def itemChange(self, change, value):
         """当节点位置改变时更新连接线"""
-        if change == QGraphicsItem.ItemPositionChange:
-            if self.scene():
-                old_pos = self.pos()
-                new_pos = value
-                # 如果位置真的改变了才更新
-                if isinstance(new_pos, QPointF) and old_pos != new_pos:
-                    # 先更新所有连接线
-                    self.update_connections()
-                    
-        elif change == QGraphicsItem.ItemPositionHasChanged:
-            if self.scene():
-                # 确保连接线跟随更新
+        if change == _POSITION_HAS_CHANGED:
+            # 同步到模型记录
+            record = self.record
+            old_x, old_y = record.x, record.y
+            record.x = value.x()
+            record.y = value.y()
+            scene = self.scene()
+            if scene:
+                # 确保连接线跟随更新（由场景合并到下一帧统一计算）
                 self.update_connections()
+                if hasattr(scene, 'port_index'):
+                    scene.port_index.mark_dirty(self)
+                if hasattr(scene, 'node_moved'):
+                    scene.node_moved(self, old_x, old_y)
+                    
+        elif change == _SCENE_CHANGE:
+            # 离开旧场景时从场景的索引中移除
+            old_scene = self.scene()
+            if old_scene is not None and hasattr(old_scene, '_detach_node'):
+                old_scene._detach_node(self)
                 
-        # 返回新的值让节点移动
-        return super().itemChange(change, value)
+        elif change == _SCENE_HAS_CHANGED:
+            if value is not None and hasattr(value, '_attach_node'):
+                value._attach_node(self)
+                
+        # 返回新的值让节点移动（QGraphicsItem.itemChange 的默认实现就是原样返回）
+        return value
         
     def update_connections(self):
-        """更新所有连接线"""
-        for conn in self.connections_out + self.connections_in:
-            if hasattr(conn, 'update_line'):
-                conn.update_line()
-                if conn.scene():
-                    conn.scene().update()
+        """更新所有连接线
         
-    def update_connections(self):
-        """更新所有连接线"""
-        for conn in self.connections_out + self.connections_in:
+        在 NodeScene 中只把连接线标记为待更新，同一轮事件循环内
+        无论节点移动多少次，每条连接线只重新计算一次路径。
+        """
+        if not self.connections:
+            return
+        connections = [conn for conns in self.connections.values() for conn in conns]
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'mark_connections_dirty'):
+            scene.mark_connections_dirty(connections)
+            return
+        for conn in connections:
             if hasattr(conn, 'update_line'):
                 conn.update_line()
 
     def contextMenuEvent(self, event):
         """显示上下文菜单"""
-        self.context_menu.clear()
+        # 菜单在需要时才创建，不为每个节点常驻一个 QMenu
+        context_menu = QMenu()
         
         # 添加复制动作
-        copy_action = self.context_menu.addAction("复制")
+        copy_action = context_menu.addAction("复制")
         copy_action.triggered.connect(self.copy_to_clipboard)
         
         # 添加删除动作
-        delete_action = self.context_menu.addAction("删除")
+        delete_action = context_menu.addAction("删除")
         delete_action.triggered.connect(self.delete)
         
+        # 血缘追踪
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'trace_lineage'):
+            context_menu.addSeparator()
+            lineage_menu = context_menu.addMenu("追踪血缘")
+            for text, direction in (("上游和下游", BOTH), ("仅上游", UPSTREAM), ("仅下游", DOWNSTREAM)):
+                action = lineage_menu.addAction(text)
+                action.triggered.connect(lambda checked=False, d=direction: scene.trace_lineage(self.node_id, d))
+            if scene.lineage_active():
+                clear_action = context_menu.addAction("清除血缘高亮")
+                clear_action.triggered.connect(scene.cancel_lineage)
+        
         # 显示菜单
-        self.context_menu.exec_(event.screenPos())
+        context_menu.exec_(event.screenPos())
         
     def copy_to_clipboard(self):
-        """将节点数据复制到剪贴板"""
+        """将节点复制到剪贴板
+        
+        节点处于选中状态时复制整个选择（连同选中节点之间的连接），否则只复制该节点。
+        """
+        scene = self.scene()
+        if scene is not None and hasattr(scene, 'copy_nodes'):
+            if self.isSelected():
+                scene.copy_selection()
+            else:
+                scene.copy_nodes([self])
+            return
+            
         node_data = {
             'title': self.title,
             'ports_in': self.ports_in,
@@ -338,26 +609,22 @@ class Node(QGraphicsItem):
         
     def delete(self):
         """删除节点及其连接"""
-        # 先删除所有连接
-        connections_to_remove = self.connections_in + self.connections_out
-        for connection in connections_to_remove:
-            if connection.scene():
-                connection.scene().removeItem(connection)
-        
-        # 从场景中移除节点
-        if self.scene():
-            self.scene().removeItem(self)
+        scene = self.scene()
+        if scene is not None:
+            scene.remove_items([self])
             
     @classmethod
     def from_json(cls, data):
         """从JSON数据创建节点"""
         node = cls(title=data['title'])
         
-        # 恢复端口
-        for port_name in data['ports_in']:
-            node.add_input_port(port_name)
-        for port_name in data['ports_out']:
-            node.add_output_port(port_name)
+        # 恢复端口（替换子类 __init__ 中添加的默认端口，而不是追加在后面）
+        record = node.record
+        record.inputs = list(data['ports_in'])
+        record.outputs = list(data['ports_out'])
+        record.input_types = ["any"] * len(record.inputs)
+        record.output_types = ["any"] * len(record.outputs)
+        node.ports_changed()
             
         # 恢复端口类型
         node.port_types = data['port_types']
@@ -366,3 +633,7 @@ class Node(QGraphicsItem):
         node.setPos(data['pos_x'], data['pos_y'])
         
         return node
+
+
+# 启用分析器时统计节点绘制耗时
+profiler.register(Node, 'paint', 'nodes')
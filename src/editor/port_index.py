@@ -0,0 +1,109 @@
+import math
+
+
+class PortIndex:
+    """端口位置的空间哈希索引（场景坐标）
+
+    把每个端口放进边长为 cell_size 的网格桶中，查询"光标附近的端口"时
+    只需检查光标所在桶及其相邻的桶，而不必遍历光标下的所有图元。
+    节点移动、增删或端口变化时只需把该节点标记为待更新，查询前统一刷新。
+    """
+
+    def __init__(self, cell_size=30):
+        self.cell_size = cell_size
+        self._buckets = {}   # {(cx, cy): {(node, is_output, index): (x, y)}}
+        self._entries = {}   # {node: [(cell, key), ...]}
+        self._dirty = set()  # 等待重新计算端口位置的节点
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def mark_dirty(self, node):
+        """节点位置或端口发生变化，下次查询前重新登记"""
+        self._dirty.add(node)
+
+    def add_node(self, node):
+        self._dirty.add(node)
+
+    def remove_node(self, node):
+        """从索引中移除节点的所有端口"""
+        self._dirty.discard(node)
+        for cell, key in self._entries.pop(node, ()):
+            bucket = self._buckets.get(cell)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._buckets[cell]
+
+    def clear(self):
+        self._buckets.clear()
+        self._entries.clear()
+        self._dirty.clear()
+
+    def _reindex_node(self, node):
+        self.remove_node(node)
+        if node.scene() is None:
+            return
+        entries = []
+        for is_output, count in ((False, len(node.ports_in)), (True, len(node.ports_out))):
+            for index in range(count):
+                pos = node.get_port_pos(is_output, index)
+                x, y = pos.x(), pos.y()
+                cell = self._cell(x, y)
+                key = (node, is_output, index)
+                self._buckets.setdefault(cell, {})[key] = (x, y)
+                entries.append((cell, key))
+        self._entries[node] = entries
+
+    def flush(self):
+        """重新登记所有待更新节点的端口"""
+        if not self._dirty:
+            return
+        dirty = self._dirty
+        self._dirty = set()
+        for node in dirty:
+            self._reindex_node(node)
+
+    def port_at(self, pos, max_distance, is_output=None, exclude=None, accept=None):
+        """查找距离 pos 最近的端口（曼哈顿距离小于 max_distance）
+
+        Args:
+            pos: 场景坐标
+            max_distance: 最大检测距离
+            is_output: 只查找输出(True)或输入(False)端口，None 表示不限
+            exclude: 忽略该节点的端口
+            accept: 额外的过滤函数 accept(node, is_output, index) -> bool
+
+        Returns:
+            (node, is_output, index)，没有找到时返回 None
+        """
+        self.flush()
+        x, y = pos.x(), pos.y()
+        reach = max(1, math.ceil(max_distance / self.cell_size))
+        cx, cy = self._cell(x, y)
+
+        best = None
+        best_distance = max_distance
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                bucket = self._buckets.get((gx, gy))
+                if not bucket:
+                    continue
+                for key, (px, py) in bucket.items():
+                    distance = abs(px - x) + abs(py - y)
+                    if distance >= best_distance:
+                        continue
+                    node, port_is_output, index = key
+                    if node is exclude:
+                        continue
+                    if is_output is not None and port_is_output != is_output:
+                        continue
+                    if accept is not None and not accept(node, port_is_output, index):
+                        continue
+                    best = key
+                    best_distance = distance
+        return best
+
+    def __len__(self):
+        self.flush()
+        return sum(len(entries) for entries in self._entries.values())
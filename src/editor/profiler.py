@@ -0,0 +1,137 @@
+import csv
+import functools
+import time
+from collections import deque
+
+# 统计的耗时类别
+CATEGORIES = ('background', 'nodes', 'connections', 'mouse')
+
+
+class PaintProfiler:
+    """帧时间和绘制耗时分析器
+
+    启用时给需要统计的方法（节点/连接线绘制、背景绘制、场景鼠标事件）
+    装上计时包装；关闭时恢复原方法，因此关闭状态下没有任何额外开销。
+    """
+
+    def __init__(self, history=600):
+        self.enabled = False
+        self.frames = deque(maxlen=history)  # 每帧的统计记录
+        self._targets = []     # [(类, 方法名, 类别)]
+        self._originals = {}   # {(类, 方法名): 原方法}
+        self._frame_start = None
+        self._reset_current()
+
+    def _reset_current(self):
+        self._times = dict.fromkeys(CATEGORIES, 0.0)
+        self._counts = dict.fromkeys(CATEGORIES, 0)
+
+    def register(self, cls, method_name, category):
+        """登记需要计时的方法"""
+        if category not in CATEGORIES:
+            raise ValueError(f"未知的统计类别: {category}")
+        self._targets.append((cls, method_name, category))
+        if self.enabled:
+            self._install(cls, method_name, category)
+
+    def _install(self, cls, method_name, category):
+        key = (cls, method_name)
+        if key in self._originals:
+            return
+        original = cls.__dict__.get(method_name)
+        if original is None:
+            return
+        self._originals[key] = original
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._times[category] += time.perf_counter() - start
+                self._counts[category] += 1
+
+        setattr(cls, method_name, timed)
+
+    def enable(self):
+        """启用统计（安装计时包装）"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._reset_current()
+        for cls, method_name, category in self._targets:
+            self._install(cls, method_name, category)
+
+    def disable(self):
+        """关闭统计（恢复原方法）"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        for (cls, method_name), original in self._originals.items():
+            setattr(cls, method_name, original)
+        self._originals.clear()
+
+    def begin_frame(self):
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """结束一帧：记录帧时间和本帧内累计的各类耗时"""
+        if self._frame_start is None:
+            return
+        frame_ms = (time.perf_counter() - self._frame_start) * 1000
+        self._frame_start = None
+        record = {'frame_ms': frame_ms}
+        for category in CATEGORIES:
+            record[f'{category}_ms'] = self._times[category] * 1000
+            record[f'{category}_count'] = self._counts[category]
+        self.frames.append(record)
+        self._reset_current()
+
+    def discard_frame(self):
+        """结束一帧但不记录（例如只刷新叠加层本身的重绘）"""
+        self._frame_start = None
+        self._reset_current()
+
+    def percentile(self, field, fraction, window=None):
+        """最近 window 帧中 field 的分位数"""
+        frames = list(self.frames)[-window:] if window else list(self.frames)
+        values = sorted(frame[field] for frame in frames)
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+        return values[index]
+
+    def summary(self, window=120):
+        """最近 window 帧的汇总（用于叠加显示）"""
+        frames = list(self.frames)[-window:]
+        if not frames:
+            return None
+        last = frames[-1]
+        return {
+            'frames': len(frames),
+            'last_ms': last['frame_ms'],
+            'p50_ms': self.percentile('frame_ms', 0.5, window),
+            'p95_ms': self.percentile('frame_ms', 0.95, window),
+            'last': last,
+        }
+
+    def clear(self):
+        self.frames.clear()
+        self._reset_current()
+
+    def export_csv(self, path):
+        """把记录的每帧数据导出为 CSV"""
+        fields = ['frame', 'frame_ms']
+        for category in CATEGORIES:
+            fields += [f'{category}_ms', f'{category}_count']
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for index, frame in enumerate(self.frames):
+                writer.writerow({'frame': index, **frame})
+        return len(self.frames)
+
+
+# 全局共享的分析器
+profiler = PaintProfiler()
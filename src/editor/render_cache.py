@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+
+class NodeRenderCache:
+    """节点外观的共享位图缓存
+
+    同类型、同状态、同标题的节点外观完全一样，只需渲染一次。
+    缓存容量有限，超出时按最近最少使用（LRU）淘汰。
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {key: QPixmap}
+        self.hits = 0        # 命中次数
+        self.misses = 0      # 未命中次数
+        self.evictions = 0   # 淘汰次数
+
+    def get(self, key):
+        """查找缓存的位图，未命中时返回 None"""
+        pixmap = self._entries.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return pixmap
+
+    def put(self, key, pixmap):
+        """写入缓存，必要时淘汰最久未使用的条目"""
+        self._entries[key] = pixmap
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, node_class=None, title=None):
+        """丢弃匹配的缓存条目
+
+        Args:
+            node_class: 只丢弃该节点类的条目，None 表示不限
+            title: 只丢弃该标题的条目，None 表示不限
+        """
+        if node_class is None and title is None:
+            self._entries.clear()
+            return
+        stale = [key for key in self._entries
+                 if (node_class is None or key[0] is node_class)
+                 and (title is None or key[3] == title)]
+        for key in stale:
+            del self._entries[key]
+
+    def set_max_entries(self, max_entries):
+        """修改缓存容量"""
+        self.max_entries = max_entries
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def reset_stats(self):
+        """清零命中统计"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 所有节点共享的缓存实例
+node_render_cache = NodeRenderCache()
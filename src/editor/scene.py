@@ -1,9 +1,25 @@
 from PySide6.QtWidgets import QGraphicsScene, QApplication
-from PySide6.QtCore import Signal, Qt, QPointF, QMimeData, QKeyCombination
-from PySide6.QtGui import QDragEnterEvent, QDropEvent, QPainter, QColor, QPen
+from PySide6.QtCore import Signal, Qt, QPointF, QRectF, QTimer, QMimeData, QKeyCombination
+from PySide6.QtGui import QDragEnterEvent, QDropEvent, QPainter, QColor, QPen, QTransform
 from .connection import Connection
 from .node import Node
+from .grid import GridRenderer
+from .connection_layer import ConnectionLayer
+from .port_index import PortIndex
+from .profiler import profiler
+from .materializer import SceneMaterializer, NODE_EXTENT
+from .virtualizer import SceneVirtualizer
+from .undo import UndoStack
+from model.graph import FlowGraph, port_id, port_index, parse_port_name
+from model import flow_file, flow_binary
+from model.layout import layered_layout, incremental_layout
+from model.search import SearchIndex
+from model.validation import FlowValidator
+from model.lineage import LineageTrace, BOTH
+from nodes.base_nodes import node_class
 import json
+import time
+from contextlib import contextmanager
 
 # 场景主题设置
 SCENE_COLORS = {
@@ -12,8 +28,17 @@ SCENE_COLORS = {
     'grid_main': QColor(220, 220, 220),  # 中灰色主网格线
 }
 
+FRAGMENT_MIME_TYPE = 'application/x-node-flow'  # 复制的流程片段（节点及其内部连接）
+PASTE_OFFSET = 20  # 粘贴的节点相对原位置的偏移
+VIRTUALIZE_THRESHOLD = 50000  # 显示的流程达到这个节点数时自动使用虚拟化模式
+AUTO_VALIDATE_EDGES = 200000  # 显示的流程不超过这个连接数时，图元创建完后自动全量校验
+LINEAGE_BUDGET_MS = 8  # 血缘追踪每个空闲时间片内的最长耗时（毫秒）
+LINEAGE_STEP = 256     # 血缘追踪检查时间之间处理的节点数
+
+
 class NodeScene(QGraphicsScene):
     nodeSelected = Signal(object)  # 当节点被选中时发出信号
+    lineageTraced = Signal(int, int)  # 血缘追踪完成（节点数, 连接数）
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -21,13 +46,48 @@ class NodeScene(QGraphicsScene):
         self.connection_start_pos = None
         self.connection_start_port = None
         self.connection_start_node = None
+        self._hover_target = None  # 拖动连接时当前高亮的目标节点
         self.properties_panel = None  # 属性面板引用
         
+        # 流程数据模型：场景中的节点和连接线都是绑定到其中记录的视图
+        self.graph = FlowGraph()
+        self._node_items = {}  # {node_id: Node}
+        self._edge_items = {}  # {edge_id: Connection}
+        self.materializer = None  # 加载文件时分批创建图元的 SceneMaterializer
+        self.virtualizer = None   # 虚拟化模式下按视口创建和回收图元的 SceneVirtualizer
+        self._recycling = False   # 为 True 时离开场景的图元只解除绑定，不从模型中删除
+        self._added_nodes = set()  # 上次自动布局之后新加入的节点 id（增量布局的范围）
+        self.search_index = SearchIndex()  # 节点搜索索引，随模型增量更新
+        self._search_stale = False         # 模型被整体替换后索引在第一次搜索时重建
+        self.validator = FlowValidator(self.graph)  # 流程校验，随模型增量更新
+        self._validation_pending = False
+        self.lineage = None         # 当前高亮的血缘（LineageTrace），之外的图元淡化显示；None 表示不高亮
+        self._lineage_trace = None  # 正在分步进行的追踪
+        self._lineage_timer = QTimer(self)
+        self._lineage_timer.setInterval(0)
+        self._lineage_timer.timeout.connect(self._continue_lineage)
+        self.journal = None  # 自动保存日志（FlowJournal），设置后记录模型的每次编辑
+        self.undo_stack = UndoStack(self, parent=self)
+        self._press_command = False  # 鼠标按下到释放之间的编辑合并为一个撤销命令
+        
+        # 端口位置的空间索引，用于快速查找光标下的端口
+        self.port_index = PortIndex(cell_size=Node.PORT_CLICK_RANGE * 2)
+        self.connection_layer = None  # 连接线图层（启用后统一绘制所有连接线）
+        self._layer_bounds_pending = False
+        
+        # 待更新路径的连接线，每轮事件循环合并刷新一次
+        self._dirty_connections = set()
+        self._connection_flush_pending = False
+        
         # 网格线设置
         self.grid_size = 20  # 网格大小
         self.grid_squares = 5  # 主网格线间隔（每5个小格一个主格）
         self.grid_color = SCENE_COLORS['grid']  # 网格线颜色
         self.grid_color_secondary = SCENE_COLORS['grid_main']  # 主网格线颜色
+        self.grid_renderer = GridRenderer(
+            self.grid_size, self.grid_squares,
+            self.grid_color, self.grid_color_secondary
+        )
         
         # 设置场景背景
         self.setBackgroundBrush(SCENE_COLORS['background'])
@@ -50,51 +110,384 @@ class NodeScene(QGraphicsScene):
         """绘制场景背景"""
         super().drawBackground(painter, rect)
         
-        # 保存画笔状态
-        painter.save()
-        
-        # 创建网格画笔
-        painter.setPen(self.grid_color)
-        
-        # 获取视图可见区域
-        left = int(rect.left())
-        right = int(rect.right())
-        top = int(rect.top())
-        bottom = int(rect.bottom())
-        
-        # 对齐到网格
-        first_left = left - (left % self.grid_size)
-        first_top = top - (top % self.grid_size)
-        
-        # 绘制垂直网格线
-        lines_x = []
-        lines_y = []
-        x = first_left
-        while x <= right:
-            lines_x.append(x)
-            x += self.grid_size
+        # 网格参数可能在运行时被修改，绘制前同步给渲染器（未变化时不会重建图块）
+        self.grid_renderer.configure(
+            grid_size=self.grid_size,
+            grid_squares=self.grid_squares,
+            color=self.grid_color,
+            color_main=self.grid_color_secondary
+        )
+        self.grid_renderer.draw(painter, rect)
+        if self.virtualizer is not None:
+            # 另一端没有图元的连接画在背景上（节点下面）
+            self.virtualizer.draw_stubs(painter, rect)
+        
+    def drawForeground(self, painter: QPainter, rect):
+        """虚拟化模式下视图缩得很小时，直接按模型绘制节点概览"""
+        super().drawForeground(painter, rect)
+        if self.virtualizer is not None and self.virtualizer.overview:
+            self.virtualizer.draw_overview(painter, rect)
+            
+    def set_connection_layer_enabled(self, enabled):
+        """启用或关闭连接线图层模式
+        
+        启用后所有连接线由一个图层图元按状态分组批量绘制，
+        连接线图元本身只负责选择、悬停和右键菜单。
+        """
+        if enabled and self.connection_layer is None:
+            self.connection_layer = ConnectionLayer()
+            self.addItem(self.connection_layer)
+            for item in self.items():
+                if isinstance(item, Connection):
+                    self.connection_layer.add(item)
+        elif not enabled and self.connection_layer is not None:
+            layer = self.connection_layer
+            self.connection_layer = None
+            layer.clear()
+            self.removeItem(layer)
+        self.update()
+        
+    def _refresh_layer_bounds(self):
+        """移除连接线之后收缩连接线图层的边界（每轮事件循环最多一次）"""
+        self._layer_bounds_pending = False
+        if self.connection_layer is not None and self.connection_layer.bounds_stale:
+            self.connection_layer.refresh_bounds()
             
-        # 绘制水平网格线
-        y = first_top
-        while y <= bottom:
-            lines_y.append(y)
-            y += self.grid_size
+    def is_connection_layer_enabled(self):
+        return self.connection_layer is not None
+        
+    def _attach_connection(self, connection):
+        """连接线加入场景时调用：登记到模型（预览连接线除外）"""
+        if self.connection_layer is not None:
+            self.connection_layer.add(connection)
+        if connection.is_preview:
+            return
+        edge_id = connection.edge_id
+        if edge_id is not None and self.graph.edge(edge_id) is not None:
+            # 为模型中已有的连接创建的图元（例如加载文件时），只登记映射
+            if edge_id not in self._edge_items:
+                self._edge_items[edge_id] = connection
+            problem = self.validator.edge_problem(edge_id)
+            if problem is not None:
+                connection.set_problem(problem)
+            return
+        # 其余情况加入模型；edge_id 已设置时（撤销/重做恢复的连接）沿用原来的 id
+        start, end = connection.start_item, connection.end_item
+        start_port, end_port = connection.start_port, connection.end_port
+        if start is None or end is None or start_port is None or end_port is None:
+            return
+        graph = self.graph
+        if graph.node(start.node_id) is not start.record or graph.node(end.node_id) is not end.record:
+            return
+        edge = graph.add_edge(start.node_id, port_index(start_port), end.node_id, port_index(end_port), edge_id)
+        connection.edge_id = edge.id
+        self._edge_items[edge.id] = connection
+        if self.journal is not None:
+            self.journal.edge_added(edge)
+        self.undo_stack.edge_added(edge)
+        self.validator.edge_added(edge)
+        self._schedule_validation_display()
             
-        # 绘制小网格线
-        for x in lines_x:
-            for y in lines_y:
-                is_main_line_x = (x / self.grid_size) % self.grid_squares == 0
-                is_main_line_y = (y / self.grid_size) % self.grid_squares == 0
+    def _attach_node(self, node):
+        """节点加入场景时调用：登记到模型和端口索引"""
+        pos = node.pos()
+        node.record.x = pos.x()
+        node.record.y = pos.y()
+        if self.graph.node(node.node_id) is not node.record:
+            self.graph.insert_node(node.record)
+            if self.journal is not None:
+                self.journal.node_added(node.record)
+            if self.virtualizer is not None:
+                self.virtualizer.node_added(node.record)
+            self.undo_stack.node_added(node.record)
+            self._added_nodes.add(node.node_id)
+            if not self._search_stale:
+                self.search_index.add(node.record)
+            self.validator.node_added(node.record)
+            self._schedule_validation_display()
+        else:
+            problem = self.validator.node_problem(node.node_id)
+            if problem is not None:
+                node.set_problem(problem)
+        self._node_items[node.node_id] = node
+        self.port_index.add_node(node)
+        
+    def _detach_node(self, node):
+        """节点离开场景时调用"""
+        self.port_index.remove_node(node)
+        if self._node_items.get(node.node_id) is node and self._recycling:
+            # 虚拟化模式回收图元：记录和连接仍留在模型中
+            del self._node_items[node.node_id]
+        elif self._node_items.get(node.node_id) is node:
+            del self._node_items[node.node_id]
+            if self.journal is not None:
+                self.journal.node_removed(node.node_id)
+            if self.virtualizer is not None:
+                self.virtualizer.node_removed(node.record)
+            self.search_index.remove(node.node_id)
+            # 模型会一并移除该节点的连接，仍留在场景中的连接线图元随之解除绑定
+            edges = self.graph.remove_node(node.node_id)
+            for edge in edges:
+                connection = self._edge_items.pop(edge.id, None)
+                if connection is not None:
+                    connection.edge_id = None
+            self.undo_stack.node_removed(node.record, edges)
+            self.validator.removed((node.record,), edges)
+            self._schedule_validation_display()
+        if self._hover_target is node:
+            self._hover_target = None
+        
+    def _detach_connection(self, connection):
+        """连接线离开场景时调用"""
+        if self.connection_layer is not None:
+            self.connection_layer.remove(connection)
+            if self.connection_layer.bounds_stale and not self._layer_bounds_pending:
+                self._layer_bounds_pending = True
+                QTimer.singleShot(0, self._refresh_layer_bounds)
+        edge_id = connection.edge_id
+        if edge_id is not None:
+            connection.edge_id = None
+            if self._edge_items.get(edge_id) is connection and self._recycling:
+                del self._edge_items[edge_id]
+            elif self._edge_items.get(edge_id) is connection:
+                del self._edge_items[edge_id]
+                edge = self.graph.remove_edge(edge_id)
+                if self.journal is not None:
+                    self.journal.edge_removed(edge_id)
+                if edge is not None:
+                    self.undo_stack.edge_removed(edge)
+                    self.validator.edge_removed(edge)
+                    self._schedule_validation_display()
                 
-                if is_main_line_x or is_main_line_y:
-                    painter.setPen(self.grid_color_secondary)
-                else:
-                    painter.setPen(self.grid_color)
-                    
-                painter.drawPoint(x, y)
+    def node_moved(self, node, old_x, old_y):
+        """节点位置改变时由 Node.itemChange 调用（记录到自动保存日志和撤销历史）"""
+        node_id = node.node_id
+        if self._node_items.get(node_id) is not node:
+            return
+        record = node.record
+        self.record_moved(node_id, old_x, old_y, record.x, record.y)
+        if self.virtualizer is not None:
+            self.virtualizer.node_moved(node_id, old_x, old_y, record.x, record.y)
+            if node is self.mouseGrabberItem() and node.isSelected():
+                # 拖动选中的节点：没有图元的选中节点一起移动
+                self.virtualizer.move_hidden_selection(record.x - old_x, record.y - old_y)
+        
+    def record_moved(self, node_id, old_x, old_y, x, y):
+        """模型中的节点位置已改变（记录到自动保存日志和撤销历史）"""
+        if self.journal is not None:
+            self.journal.node_moved(node_id)
+        self.undo_stack.node_moved(node_id, old_x, old_y, x, y)
+        
+    def node_field_changed(self, node, field, old, new):
+        """节点的标题、端口名称或属性被修改时由 Node.set_field 调用"""
+        node_id = node.node_id
+        if self._node_items.get(node_id) is not node:
+            return
+        if self.journal is not None:
+            self.journal.node_changed(node_id)
+        if not self._search_stale:
+            self.search_index.update(node.record)
+        self.undo_stack.field_changed(node_id, field, old, new)
+        
+    def restore_node(self, record):
+        """为模型记录重新创建节点图元并加入场景（沿用记录中的 id、位置和端口）"""
+        node = node_class(record.type).from_record(record)
+        self.addItem(node)
+        return node
+        
+    def restore_connection(self, edge):
+        """按连接记录重新创建连接线（沿用原来的 id），两端节点不在场景中时返回 None"""
+        if edge.id in self._edge_items:
+            return self._edge_items[edge.id]
+        source = self.ensure_node_item(edge.source)
+        target = self.ensure_node_item(edge.target)
+        if source is None or target is None:
+            return None
+        return self.create_connection(source, target, port_id(True, edge.source_port),
+                                      port_id(False, edge.target_port), edge_id=edge.id)
+            
+    def node_item(self, node_id):
+        """模型节点 id 对应的节点图元"""
+        return self._node_items.get(node_id)
+        
+    def connection_item(self, edge_id):
+        """模型连接 id 对应的连接线图元"""
+        return self._edge_items.get(edge_id)
+        
+    def node_items(self):
+        """场景中所有绑定到模型的节点图元"""
+        return self._node_items.values()
+        
+    def ensure_node_item(self, node_id):
+        """模型节点对应的图元；虚拟化模式下节点还没有图元时立即创建"""
+        node = self._node_items.get(node_id)
+        if node is None and self.virtualizer is not None:
+            node = self.virtualizer.materialize(node_id)
+        return node
+        
+    def ensure_connection_item(self, edge_id):
+        """模型连接对应的连接线图元；虚拟化模式下为两端节点创建图元"""
+        connection = self._edge_items.get(edge_id)
+        edge = self.graph.edge(edge_id)
+        if connection is None and edge is not None and self.virtualizer is not None:
+            self.ensure_node_item(edge.source)
+            self.ensure_node_item(edge.target)
+            connection = self._edge_items.get(edge_id)
+        return connection
+        
+    def pinned_items(self):
+        """虚拟化模式下不能回收的图元：选中的、正在交互的和属性面板正在显示的节点"""
+        pinned = set(self.selectedItems())
+        panel_node = self.properties_panel.current_node if self.properties_panel is not None else None
+        for item in (self.mouseGrabberItem(), self.focusItem(), self.connection_start_node,
+                     self._hover_target, panel_node):
+            if item is not None:
+                pinned.add(item)
+        return pinned
+        
+    @contextmanager
+    def recycling(self):
+        """期间离开场景的节点和连接线图元只解除与模型的绑定，不删除模型中的记录"""
+        self._recycling = True
+        try:
+            yield
+        finally:
+            self._recycling = False
+            
+    def set_virtualized(self, view, enabled=True):
+        """启用或关闭虚拟化模式
+        
+        启用后只有视口附近的节点有图元（见 SceneVirtualizer），适合数十万以上节点的流程；
+        关闭时由 SceneMaterializer 在空闲时间为其余节点补齐图元。
+        
+        Returns:
+            SceneVirtualizer（关闭时为 None）
+        """
+        if enabled:
+            if self.virtualizer is None:
+                if self.materializer is not None:
+                    self.materializer.stop()
+                    self.materializer = None
+                self.virtualizer = SceneVirtualizer(self, view, parent=self)
+                self.virtualizer.reset()
+            return self.virtualizer
+        if self.virtualizer is not None:
+            hidden = self.virtualizer.hidden_selection
+            self.virtualizer.detach()
+            self.virtualizer.deleteLater()
+            self.virtualizer = None
+            for node_id in hidden:
+                node = self._node_items.get(node_id)
+                if node is None:
+                    node = self.restore_node(self.graph.node(node_id))
+                node.setSelected(True)
+            self.materializer = SceneMaterializer(self, view, parent=self)
+            self.materializer.start()
+            self.update()
+        return None
+        
+    def select_nodes(self, node_ids, add=False):
+        """选中模型中的节点（虚拟化模式下没有图元的节点也可以选中）"""
+        if not add:
+            self.clearSelection()
+        if self.virtualizer is not None:
+            self.virtualizer.select(node_ids)
+            return
+        for node_id in node_ids:
+            node = self._node_items.get(node_id)
+            if node is not None:
+                node.setSelected(True)
                 
-        # 恢复画笔状态
-        painter.restore()
+    def selected_node_ids(self):
+        """选中节点的 id 列表（包括虚拟化模式下没有图元的节点）"""
+        node_ids = [item.node_id for item in self.selectedItems()
+                    if isinstance(item, Node) and self._node_items.get(item.node_id) is item]
+        if self.virtualizer is not None:
+            node_ids.extend(self.virtualizer.hidden_selection)
+        return node_ids
+        
+    def clearSelection(self):
+        """清除选择（包括虚拟化模式下没有图元的选中节点）"""
+        super().clearSelection()
+        if self.virtualizer is not None:
+            self.virtualizer.hidden_selection.clear()
+        
+    def clear(self):
+        """清空场景（QGraphicsScene.clear 不会通知图元离开场景，这里同步清空模型和索引）"""
+        if self.connection_layer is not None:
+            self.connection_layer.clear()
+            self.connection_layer = None
+        if self.materializer is not None:
+            self.materializer.stop()
+            self.materializer = None
+        if self.virtualizer is not None:
+            self.virtualizer.clear()
+        self.current_connection = None
+        self.connection_start_node = None
+        self._hover_target = None
+        self.cancel_lineage()
+        super().clear()
+        self.graph.clear()
+        if self.journal is not None:
+            self.journal.cleared()
+        self.undo_stack.clear()
+        self._node_items.clear()
+        self._edge_items.clear()
+        self._added_nodes.clear()
+        self.search_index.clear()
+        self._search_stale = False
+        self.validator.clear()
+        self.flush_validation()
+        self.port_index.clear()
+        self._dirty_connections.clear()
+        
+    def mark_connections_dirty(self, connections):
+        """标记连接线需要重新计算路径，在下一轮事件循环统一刷新"""
+        self._dirty_connections.update(connections)
+        if not self._connection_flush_pending:
+            self._connection_flush_pending = True
+            QTimer.singleShot(0, self.flush_connection_updates)
+            
+    def flush_connection_updates(self):
+        """立即重新计算所有待更新的连接线路径
+        
+        每条连接线只计算一次。setPath 会让 Qt 只重绘该连线新旧两个包围矩形，
+        不再需要整个场景 update()。
+        
+        Returns:
+            QRectF: 本次刷新涉及的新旧包围矩形的并集
+        """
+        self._connection_flush_pending = False
+        dirty = self._dirty_connections
+        if not dirty:
+            return QRectF()
+        self._dirty_connections = set()
+        
+        region = QRectF()
+        for conn in dirty:
+            if conn.scene() is not self:
+                continue
+            region = region.united(conn.sceneBoundingRect())
+            conn.update_line()
+            region = region.united(conn.sceneBoundingRect())
+        return region
+        
+    def set_grid(self, grid_size=None, grid_squares=None, color=None, color_main=None):
+        """修改网格参数并刷新视图缓存的背景"""
+        if grid_size is not None:
+            self.grid_size = grid_size
+        if grid_squares is not None:
+            self.grid_squares = grid_squares
+        if color is not None:
+            self.grid_color = QColor(color)
+        if color_main is not None:
+            self.grid_color_secondary = QColor(color_main)
+        if self.grid_renderer.configure(self.grid_size, self.grid_squares,
+                                        self.grid_color, self.grid_color_secondary):
+            # 视图使用 CacheBackground，必须显式丢弃缓存的背景
+            for view in self.views():
+                view.resetCachedContent()
+            self.update()
             
     def add_node(self, node, pos=None):
         """添加节点到场景
@@ -119,27 +512,337 @@ class NodeScene(QGraphicsScene):
         
         return node
         
-    def create_connection(self, start_node, end_node, start_port, end_port):
-        """创建两个节点之间的连接"""
-        connection = Connection()
-        connection.update_start_item(start_node, start_port)
-        connection.update_end_item(end_node, end_port)
+    def create_connection(self, start_node, end_node, start_port, end_port, edge_id=None, connection=None):
+        """创建两个节点之间的连接
+        
+        Args:
+            start_port: 起始节点的输出端口 id（也接受 "out_0" 形式的名称）
+            end_port: 结束节点的输入端口 id（也接受 "in_0" 形式的名称）
+            edge_id: 连接 id。模型中已有该连接时只为它创建图元，不再新建连接记录；
+                     否则以这个 id 加入模型（撤销/重做时恢复原来的连接）
+            connection: 复用的连接线图元（虚拟化模式的对象池），默认新建
+        """
+        if isinstance(start_port, str):
+            start_port = parse_port_name(start_port)
+        if isinstance(end_port, str):
+            end_port = parse_port_name(end_port)
+        if connection is None:
+            connection = Connection()
+        connection.start_item, connection.start_port = start_node, start_port
+        connection.end_item, connection.end_port = end_node, end_port
+        connection.update_line()  # 两端都确定后只计算一次路径
+        connection.edge_id = edge_id
         self.addItem(connection)
+        # 登记到两端节点，节点移动时连接线才会跟随
+        start_node.add_connection(connection, start_port)
+        end_node.add_connection(connection, end_port)
         return connection
         
+    def save_flow(self, path, view=None, binary=None):
+        """把场景中的流程保存到文件，给出视图时一并保存当前的显示区域
+        
+        binary 为 None 时按扩展名选择格式：flow_binary.BINARY_SUFFIX 为二进制格式，其余为 JSON。
+        """
+        view_state = None
+        if view is not None:
+            center = view.mapToScene(view.viewport().rect().center())
+            view_state = {'center': [center.x(), center.y()], 'scale': view.transform().m11()}
+        if binary is None:
+            binary = path.endswith(flow_binary.BINARY_SUFFIX)
+        save = flow_binary.save_flow_binary if binary else flow_file.save_flow
+        save(self.graph, path, view_state)
+        if self.journal is not None:
+            # 保存的文件成为自动保存日志新的起点
+            self.journal.reset(self.graph, base=path)
+        
+    def load_flow(self, path, view=None):
+        """加载流程文件（JSON 或二进制格式，按文件内容判断）
+        
+        模型先完整加载（不创建图元），然后恢复保存时的显示区域，
+        图元由 SceneMaterializer 在空闲时间片中从可见区域开始分批创建。
+        
+        Returns:
+            SceneMaterializer: 可以通过它的信号得知首帧和全部创建完成的时间
+        
+        Raises:
+            OSError: 文件无法读取
+            FlowFileError: 文件格式错误
+        """
+        started = time.perf_counter()
+        graph, header = flow_binary.load_any_flow(path)
+        materializer = self.show_graph(graph, view, header.get('view'), started)
+        if self.journal is not None:
+            self.journal.reset(graph, base=path)
+        return materializer
+        
+    def show_graph(self, graph, view=None, view_state=None, started=None):
+        """用 graph 替换场景中的流程，图元由 SceneMaterializer 分批创建
+        
+        虚拟化模式下（已启用，或流程达到 VIRTUALIZE_THRESHOLD 个节点）改由
+        SceneVirtualizer 只为视口附近的节点创建图元，返回值同样提供首帧信号。
+        
+        Args:
+            view_state: 保存时的视图状态 {"center": [x, y], "scale": s}，没有时显示流程的左上角
+            started: 计时起点（time.perf_counter()），默认为调用时刻
+        """
+        self.clear()
+        self.graph = graph
+        self._search_stale = bool(graph.nodes)
+        # 新模型在全量校验之前不做增量校验（增量更新需要全量校验得到的拓扑序）
+        self.validator = FlowValidator(graph)
+        self.validator.active = not graph.nodes
+        
+        if view is not None:
+            bounds = graph.bounds()
+            if bounds is not None:
+                # 场景范围提前覆盖整个流程，滚动条在图元创建完之前就是正确的
+                min_x, min_y, max_x, max_y = bounds
+                rect = QRectF(min_x, min_y, max_x - min_x + NODE_EXTENT[0], max_y - min_y + NODE_EXTENT[1])
+                view.setSceneRect(view.sceneRect().united(rect.adjusted(-1000, -1000, 1000, 1000)))
+            if view_state:
+                scale = view_state.get('scale', 1.0)
+                view.resetTransform()
+                view.scale(scale, scale)
+                view.centerOn(QPointF(*view_state.get('center', (0.0, 0.0))))
+            elif bounds is not None:
+                view.centerOn(QPointF(bounds[0], bounds[1]))
+                
+        if view is not None and (self.virtualizer is not None or len(graph) >= VIRTUALIZE_THRESHOLD):
+            # 大流程：只为视口附近的节点创建图元
+            if self.virtualizer is None:
+                self.virtualizer = SceneVirtualizer(self, view, parent=self)
+            self.virtualizer.reset(started)
+            loader = self.virtualizer
+        else:
+            self.materializer = SceneMaterializer(self, view, started, parent=self)
+            loader = self.materializer
+        if len(graph.edges) <= AUTO_VALIDATE_EDGES:
+            # 图元创建完后再校验，不推迟首帧
+            loader.finished.connect(self._validate_loaded, Qt.SingleShotConnection)
+        if loader is self.materializer:
+            self.materializer.start()
+        return loader
+        
+    def _validate_loaded(self, *args):
+        if not self.validator.active and len(self.graph.edges) <= AUTO_VALIDATE_EDGES:
+            self.validate_flow()
+        
     def remove_node(self, node):
         """从场景中移除节点及其连接"""
-        # 复制连接列表,因为在删除过程中列表会被修改
-        connections = node.connections_in + node.connections_out
-        for conn in connections:
-            if conn.scene() == self:
-                conn.delete()
-        self.removeItem(node)
+        self.remove_items([node])
+        
+    def remove_items(self, items=(), node_ids=(), edge_ids=()):
+        """批量删除节点和连接线（节点上的连接一并删除），所有删除场景内容的操作都经过这里
+        
+        先在模型中用集合运算一次求出受影响的全部连接并移除，记录到自动保存日志和撤销历史，
+        再解除幸存节点上的连接线登记，最后在暂停视图刷新的情况下移除图元。
+        耗时与删除的规模成正比，与场景规模无关。
+        
+        Args:
+            items: 要删除的 Node / Connection 图元
+            node_ids: 要删除的、没有图元的节点（虚拟化模式）
+            edge_ids: 要删除的、没有图元的连接
+        """
+        node_ids = list(node_ids)
+        edge_ids = set(edge_ids)
+        unbound = []  # 没有绑定到模型的图元（例如预览连接线），直接移除
+        for item in items:
+            if isinstance(item, Node) and self._node_items.get(item.node_id) is item:
+                node_ids.append(item.node_id)
+            elif isinstance(item, Connection) and self._edge_items.get(item.edge_id) is item:
+                edge_ids.add(item.edge_id)
+            elif item.scene() is self:
+                unbound.append(item)
+        if not node_ids and not edge_ids and not unbound:
+            return
+            
+        with self.undo_stack.command(), self.batch_update():
+            records, edges = self.graph.remove_nodes(node_ids, edge_ids)
+            journal = self.journal
+            if journal is not None:
+                for edge in edges:
+                    journal.edge_removed(edge.id)
+                for record in records:
+                    journal.node_removed(record.id)
+            self.undo_stack.nodes_removed(records, edges)
+            self._added_nodes.difference_update(record.id for record in records)
+            for record in records:
+                self.search_index.remove(record.id)
+            self.validator.removed(records, edges)
+            self._schedule_validation_display()
+            if self.virtualizer is not None:
+                for record in records:
+                    self.virtualizer.node_removed(record)
+                    
+            # 先从映射中取出图元，离开场景时的 _detach_* 就不会再修改模型
+            connections = []
+            for edge in edges:
+                connection = self._edge_items.pop(edge.id, None)
+                if connection is not None:
+                    connection.edge_id = None
+                    connections.append(connection)
+            nodes = []
+            for record in records:
+                node = self._node_items.pop(record.id, None)
+                if node is not None:
+                    nodes.append(node)
+            connections.extend(item for item in unbound if isinstance(item, Connection))
+            for connection in connections:
+                for endpoint, port in ((connection.start_item, connection.start_port),
+                                       (connection.end_item, connection.end_port)):
+                    if endpoint is not None:
+                        endpoint.remove_connection(connection, port)
+                        
+            for item in dict.fromkeys(connections + unbound):
+                if item.scene() is self:
+                    self.removeItem(item)
+            for node in nodes:
+                node.connections = {}
+                self.removeItem(node)
+        
+    def move_nodes(self, positions):
+        """批量移动节点 {node_id: (x, y)}，作为一次可撤销的编辑
+        
+        有图元的节点通过 setPos 移动（连接线路径在结束时统一计算），
+        虚拟化模式下没有图元的节点直接修改模型和空间索引。
+        """
+        graph = self.graph
+        virtualizer = self.virtualizer
+        with self.undo_stack.command(), self.batch_update():
+            for node_id, (x, y) in positions.items():
+                node = self._node_items.get(node_id)
+                if node is not None:
+                    node.setPos(x, y)
+                    continue
+                record = graph.node(node_id)
+                if record is None or (record.x == x and record.y == y):
+                    continue
+                old_x, old_y = record.x, record.y
+                graph.move_node(node_id, x, y)
+                if virtualizer is not None:
+                    virtualizer.node_moved(node_id, old_x, old_y, x, y)
+                self.record_moved(node_id, old_x, old_y, x, y)
+        if virtualizer is not None:
+            virtualizer.schedule()
+            
+    def auto_layout(self, node_ids=None, incremental=False):
+        """对整个流程或 node_ids 中的节点应用分层布局（见 model.layout），返回移动的节点数
+        
+        Args:
+            node_ids: 参与布局的节点 id，默认为整个流程
+            incremental: 只为 node_ids（默认为上次布局之后新加入的节点）安排位置，
+                已有节点保持不动（见 model.layout.incremental_layout）
+        """
+        if incremental:
+            if node_ids is None:
+                node_ids = self._added_nodes
+            positions = incremental_layout(self.graph, node_ids)
+        else:
+            positions = layered_layout(self.graph, node_ids)
+        self.move_nodes(positions)
+        self._added_nodes.difference_update(positions)
+        return len(positions)
+        
+    def validate_flow(self):
+        """全量校验整个流程并刷新图元上的问题标记，返回 {问题类型: 数量}"""
+        summary = self.validator.validate()
+        self.flush_validation()
+        return summary
+        
+    def trace_lineage(self, node_id, direction=BOTH):
+        """追踪节点的上游和/或下游，完成后淡化结果之外的全部节点和连接
+        
+        遍历在空闲时间片中分步进行，小流程在调用时即完成；完成时发出 lineageTraced。
+        结果是追踪时的快照，之后的编辑不会更新它。
+        
+        Returns:
+            LineageTrace: 正在进行（或已完成）的追踪
+        """
+        self.cancel_lineage()
+        self._lineage_trace = LineageTrace(self.graph, node_id, direction)
+        trace = self._lineage_trace
+        self._continue_lineage()
+        return trace
+        
+    def _continue_lineage(self):
+        trace = self._lineage_trace
+        deadline = time.perf_counter() + LINEAGE_BUDGET_MS / 1000
+        while not trace.step(LINEAGE_STEP):
+            if time.perf_counter() >= deadline:
+                self._lineage_timer.start()
+                return
+        self._lineage_timer.stop()
+        self._lineage_trace = None
+        self.set_lineage(trace)
+        self.lineageTraced.emit(len(trace.nodes), len(trace.edges))
+        
+    def cancel_lineage(self):
+        """停止正在进行的追踪并清除血缘高亮"""
+        if self._lineage_trace is not None:
+            self._lineage_timer.stop()
+            self._lineage_trace.cancel()
+            self._lineage_trace = None
+        self.set_lineage(None)
+        
+    def lineage_active(self):
+        """是否有正在进行的追踪或显示中的血缘高亮"""
+        return self._lineage_trace is not None or self.lineage is not None
+        
+    def set_lineage(self, trace):
+        """切换血缘高亮
+        
+        图元在绘制时按 self.lineage 决定是否淡化，切换时不逐个修改或刷新图元，
+        只请求一次整个场景的重绘。
+        """
+        if trace is self.lineage:
+            return
+        self.lineage = trace
+        self.update()
+        
+    def node_ports_changed(self, node):
+        """节点的端口增减后由 Node.ports_changed 调用"""
+        if self._node_items.get(node.node_id) is node:
+            self.validator.node_changed(node.node_id)
+            self._schedule_validation_display()
+            
+    def _schedule_validation_display(self):
+        """校验结果变化后在下一轮事件循环统一刷新图元上的标记"""
+        if not self._validation_pending and (self.validator.changed_nodes or self.validator.changed_edges):
+            self._validation_pending = True
+            QTimer.singleShot(0, self.flush_validation)
+            
+    def flush_validation(self):
+        """把问题状态发生变化的节点和连接同步到图元（没有图元的跳过，创建图元时再设置）"""
+        self._validation_pending = False
+        node_ids, edge_ids = self.validator.take_changes()
+        if not node_ids and not edge_ids:
+            return
+        validator = self.validator
+        node_items = self._node_items
+        edge_items = self._edge_items
+        with self.batch_update():
+            for node_id in node_ids:
+                node = node_items.get(node_id)
+                if node is not None:
+                    node.set_problem(validator.node_problem(node_id))
+            for edge_id in edge_ids:
+                connection = edge_items.get(edge_id)
+                if connection is not None:
+                    connection.set_problem(validator.edge_problem(edge_id))
+                    
+    def search_nodes(self, text):
+        """搜索标题、端口名称、端口类型或属性值匹配 text 的节点，返回节点 id 列表（见 SearchIndex.search）"""
+        if self._search_stale:
+            self.search_index.rebuild(self.graph)
+            self._search_stale = False
+        return self.search_index.search(text)
         
     def clear_selection(self):
         """清除所有选中项"""
         for item in self.selectedItems():
             item.setSelected(False)
+        if self.virtualizer is not None:
+            self.virtualizer.hidden_selection.clear()
         
     def clearCurrentConnection(self):
         """清除当前的连接线"""
@@ -150,29 +853,43 @@ class NodeScene(QGraphicsScene):
             self.current_connection = None
             self.connection_start_node = None
         
+    def port_at(self, pos, is_output=None, exclude=None):
+        """通过端口索引查找 pos 附近（PORT_CLICK_RANGE 以内）的端口
+        
+        Returns:
+            (node, is_output, index)，没有找到时返回 None
+        """
+        return self.port_index.port_at(pos, Node.PORT_CLICK_RANGE, is_output, exclude)
+        
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
+            # 拖动节点、创建连接等操作到鼠标释放为止合并为一个撤销命令
+            if not self._press_command:
+                self._press_command = True
+                self.undo_stack.begin()
             pos = event.scenePos()
-            items = self.items(pos)
             
-            for item in items:
-                if isinstance(item, Node):
-                    # 检查是否点击了端口
-                    port_info = item.get_port_at(pos)
-                    if port_info:
-                        is_output, index = port_info
-                        # 只允许从输出端口开始连接
-                        if is_output:
-                            item.setPortHighlight(is_output, index, True)
-                            self.startConnection(item.get_port_pos(True, index), item, index)
-                            return
-                        else:
-                            # 如果点击输入端口，清除当前任何连接
-                            self.clearCurrentConnection()
-                            return
+            # 检查是否点击了端口
+            port = self.port_at(pos)
+            if port:
+                item, is_output, index = port
+                # 只允许从输出端口开始连接
+                if is_output:
+                    item.setPortHighlight(is_output, index, True)
+                    self.startConnection(item.get_port_pos(True, index), item, index)
+                else:
+                    # 如果点击输入端口，清除当前任何连接
+                    self.clearCurrentConnection()
+                return
                             
             # 如果没有点击端口，则处理选择
+            # （点击空白处或未选中的图元、且没有按 Ctrl 时，Qt 会取消其他图元的选择）
+            clicked = self.itemAt(pos, QTransform())
+            keeps_selection = (event.modifiers() & Qt.ControlModifier
+                               or (clicked is not None and clicked.isSelected()))
             super().mousePressEvent(event)
+            if self.virtualizer is not None and not keeps_selection:
+                self.virtualizer.hidden_selection.clear()
             selected_items = self.selectedItems()
             if len(selected_items) == 1 and isinstance(selected_items[0], Node):
                 self.nodeSelected.emit(selected_items[0])
@@ -185,80 +902,59 @@ class NodeScene(QGraphicsScene):
             pos = event.scenePos()
             self.updateConnection(pos)
             
-            found_valid_target = False
-            # 高亮潜在的目标端口
-            for item in self.items(pos):
-                if isinstance(item, Node) and item != self.connection_start_node:
-                    port_info = item.get_port_at(pos)
-                    if port_info and not port_info[0]:  # 只高亮输入端口
-                        is_output, index = port_info
-                        target_port_name = f"in_{index}"
-                        
-                        # 检查连接是否有效
-                        can_connect = self.connection_start_node.can_connect_to(
-                            self.current_connection.start_port_name,
-                            item,
-                            target_port_name
-                        )
-                        
-                        # 更新连接线的视觉状态
-                        self.current_connection.set_valid(can_connect)
-                        
-                        # 只在连接有效时高亮端口
-                        if can_connect:
-                            item.setPortHighlight(*port_info)
-                            found_valid_target = True
-                            break
-            
-            # 如果没有找到有效目标,设置连接为无效状态
-            if not found_valid_target:
-                self.current_connection.set_valid(False)
+            # 高亮潜在的目标端口（只考虑其他节点的输入端口）
+            target = self.port_at(pos, is_output=False, exclude=self.connection_start_node)
+            can_connect = False
+            if target:
+                item, is_output, index = target
+                # 检查连接是否有效
+                can_connect = self.connection_start_node.can_connect_to(
+                    self.current_connection.start_port,
+                    item,
+                    port_id(False, index)
+                )
+                
+            # 清除上一个目标端口的高亮
+            if self._hover_target is not None and (not can_connect or self._hover_target is not item):
+                self._hover_target.setPortHighlight(None, None, False)
+                self._hover_target = None
+                
+            # 只在连接有效时高亮端口
+            if can_connect:
+                item.setPortHighlight(False, index)
+                self._hover_target = item
+                
+            # 更新连接线的视觉状态
+            self.current_connection.set_valid(can_connect)
             
     def mouseReleaseEvent(self, event):
         super().mouseReleaseEvent(event)
         if self.current_connection:
             pos = event.scenePos()
-            items = self.items(pos)
             
             # 清除所有端口的高亮
             if self.connection_start_node:
                 self.connection_start_node.setPortHighlight(None, None)
+            if self._hover_target is not None:
+                self._hover_target.setPortHighlight(None, None, False)
+                self._hover_target = None
             
-            found_valid_target = False
-            for item in items:
-                if isinstance(item, Node) and item != self.connection_start_node:
-                    port_info = item.get_port_at(pos)
-                    if port_info and not port_info[0]:  # 只接受输入端口
-                        is_output, index = port_info
-                        target_port_name = f"in_{index}"  # 目标端口名称
-                        item.setPortHighlight(None, None)  # 清除高亮
-                        
-                        # 创建新的永久连接
-                        connection = Connection()
-                        start_port_name = f"out_{self.connection_start_port}"  # 起始端口名称
-                        
-                        # 验证连接是否有效
-                        if self.connection_start_node.can_connect_to(
-                            start_port_name,
-                            item,
-                            target_port_name
-                        ):
-                            # 添加到场景
-                            self.addItem(connection)
-                            
-                            # 更新连接的端口信息
-                            connection.update_start_item(self.connection_start_node, start_port_name)
-                            connection.update_end_item(item, target_port_name)
-                            
-                            # 将连接添加到节点
-                            self.connection_start_node.add_connection(connection, start_port_name)
-                            item.add_connection(connection, target_port_name)
-                            
-                            # 强制更新连接线位置
-                            connection.update_line()
-                            
-                            found_valid_target = True
-                        break
+            # 只接受其他节点的输入端口
+            target = self.port_at(pos, is_output=False, exclude=self.connection_start_node)
+            if target:
+                item, is_output, index = target
+                target_port = port_id(False, index)  # 目标端口
+                start_port = port_id(True, self.connection_start_port)  # 起始端口
+                
+                # 验证连接是否有效
+                if self.connection_start_node.can_connect_to(
+                    start_port,
+                    item,
+                    target_port
+                ):
+                    # 创建新的永久连接
+                    self.create_connection(self.connection_start_node, item,
+                                           start_port, target_port)
                             
             # 清除临时连接
             self.clearCurrentConnection()
@@ -268,14 +964,12 @@ class NodeScene(QGraphicsScene):
             items = self.items(pos)
             for item in items:
                 if isinstance(item, Connection):
-                    # 通知节点连接将被删除
-                    if item.start_item and hasattr(item.start_item, 'remove_connection'):
-                        item.start_item.remove_connection(item, item.start_port_name)
-                    if item.end_item and hasattr(item.end_item, 'remove_connection'):
-                        item.end_item.remove_connection(item, item.end_port_name)
-                    # 从场景中移除连接
-                    self.removeItem(item)
+                    self.remove_items([item])
                     break
+                    
+        if event.button() == Qt.LeftButton and self._press_command:
+            self._press_command = False
+            self.undo_stack.end()
         
     def startConnection(self, pos, start_item, port_index=None):
         """开始创建新的连接"""
@@ -288,7 +982,7 @@ class NodeScene(QGraphicsScene):
         self.connection_start_node = start_item
         if port_index is not None:
             self.connection_start_port = port_index
-            self.current_connection.start_port_name = f"out_{port_index}"
+            self.current_connection.start_port = port_id(True, port_index)
         
     def updateConnection(self, pos):
         """更新连接的终点位置"""
@@ -304,28 +998,54 @@ class NodeScene(QGraphicsScene):
             
     def keyPressEvent(self, event):
         """处理键盘事件"""
-        # 检查 Ctrl+V 组合键
-        if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_V:
+        # 检查 Ctrl+C / Ctrl+V 组合键
+        if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_C:
+            self.copy_selection()
+        elif event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_V:
             self.paste_from_clipboard()
         # 检查 Delete 键
         elif event.key() == Qt.Key_Delete:
             self.delete_selected()
+        elif event.key() == Qt.Key_Escape and self.lineage_active():
+            self.cancel_lineage()
         else:
             super().keyPressEvent(event)
             
     def delete_selected(self):
-        """删除选中的项目"""
-        for item in self.selectedItems():
-            if isinstance(item, (Node, Connection)):
-                item.delete()
+        """删除选中的项目（作为一个撤销命令）"""
+        items = [item for item in self.selectedItems() if isinstance(item, (Node, Connection))]
+        # 虚拟化模式下没有图元的选中节点直接在模型中删除
+        hidden = self.virtualizer.hidden_selection if self.virtualizer is not None else ()
+        self.remove_items(items, node_ids=hidden)
                 
+    def copy_selection(self):
+        """把选中的节点（连同它们之间的连接）复制到剪贴板"""
+        node_ids = self.selected_node_ids()
+        if node_ids:
+            self.copy_node_ids(node_ids)
+            
+    def copy_nodes(self, nodes):
+        """把节点及其内部连接以流程片段格式复制到剪贴板"""
+        self.copy_node_ids([node.node_id for node in nodes])
+        
+    def copy_node_ids(self, node_ids):
+        """把模型中的节点及其内部连接以流程片段格式复制到剪贴板"""
+        fragment = flow_file.fragment_to_dict(self.graph, node_ids)
+        data = json.dumps(fragment, ensure_ascii=False, separators=(',', ':')).encode()
+        mime_data = QMimeData()
+        mime_data.setData(FRAGMENT_MIME_TYPE, data)
+        QApplication.clipboard().setMimeData(mime_data)
+        
     def paste_from_clipboard(self):
-        """从剪贴板粘贴节点"""
+        """从剪贴板粘贴节点（流程片段，或旧版本复制的单个节点）"""
         clipboard = QApplication.clipboard()
         mime_data = clipboard.mimeData()
         
-        if mime_data.hasFormat('application/x-node'):
-            try:
+        try:
+            if mime_data.hasFormat(FRAGMENT_MIME_TYPE):
+                fragment = json.loads(bytes(mime_data.data(FRAGMENT_MIME_TYPE)).decode())
+                return self.paste_fragment(fragment)
+            if mime_data.hasFormat('application/x-node'):
                 # 解析节点数据
                 data = json.loads(bytes(mime_data.data('application/x-node')).decode())
                 
@@ -334,16 +1054,60 @@ class NodeScene(QGraphicsScene):
                 
                 # 调整位置,避免重叠
                 # 在原位置基础上偏移一点
-                node.moveBy(20, 20)
+                node.moveBy(PASTE_OFFSET, PASTE_OFFSET)
                 
-                # 添加到场景
-                self.addItem(node)
+                # 添加到场景（作为一个撤销命令）
+                with self.undo_stack.command():
+                    self.addItem(node)
                 
                 # 选中新节点
+                self.clearSelection()
                 node.setSelected(True)
+                return [node]
                 
-            except Exception as e:
-                print(f"粘贴节点时出错: {e}")
+        except Exception as e:
+            print(f"粘贴节点时出错: {e}")
+        return []
+        
+    def paste_fragment(self, fragment, offset=(PASTE_OFFSET, PASTE_OFFSET)):
+        """把流程片段（flow_file.fragment_to_dict 的格式）粘贴到场景中
+        
+        节点重新分配 id，按片段中记录的类型创建对应的节点类；所有图元在一个批次中加入，
+        期间暂停视图刷新，整个粘贴是一个撤销命令。
+        
+        Returns:
+            粘贴出的节点列表（已选中）
+        """
+        dx, dy = offset
+        nodes = {}
+        with self.undo_stack.command(), self.batch_update():
+            for data in fragment.get('nodes', ()):
+                record = flow_file.node_from_dict(data)
+                record.x += dx
+                record.y += dy
+                nodes[data['id']] = self.restore_node(record)
+            for source, source_port, target, target_port in fragment.get('edges', ()):
+                start, end = nodes.get(source), nodes.get(target)
+                if start is not None and end is not None:
+                    self.create_connection(start, end, port_id(True, source_port), port_id(False, target_port))
+            self.clearSelection()
+            for node in nodes.values():
+                node.setSelected(True)
+        return list(nodes.values())
+        
+    @contextmanager
+    def batch_update(self):
+        """批量加入或移除图元：期间暂停视图刷新，结束时统一计算连接线路径并重绘一次"""
+        views = [view for view in self.views() if view.updatesEnabled()]
+        for view in views:
+            view.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.flush_connection_updates()
+            for view in views:
+                view.setUpdatesEnabled(True)
+                view.viewport().update()
             
     def finishConnection(self, pos, end_item):
         """完成连接创建"""
@@ -354,3 +1118,9 @@ class NodeScene(QGraphicsScene):
             else:
                 self.removeItem(self.current_connection)
             self.current_connection = None
+
+
+# 启用分析器时统计背景绘制和鼠标事件处理耗时
+profiler.register(NodeScene, 'drawBackground', 'background')
+for _handler in ('mousePressEvent', 'mouseMoveEvent', 'mouseReleaseEvent'):
+    profiler.register(NodeScene, _handler, 'mouse')
@@ -0,0 +1,324 @@
+import sys
+from contextlib import contextmanager
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+UNDO_MEMORY_BUDGET = 64 * 1024 * 1024  # 撤销历史占用内存的默认上限（字节，估算值）
+
+# 估算撤销记录占用的内存（字节）
+_RECORD_COST = 300       # 一个节点记录（不含端口和属性）
+_PORT_COST = 120         # 每个端口的名称和类型
+_PROPERTY_COST = 100     # 每个自定义属性
+_EDGE_COST = 150         # 一个连接记录
+_MOVE_COST = 200         # 一个节点的移动（新旧坐标）
+_FIELD_COST = 150        # 一次字段修改（不含新旧值）
+
+_OPERATION_TEXT = {
+    'remove_node': "删除",
+    'add_node': "添加节点",
+    'remove_edge': "删除连接",
+    'add_edge': "连接",
+    'set_field': "修改属性",
+}
+
+
+def _record_cost(record):
+    return (_RECORD_COST + _PORT_COST * (len(record.inputs) + len(record.outputs))
+            + _PROPERTY_COST * len(record.properties))
+
+
+class UndoCommand:
+    """一次可撤销的编辑：按发生顺序排列的模型操作，加上合并后的节点移动
+
+    操作只保存模型记录（NodeRecord / EdgeRecord）和字段的新旧值，不复制图元：
+        ('add_node', record)、('remove_node', record)
+        ('add_edge', edge)、('remove_edge', edge)
+        ('set_field', node_id, field, old, new)
+    moves 为 {node_id: [old_x, old_y, new_x, new_y]}，同一节点在一次编辑中的多次移动只保留首尾。
+    """
+    __slots__ = ('operations', 'moves', 'size')
+
+    def __init__(self):
+        self.operations = []
+        self.moves = {}
+        self.size = 0
+
+    def is_empty(self):
+        return not self.operations and not self.moves
+
+    def text(self):
+        kinds = {operation[0] for operation in self.operations}
+        for kind, text in _OPERATION_TEXT.items():
+            if kind in kinds:
+                return text
+        return "移动节点"
+
+    def merge_key(self):
+        """可以与相邻的同类命令合并时返回合并键（连续修改同一节点的同一字段）"""
+        if len(self.operations) == 1 and not self.moves and self.operations[0][0] == 'set_field':
+            return self.operations[0][1:3]
+        return None
+
+    def estimate_size(self):
+        size = _MOVE_COST * len(self.moves)
+        for operation in self.operations:
+            kind = operation[0]
+            if kind in ('add_node', 'remove_node'):
+                size += _record_cost(operation[1])
+            elif kind == 'set_field':
+                size += _FIELD_COST + sys.getsizeof(operation[3]) + sys.getsizeof(operation[4])
+            else:
+                size += _EDGE_COST
+        self.size = size
+        return size
+
+
+class UndoStack(QObject):
+    """NodeScene 的撤销/重做历史
+
+    场景在模型发生变化时调用 node_added() 等方法记录操作。同一轮事件处理中的操作
+    自动合并为一个命令；begin()/end() 可以把更长的过程（例如一次鼠标拖动）合并为一个命令。
+    连续修改同一节点的同一字段（逐字输入）会并入上一个命令。
+    历史占用的估算内存超过 memory_budget 时丢弃最早的命令。
+    """
+    changed = Signal()  # 历史或当前位置发生变化
+
+    def __init__(self, scene, memory_budget=UNDO_MEMORY_BUDGET, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.enabled = True
+        self._commands = []
+        self._index = 0            # 已执行的命令数，_commands[_index:] 为可以重做的命令
+        self._open = None          # 正在记录的命令
+        self._depth = 0            # begin() 的嵌套层数
+        self._close_pending = False
+        self._applying = False     # 撤销/重做过程中不记录操作
+        self._mergeable = False    # 栈顶命令是否还可以合并后续的同字段修改
+
+    # ---- 记录 ----
+
+    def _command(self):
+        """当前正在记录的命令，不存在时新建；不在 begin()/end() 中时下一轮事件循环自动结束"""
+        if self._open is None:
+            self._open = UndoCommand()
+        if not self._depth and not self._close_pending:
+            self._close_pending = True
+            QTimer.singleShot(0, self._auto_close)
+        return self._open
+
+    def _recording(self):
+        return self.enabled and not self._applying
+
+    def node_added(self, record):
+        if self._recording():
+            self._command().operations.append(('add_node', record))
+
+    def node_removed(self, record, edges=()):
+        """节点被移除；edges 为随节点一起从模型中移除的连接"""
+        if self._recording():
+            operations = self._command().operations
+            operations.extend(('remove_edge', edge) for edge in edges)
+            operations.append(('remove_node', record))
+
+    def nodes_removed(self, records, edges):
+        """批量删除：edges 为一并移除的全部连接"""
+        if self._recording() and (records or edges):
+            operations = self._command().operations
+            operations.extend(('remove_edge', edge) for edge in edges)
+            operations.extend(('remove_node', record) for record in records)
+
+    def edge_added(self, edge):
+        if self._recording():
+            self._command().operations.append(('add_edge', edge))
+
+    def edge_removed(self, edge):
+        if self._recording():
+            self._command().operations.append(('remove_edge', edge))
+
+    def node_moved(self, node_id, old_x, old_y, x, y):
+        if self._recording():
+            moves = self._command().moves
+            move = moves.get(node_id)
+            if move is None:
+                moves[node_id] = [old_x, old_y, x, y]
+            else:
+                move[2] = x
+                move[3] = y
+
+    def field_changed(self, node_id, field, old, new):
+        if self._recording():
+            self._command().operations.append(('set_field', node_id, field, old, new))
+
+    def begin(self):
+        """开始一个组合命令，直到对应的 end() 之前的所有操作合并为一个命令"""
+        if not self._depth:
+            self._close()
+        self._depth += 1
+
+    def end(self):
+        if self._depth:
+            self._depth -= 1
+            if not self._depth:
+                self._close()
+
+    @contextmanager
+    def command(self):
+        """with 块中的所有操作合并为一个命令"""
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def _auto_close(self):
+        self._close_pending = False
+        if not self._depth:
+            self._close()
+
+    def _close(self):
+        command, self._open = self._open, None
+        if command is None:
+            return
+        # 拖回原处的移动不需要撤销
+        for node_id, move in list(command.moves.items()):
+            if move[0] == move[2] and move[1] == move[3]:
+                del command.moves[node_id]
+        if command.is_empty():
+            return
+        self._push(command)
+
+    def _push(self, command):
+        # 新的编辑使可以重做的命令失效
+        for dropped in self._commands[self._index:]:
+            self.memory_used -= dropped.size
+        del self._commands[self._index:]
+
+        key = command.merge_key()
+        top = self._commands[-1] if self._commands else None
+        if key is not None and self._mergeable and top is not None and top.merge_key() == key:
+            # 逐字输入：只更新上一个命令的新值
+            old_operation = top.operations[0]
+            top.operations[0] = old_operation[:4] + (command.operations[0][4],)
+            # 新值的大小可能与原来不同（例如越打越长的属性值），重新计入预算
+            self.memory_used -= top.size
+            self.memory_used += top.estimate_size()
+        else:
+            self.memory_used += command.estimate_size()
+            self._commands.append(command)
+        self._trim()
+        self._index = len(self._commands)
+        self._mergeable = key is not None
+        self.changed.emit()
+
+    def _trim(self):
+        """丢弃最早的命令，直到估算内存不超过预算（至少保留最新的一个命令）"""
+        dropped = 0
+        while self.memory_used > self.memory_budget and len(self._commands) - dropped > 1:
+            self.memory_used -= self._commands[dropped].size
+            dropped += 1
+        if dropped:
+            del self._commands[:dropped]
+
+    def set_memory_budget(self, budget):
+        """修改内存预算（字节），立即丢弃超出预算的历史"""
+        self.memory_budget = budget
+        self._trim()
+        self._index = min(self._index, len(self._commands))
+        self.changed.emit()
+
+    def clear(self):
+        self._open = None
+        self._commands = []
+        self._index = 0
+        self.memory_used = 0
+        self._mergeable = False
+        self.changed.emit()
+
+    # ---- 撤销 / 重做 ----
+
+    def can_undo(self):
+        return self._index > 0
+
+    def can_redo(self):
+        return self._index < len(self._commands)
+
+    def undo_text(self):
+        return self._commands[self._index - 1].text() if self.can_undo() else ""
+
+    def redo_text(self):
+        return self._commands[self._index].text() if self.can_redo() else ""
+
+    def __len__(self):
+        return len(self._commands)
+
+    def undo(self):
+        self._close()
+        if not self.can_undo():
+            return False
+        self._index -= 1
+        command = self._commands[self._index]
+        self._apply(command, undo=True)
+        return True
+
+    def redo(self):
+        self._close()
+        if not self.can_redo():
+            return False
+        command = self._commands[self._index]
+        self._index += 1
+        self._apply(command, undo=False)
+        return True
+
+    def _apply(self, command, undo):
+        scene = self.scene
+        self._applying = True
+        self._mergeable = False
+        try:
+            if undo:
+                self._apply_moves(command, 0)
+                self._apply_operations(reversed(command.operations), True)
+            else:
+                self._apply_operations(command.operations, False)
+                self._apply_moves(command, 2)
+            scene.flush_connection_updates()
+        finally:
+            self._applying = False
+        self.changed.emit()
+
+    def _apply_moves(self, command, offset):
+        self.scene.move_nodes({node_id: (move[offset], move[offset + 1])
+                               for node_id, move in command.moves.items()})
+
+    def _apply_operations(self, operations, undo):
+        """依次执行操作；连续的删除合并为一次 scene.remove_items()，撤销大批量添加时不必逐个删除"""
+        removals = ('add_node', 'add_edge') if undo else ('remove_node', 'remove_edge')
+        node_ids = []
+        edge_ids = []
+        for operation in operations:
+            kind = operation[0]
+            if kind in removals:
+                (node_ids if kind.endswith('_node') else edge_ids).append(operation[1].id)
+                continue
+            if node_ids or edge_ids:
+                self.scene.remove_items(node_ids=node_ids, edge_ids=edge_ids)
+                node_ids = []
+                edge_ids = []
+            self._apply_operation(operation, undo)
+        if node_ids or edge_ids:
+            self.scene.remove_items(node_ids=node_ids, edge_ids=edge_ids)
+
+    def _apply_operation(self, operation, undo):
+        scene = self.scene
+        kind = operation[0]
+        # 删除已由 _apply_operations() 合并处理，这里只有恢复
+        if kind in ('add_node', 'remove_node'):
+            scene.restore_node(operation[1])
+        elif kind in ('add_edge', 'remove_edge'):
+            scene.restore_connection(operation[1])
+        elif kind == 'set_field':
+            _, node_id, field, old, new = operation
+            node = scene.ensure_node_item(node_id)
+            if node is not None:
+                node.set_field(field, old if undo else new)
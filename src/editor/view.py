@@ -1,7 +1,37 @@
 from PySide6.QtWidgets import QGraphicsView
-from PySide6.QtCore import Qt, QPointF
-from PySide6.QtGui import QPainter
+from PySide6.QtCore import Qt, QPointF, QRect, QRectF, QTimer
+from collections import deque
+import math
+import time
+from PySide6.QtGui import QPainter, QColor, QFont
 from nodes.base_nodes import InputNode, OutputNode, ProcessNode
+from .lod import DEFAULT_LOD_THRESHOLDS
+from .materializer import NODE_EXTENT
+from .profiler import profiler, CATEGORIES
+
+# 可选的视口更新模式
+UPDATE_MODES = {
+    'minimal': QGraphicsView.MinimalViewportUpdate,
+    'smart': QGraphicsView.SmartViewportUpdate,
+    'bounding': QGraphicsView.BoundingRectViewportUpdate,
+    'full': QGraphicsView.FullViewportUpdate,
+}
+# 性能叠加层的位置和刷新间隔
+PROFILER_OVERLAY_RECT = QRect(8, 8, 300, 132)
+PROFILER_OVERLAY_INTERVAL = 250  # 毫秒
+
+UPDATE_MODE_NAMES = {mode: name for name, mode in UPDATE_MODES.items()}
+
+# 自适应模式下按脏区域占视口的比例选择更新模式
+ADAPTIVE_MINIMAL_FRACTION = 0.05   # 低于该比例：只重绘精确的脏区域
+ADAPTIVE_BOUNDING_FRACTION = 0.5   # 高于该比例：重绘脏区域的外接矩形
+
+# 缩放和交互模式
+ZOOM_STEP = 1.25              # 滚轮每一格的缩放倍数
+ZOOM_FRAME_INTERVAL = 16      # 平滑缩放的动画帧间隔（毫秒）
+ZOOM_SMOOTHING = 0.4          # 每帧完成剩余缩放量（对数）的比例
+ZOOM_FRAME_BUDGET = 16        # 上一帧绘制超过该耗时（毫秒）时直接跳到目标缩放
+INTERACTION_IDLE_MS = 200     # 缩放/平移停止多久后恢复完整绘制质量
 
 class NodeView(QGraphicsView):
     def __init__(self, scene, parent=None):
@@ -11,8 +41,11 @@ class NodeView(QGraphicsView):
         self.centerOn(QPointF(0, 0))
         self.setRenderHint(QPainter.Antialiasing)
         
-        # 设置视图属性
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        # 设置视图属性：背景（网格）缓存在位图中，重绘只涉及真正变化的区域
+        self.setCacheMode(QGraphicsView.CacheBackground)
+        self.update_strategy = 'adaptive'
+        self._dirty_fraction = 0.0  # 脏区域占视口比例的滑动平均
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.setTransformationAnchor(QGraphicsView.NoAnchor)
@@ -28,18 +61,354 @@ class NodeView(QGraphicsView):
         # 启用拖放
         self.setAcceptDrops(True)
         
-    def wheelEvent(self, event):
-        # 实现缩放功能
-        zoom_in_factor = 1.25
-        zoom_out_factor = 1 / zoom_in_factor
+        # 细节层次阈值（节点和连接线在 paint 中读取）
+        self.lod_thresholds = dict(DEFAULT_LOD_THRESHOLDS)
+        
+        # 每帧重绘统计
+        self.repaint_stats_enabled = False   # 是否统计每帧重绘的图元数量（需要额外查询）
+        self.repaint_history = deque(maxlen=120)
+        self._last_frame_stats = None
+        
+        # 性能分析叠加层（F3 切换）
+        self.profiler_overlay = False
+        self._overlay_timer = QTimer(self)
+        self._overlay_timer.setInterval(PROFILER_OVERLAY_INTERVAL)
+        self._overlay_timer.timeout.connect(self._refresh_profiler_overlay)
+        
+        # 交互模式：缩放或平移期间降低绘制质量（关闭抗锯齿、文字和渐变），
+        # 停止操作一段时间后恢复完整质量
+        self.interacting = False
+        self.smooth_zoom = True            # 滚轮缩放是否平滑动画
+        self.interaction_snapshot = False  # 交互期间是否只变换绘制交互开始时的视口快照
+        self._snapshot = None              # (快照位图, 快照对应的场景矩形)
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(INTERACTION_IDLE_MS)
+        self._idle_timer.timeout.connect(self.end_interaction)
+        
+        # 平滑缩放：尚未完成的缩放倍数和锚点（视口坐标）
+        self._zoom_remaining = 1.0
+        self._zoom_anchor = None
+        self._zoom_timer = QTimer(self)
+        self._zoom_timer.setInterval(ZOOM_FRAME_INTERVAL)
+        self._zoom_timer.timeout.connect(self._step_zoom)
+        
+        # 中键拖动平移
+        self._pan_origin = None
+        
+    def set_profiler_enabled(self, enabled):
+        """显示或隐藏性能分析叠加层（同时开启或关闭计时）"""
+        self.profiler_overlay = enabled
+        if enabled:
+            profiler.enable()
+            self._overlay_timer.start()
+        else:
+            self._overlay_timer.stop()
+            profiler.disable()
+        self.viewport().update()
+        
+    def export_profile_csv(self, path):
+        """把记录的每帧分析数据导出为 CSV，返回帧数"""
+        return profiler.export_csv(path)
+        
+    def _refresh_profiler_overlay(self):
+        # 叠加层只占视口一角，定时刷新这一块即可
+        self.viewport().update(PROFILER_OVERLAY_RECT)
+        
+    def drawForeground(self, painter: QPainter, rect):
+        super().drawForeground(painter, rect)
+        if self.profiler_overlay:
+            self._draw_profiler_overlay(painter)
+            
+    def _draw_profiler_overlay(self, painter: QPainter):
+        """在视口左上角绘制帧时间和各类绘制耗时"""
+        summary = profiler.summary()
+        painter.save()
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.fillRect(PROFILER_OVERLAY_RECT, QColor(0, 0, 0, 170))
+        painter.setPen(QColor(230, 230, 230))
+        font = QFont("monospace")
+        font.setStyleHint(QFont.Monospace)
+        font.setPointSize(8)
+        painter.setFont(font)
+        
+        if summary is None:
+            lines = ["等待数据..."]
+        else:
+            last = summary['last']
+            lines = [
+                f"帧时间 {summary['last_ms']:6.2f} ms",
+                f"p50 {summary['p50_ms']:6.2f}  p95 {summary['p95_ms']:6.2f} ms",
+            ]
+            for category in CATEGORIES:
+                lines.append(f"{category:<12}{last[category + '_ms']:7.2f} ms {last[category + '_count']:6d}")
+            stats = self._last_frame_stats
+            if stats is not None:
+                lines.append(f"重绘 {stats['pixels']} px / {stats['rects']} 块 ({stats['mode']})")
+                
+        line_height = painter.fontMetrics().height()
+        x = PROFILER_OVERLAY_RECT.left() + 6
+        y = PROFILER_OVERLAY_RECT.top() + 4
+        for line in lines:
+            painter.drawText(QRect(x, y, PROFILER_OVERLAY_RECT.width() - 12, line_height),
+                             Qt.AlignLeft | Qt.AlignVCenter, line)
+            y += line_height
+        painter.restore()
+        
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_F3:
+            self.set_profiler_enabled(not self.profiler_overlay)
+            event.accept()
+            return
+        super().keyPressEvent(event)
+        
+    def set_update_strategy(self, strategy):
+        """设置视口更新策略
+        
+        Args:
+            strategy: 'adaptive'（按脏区域大小自动选择）或 UPDATE_MODES 中的固定模式
+        """
+        if strategy != 'adaptive' and strategy not in UPDATE_MODES:
+            raise ValueError(f"未知的更新策略: {strategy}")
+        self.update_strategy = strategy
+        if strategy == 'adaptive':
+            self._dirty_fraction = 0.0
+            self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        else:
+            self.setViewportUpdateMode(UPDATE_MODES[strategy])
+            
+    def set_repaint_stats_enabled(self, enabled):
+        """开启或关闭每帧重绘图元数量的统计"""
+        self.repaint_stats_enabled = enabled
+        
+    def last_frame_stats(self):
+        """返回最近一帧的重绘统计
+        
+        Returns:
+            dict: pixels（重绘像素数）、rects（脏矩形数）、fraction（占视口比例）、
+                  items（重绘图元数，未开启统计时为 None）、mode（本帧使用的更新模式）、
+                  time_ms（本帧绘制耗时）
+        """
+        return self._last_frame_stats
+        
+    def paintEvent(self, event):
+        mode = self.viewportUpdateMode()
+        if profiler.enabled:
+            profiler.begin_frame()
+        start = time.perf_counter()
+        if self._snapshot is not None:
+            self._paint_snapshot(event)
+        else:
+            super().paintEvent(event)
+        elapsed = (time.perf_counter() - start) * 1000
+        region = event.region()
+        if profiler.enabled:
+            # 叠加层定时刷新自己的那一角，这样的重绘不计入帧时间统计
+            if self.profiler_overlay and PROFILER_OVERLAY_RECT.contains(region.boundingRect()):
+                profiler.discard_frame()
+            else:
+                profiler.end_frame()
+        
+        rects = list(region)
+        pixels = sum(rect.width() * rect.height() for rect in rects)
+        viewport_rect = self.viewport().rect()
+        viewport_pixels = max(1, viewport_rect.width() * viewport_rect.height())
+        fraction = min(1.0, pixels / viewport_pixels)
         
-        # 根据滚轮方向设置缩放因子
+        items = None
+        if self.repaint_stats_enabled:
+            painted = set()
+            for rect in rects:
+                painted.update(self.items(rect))
+            items = len(painted)
+            
+        self._last_frame_stats = {
+            'pixels': pixels,
+            'rects': len(rects),
+            'fraction': fraction,
+            'items': items,
+            'mode': UPDATE_MODE_NAMES.get(mode, str(mode)),
+            'time_ms': elapsed,
+        }
+        self.repaint_history.append(self._last_frame_stats)
+        
+        if self.update_strategy == 'adaptive':
+            self._adapt_update_mode(fraction)
+            
+    def _adapt_update_mode(self, fraction):
+        """根据最近几帧的脏区域大小调整下一帧的更新模式"""
+        self._dirty_fraction = self._dirty_fraction * 0.7 + fraction * 0.3
+        if self._dirty_fraction < ADAPTIVE_MINIMAL_FRACTION:
+            mode = QGraphicsView.MinimalViewportUpdate
+        elif self._dirty_fraction < ADAPTIVE_BOUNDING_FRACTION:
+            mode = QGraphicsView.SmartViewportUpdate
+        else:
+            mode = QGraphicsView.BoundingRectViewportUpdate
+        if mode != self.viewportUpdateMode():
+            self.setViewportUpdateMode(mode)
+        
+    def set_lod_thresholds(self, minimal=None, reduced=None):
+        """设置细节层次阈值
+        
+        Args:
+            minimal: 缩放细节低于该值时只绘制纯色矩形和直线
+            reduced: 缩放细节低于该值时不绘制文字、渐变和箭头
+        """
+        # 先检查再赋值，参数无效时保持原来的阈值
+        minimal = self.lod_thresholds['minimal'] if minimal is None else float(minimal)
+        reduced = self.lod_thresholds['reduced'] if reduced is None else float(reduced)
+        if minimal > reduced:
+            raise ValueError("minimal 阈值不能大于 reduced 阈值")
+        self.lod_thresholds['minimal'] = minimal
+        self.lod_thresholds['reduced'] = reduced
+        self.viewport().update()
+        
+    def set_interaction_options(self, smooth_zoom=None, snapshot=None, idle_ms=None):
+        """设置交互模式选项
+        
+        Args:
+            smooth_zoom: 滚轮缩放是否平滑动画
+            snapshot: 交互期间是否只绘制交互开始时视口快照的变换结果（不重绘场景）
+            idle_ms: 停止缩放/平移多久后恢复完整绘制质量（毫秒）
+        """
+        if smooth_zoom is not None:
+            self.smooth_zoom = smooth_zoom
+        if snapshot is not None:
+            self.interaction_snapshot = snapshot
+        if idle_ms is not None:
+            self._idle_timer.setInterval(int(idle_ms))
+            
+    def begin_interaction(self):
+        """进入（或延续）交互模式，空闲超时后自动恢复完整质量"""
+        if not self.interacting:
+            if self.interaction_snapshot:
+                # 快照取自交互开始前的完整质量画面（不含叠加层，叠加层每帧另外绘制）
+                overlay, self.profiler_overlay = self.profiler_overlay, False
+                self._snapshot = (self.viewport().grab(),
+                                  self.mapToScene(self.viewport().rect()).boundingRect())
+                self.profiler_overlay = overlay
+            self.interacting = True
+            self.setRenderHint(QPainter.Antialiasing, False)
+        self._idle_timer.start()
+        
+    def end_interaction(self):
+        """退出交互模式并以完整质量重绘"""
+        self._idle_timer.stop()
+        if self._zoom_timer.isActive() or self._pan_origin is not None:
+            # 动画或拖动还没结束，稍后再恢复
+            self._idle_timer.start()
+            return
+        if not self.interacting:
+            return
+        self.interacting = False
+        self._snapshot = None
+        self.setRenderHint(QPainter.Antialiasing, True)
+        self.viewport().update()
+        
+    def _paint_snapshot(self, event):
+        """交互期间把快照按当前变换绘制到视口，快照之外的区域只填充背景"""
+        pixmap, scene_rect = self._snapshot
+        painter = QPainter(self.viewport())
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        brush = self.scene().backgroundBrush() if self.scene() else self.backgroundBrush()
+        painter.fillRect(event.rect(), brush)
+        target = self.mapFromScene(scene_rect).boundingRect()
+        painter.drawPixmap(QRectF(target), pixmap, QRectF(pixmap.rect()))
+        if self.profiler_overlay:
+            # 快照模式不经过 drawForeground，叠加层在这里绘制（平移、缩放时正需要看帧时间）
+            self._draw_profiler_overlay(painter)
+        painter.end()
+        
+    def center_on_node(self, node_id):
+        """把模型中的节点移到视口中央（虚拟化模式下节点可以还没有图元），节点不存在时返回 False"""
+        record = self.scene().graph.node(node_id)
+        if record is None:
+            return False
+        center = QPointF(record.x + NODE_EXTENT[0] / 2, record.y + NODE_EXTENT[1] / 2)
+        # 场景范围不包含节点时无法滚动过去，先扩大到足以把节点放在中央
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        around = QRectF(0, 0, visible.width(), visible.height())
+        around.moveCenter(center)
+        self.setSceneRect(self.sceneRect().united(around))
+        self.centerOn(center)
+        return True
+        
+    def zoom_by(self, factor, anchor=None):
+        """缩放视图，保持锚点（视口坐标，默认视口中心）下的场景位置不动"""
+        if anchor is None:
+            anchor = QPointF(self.viewport().rect().center())
+        anchor = anchor.toPoint()
+        scene_pos = self.mapToScene(anchor)
+        self.scale(factor, factor)
+        moved = self.mapFromScene(scene_pos) - anchor
+        self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() + moved.x())
+        self.verticalScrollBar().setValue(self.verticalScrollBar().value() + moved.y())
+        
+    def _step_zoom(self):
+        """平滑缩放的一帧：完成剩余缩放量的一部分"""
+        remaining = self._zoom_remaining
+        stats = self._last_frame_stats
+        if abs(math.log(remaining)) < 0.005 or (stats is not None and stats['time_ms'] > ZOOM_FRAME_BUDGET):
+            # 接近目标，或者上一帧已经超出帧预算：一步到位，不再绘制中间帧
+            factor = remaining
+        else:
+            factor = remaining ** ZOOM_SMOOTHING
+        self._zoom_remaining = remaining / factor
+        if factor == remaining:
+            self._zoom_remaining = 1.0
+            self._zoom_timer.stop()
+        self.zoom_by(factor, self._zoom_anchor)
+        self.begin_interaction()
+        
+    def wheelEvent(self, event):
+        # 以光标为锚点缩放
         if event.angleDelta().y() > 0:
-            zoom_factor = zoom_in_factor
+            zoom_factor = ZOOM_STEP
         else:
-            zoom_factor = zoom_out_factor
+            zoom_factor = 1 / ZOOM_STEP
             
-        self.scale(zoom_factor, zoom_factor)
+        self.begin_interaction()
+        anchor = event.position()
+        if self.smooth_zoom:
+            self._zoom_remaining *= zoom_factor
+            self._zoom_anchor = anchor
+            if not self._zoom_timer.isActive():
+                self._zoom_timer.start()
+                self._step_zoom()
+        else:
+            self.zoom_by(zoom_factor, anchor)
+        event.accept()
+        
+    def mousePressEvent(self, event):
+        # 中键拖动平移视图
+        if event.button() == Qt.MiddleButton:
+            self._pan_origin = event.position()
+            self.viewport().setCursor(Qt.ClosedHandCursor)
+            self.begin_interaction()
+            event.accept()
+            return
+        super().mousePressEvent(event)
+        
+    def mouseMoveEvent(self, event):
+        if self._pan_origin is not None:
+            delta = event.position() - self._pan_origin
+            self._pan_origin = event.position()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - round(delta.x()))
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - round(delta.y()))
+            self.begin_interaction()
+            event.accept()
+            return
+        super().mouseMoveEvent(event)
+        
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MiddleButton and self._pan_origin is not None:
+            self._pan_origin = None
+            self.viewport().unsetCursor()
+            self.begin_interaction()  # 重新计时，空闲后恢复完整质量
+            event.accept()
+            return
+        super().mouseReleaseEvent(event)
         
     def dragEnterEvent(self, event):
         if event.mimeData().hasText():
@@ -0,0 +1,374 @@
+import time
+
+from PySide6.QtCore import QEvent, QLineF, QObject, QPointF, QRectF, QTimer, Signal, Qt
+from PySide6.QtGui import QPainter
+
+from model.graph import port_id
+from model.spatial import GridIndex
+from nodes.base_nodes import node_class
+from .connection import connection_pen
+from .materializer import NODE_EXTENT
+from .node import NODE_COLORS
+
+VIEWPORT_MARGIN = 0.5         # 视口四周额外创建图元的范围（视口宽高的比例）
+KEEP_MARGIN = 1.0             # 图元离开视口超过该范围才回收，来回平移时不会反复创建
+MAX_MATERIALIZED = 4000       # 范围内的节点超过该数量时不创建图元，只绘制概览；连接的另一端也计入这个上限
+POOL_LIMIT = 2000             # 每种图元最多保留的空闲图元数
+OVERVIEW_NODE_LIMIT = 100000  # 概览中逐个绘制节点矩形的上限，超过时按网格单元绘制密度
+
+
+class SceneVirtualizer(QObject):
+    """虚拟化场景：只为视口附近的节点和连接创建图元
+
+    流程数据全部保存在场景的 FlowGraph 中，GridIndex 按位置索引节点。视口变化时
+    为进入范围的节点创建图元（优先从对象池中取出复用），远离视口的图元回收到对象池，
+    场景中的图元数与流程规模无关。范围内的节点过多（视图缩得很小）时不创建图元，
+    由场景在前景中直接按模型绘制概览。
+
+    范围内节点的连接另一端在保留范围（KEEP_MARGIN）内时也创建图元，总数不超过 max_materialized；
+    其余连接（另一端很远，或连接极多的中心节点超出上限的部分）不创建连接线图元，
+    由场景在背景上按模型绘制为直线（draw_stubs）。
+
+    选中状态保存在图元上；select_nodes() 选中的、还没有图元的节点记在 hidden_selection 中，
+    创建图元时恢复选中。选中的节点、属性面板正在显示的节点和鼠标正在操作的节点不会被回收。
+
+    与 SceneMaterializer 一样提供 total / first_frame_ms / total_ms 和对应的信号，
+    加载文件时可以互换使用。
+    """
+    firstFrameReady = Signal(float)  # 首次按视口创建的图元已绘制（距开始加载的毫秒数）
+    finished = Signal(float)         # 同 firstFrameReady（虚拟化场景不会创建其余图元）
+
+    def __init__(self, scene, view, max_materialized=MAX_MATERIALIZED, parent=None):
+        super().__init__(parent)
+        self.scene = scene
+        self.view = view
+        self.max_materialized = max_materialized
+        self.index = GridIndex()
+        self.hidden_selection = set()  # 选中但没有图元的节点 id
+        self.overview = False          # 当前是否只绘制概览
+        self.started = None
+        self.first_frame_ms = None
+        self.total_ms = None
+        self.total = 0
+        self._node_pool = {}           # {节点类: [空闲的 Node, ...]}
+        self._connection_pool = []
+        self._stub_lines = []          # 另一端没有图元的连接（直线，场景坐标）
+        self._stub_nodes = set()       # 这些连接两端的节点 id（移动时需要重新计算直线）
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.refresh)
+
+        for bar in (view.horizontalScrollBar(), view.verticalScrollBar()):
+            bar.valueChanged.connect(self.schedule)
+            bar.rangeChanged.connect(self.schedule)
+        view.viewport().installEventFilter(self)
+
+    def detach(self):
+        """停止跟随视图（关闭虚拟化模式时调用）"""
+        self._timer.stop()
+        for bar in (self.view.horizontalScrollBar(), self.view.verticalScrollBar()):
+            bar.valueChanged.disconnect(self.schedule)
+            bar.rangeChanged.disconnect(self.schedule)
+        self.view.viewport().removeEventFilter(self)
+        self._node_pool.clear()
+        self._connection_pool.clear()
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Resize:
+            self.schedule()
+        return False
+
+    # ---- 模型 ----
+
+    def reset(self, started=None):
+        """场景的 FlowGraph 被整体替换：重建空间索引，在下一轮事件循环按视口创建图元"""
+        self.started = time.perf_counter() if started is None else started
+        self.first_frame_ms = None
+        self.total_ms = None
+        self.index.rebuild(self.scene.graph)
+        self.total = len(self.index)
+        self.hidden_selection.clear()
+        self.schedule()
+
+    def clear(self):
+        """场景被清空"""
+        self.index.clear()
+        self.hidden_selection.clear()
+        self.overview = False
+        self._stub_lines = []
+        self._stub_nodes = set()
+
+    def node_added(self, record):
+        self.index.insert(record.id, record.x, record.y)
+
+    def node_removed(self, record):
+        self.index.remove(record.id, record.x, record.y)
+        self.hidden_selection.discard(record.id)
+
+    def node_moved(self, node_id, old_x, old_y, x, y):
+        self.index.move(node_id, old_x, old_y, x, y)
+        if node_id in self._stub_nodes:
+            self.schedule()
+
+    def stop(self):
+        """取消尚未进行的按视口创建"""
+        self._timer.stop()
+
+    # ---- 按视口创建和回收 ----
+
+    def schedule(self, *args):
+        """视口变化后在下一轮事件循环刷新（同一轮中的多次变化只刷新一次）"""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def visible_rect(self):
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        return None if rect.isEmpty() else rect
+
+    def refresh(self):
+        """为视口附近的节点创建图元，回收远离视口的图元"""
+        self._timer.stop()
+        rect = self.visible_rect()
+        if rect is None:
+            return
+        scene = self.scene
+        graph = scene.graph
+        width, height = rect.width(), rect.height()
+        # 记录保存的是节点左上角，范围向左上多扩展一个节点大小
+        region = rect.adjusted(-width * VIEWPORT_MARGIN - NODE_EXTENT[0], -height * VIEWPORT_MARGIN - NODE_EXTENT[1],
+                               width * VIEWPORT_MARGIN, height * VIEWPORT_MARGIN)
+        keep = rect.adjusted(-width * KEEP_MARGIN - NODE_EXTENT[0], -height * KEEP_MARGIN - NODE_EXTENT[1],
+                             width * KEEP_MARGIN, height * KEEP_MARGIN)
+        bounds = (region.left(), region.top(), region.right(), region.bottom())
+
+        overview = self.index.count(*bounds) > self.max_materialized
+        if overview != self.overview:
+            self.overview = overview
+            scene.update()
+        left, top, right, bottom = keep.left(), keep.top(), keep.right(), keep.bottom()
+        wanted = set()
+        far_edges = []  # 另一端不创建图元的连接
+        if not overview:
+            region_ids = self.index.query(*bounds)
+            wanted.update(region_ids)
+            # 连接线的另一端在保留范围内时也创建图元，跨出视口的连接线才能画出来；
+            # 更远的另一端（以及超出上限的部分）不创建，连接按模型绘制
+            records = graph.nodes
+            budget = self.max_materialized - len(wanted)
+            for node_id in region_ids:
+                for edges, downstream in ((graph.out_edges(node_id), True), (graph.in_edges(node_id), False)):
+                    for edge in edges:
+                        other = edge.target if downstream else edge.source
+                        if other in wanted:
+                            continue
+                        record = records[other]
+                        if budget > 0 and left <= record.x <= right and top <= record.y <= bottom:
+                            wanted.add(other)
+                            budget -= 1
+                        else:
+                            far_edges.append(edge)
+
+        pinned = scene.pinned_items()
+        with scene.batch_update():
+            with scene.recycling():
+                for node in list(scene.node_items()):
+                    if node.node_id in wanted or node in pinned:
+                        continue
+                    record = node.record
+                    if not overview and left <= record.x <= right and top <= record.y <= bottom:
+                        continue
+                    self._release_node(node)
+
+            created = []
+            for node_id in wanted:
+                if scene.node_item(node_id) is None:
+                    record = graph.node(node_id)
+                    if record is not None:
+                        created.append(self._acquire_node(record))
+            for node in created:
+                self._connect(node)
+
+        self._update_stubs(far_edges)
+        if self.first_frame_ms is None:
+            self.view.viewport().repaint()
+            self.first_frame_ms = self.total_ms = (time.perf_counter() - self.started) * 1000
+            self.firstFrameReady.emit(self.first_frame_ms)
+            self.finished.emit(self.total_ms)
+
+    def _update_stubs(self, edges):
+        """按模型计算 edges 中仍有一端没有图元的连接的直线
+
+        同一个端口连到同一个网格单元中多个远端节点的连接只画一条（中心节点的上万条连接
+        合并为每个单元一条），直线数与远端节点分布的单元数有关，与连接数无关。
+        """
+        scene = self.scene
+        records = scene.graph.nodes
+        size = self.index.cell_size
+        lines = {}  # {(图元一端的节点 id, 是否输出端口, 端口序号, 远端所在单元): QLineF}
+        stub_nodes = set()
+        for edge in edges:
+            source = scene.node_item(edge.source)
+            target = scene.node_item(edge.target)
+            if source is not None and target is not None:
+                continue
+            stub_nodes.add(edge.source)
+            stub_nodes.add(edge.target)
+            if source is not None:
+                far = records[edge.target]
+                key = (edge.source, True, edge.source_port, far.x // size, far.y // size)
+                if key not in lines:
+                    lines[key] = QLineF(source.get_port_pos(True, edge.source_port),
+                                        _record_port_pos(far, False, edge.target_port))
+            elif target is not None:
+                far = records[edge.source]
+                key = (edge.target, False, edge.target_port, far.x // size, far.y // size)
+                if key not in lines:
+                    lines[key] = QLineF(_record_port_pos(far, True, edge.source_port),
+                                        target.get_port_pos(False, edge.target_port))
+        if lines or self._stub_lines:
+            scene.update()
+        self._stub_lines = list(lines.values())
+        self._stub_nodes = stub_nodes
+
+    def draw_stubs(self, painter, rect):
+        """绘制另一端没有图元的连接（细直线，画在节点下面）"""
+        if not self._stub_lines or self.overview:
+            return
+        painter.save()
+        painter.setPen(connection_pen('normal', cosmetic=True))
+        painter.drawLines(self._stub_lines)
+        painter.restore()
+
+    def materialize(self, node_id):
+        """立即为节点创建图元（连同两端都有图元的连接），节点不存在时返回 None
+
+        用于撤销、删除等需要操作图元的场合；远离视口的图元在下一次刷新时回收。
+        """
+        node = self.scene.node_item(node_id)
+        if node is not None:
+            return node
+        record = self.scene.graph.node(node_id)
+        if record is None:
+            return None
+        node = self._acquire_node(record)
+        self._connect(node)
+        self.schedule()
+        return node
+
+    def _acquire_node(self, record):
+        cls = node_class(record.type)
+        pool = self._node_pool.get(cls)
+        if pool:
+            node = pool.pop()
+            node.rebind(record)
+        else:
+            node = cls.from_record(record)
+        self.scene.addItem(node)
+        if record.id in self.hidden_selection:
+            self.hidden_selection.discard(record.id)
+            node.setSelected(True)
+        return node
+
+    def _connect(self, node):
+        """为节点上另一端也有图元的连接创建连接线"""
+        scene = self.scene
+        graph = scene.graph
+        record = node.record
+        for port in record.port_ids():
+            for edge in graph.port_edges(record.id, port):
+                if scene.connection_item(edge.id) is not None:
+                    continue
+                source = scene.node_item(edge.source)
+                target = scene.node_item(edge.target)
+                if source is None or target is None:
+                    continue
+                connection = self._connection_pool.pop() if self._connection_pool else None
+                scene.create_connection(source, target, port_id(True, edge.source_port),
+                                        port_id(False, edge.target_port), edge_id=edge.id,
+                                        connection=connection)
+
+    def _release_node(self, node):
+        """回收节点图元及其连接线（模型中的记录保持不变）"""
+        for connection in [c for connections in node.connections.values() for c in connections]:
+            self._release_connection(connection)
+        self.scene.removeItem(node)
+        node.connections = {}
+        pool = self._node_pool.setdefault(type(node), [])
+        if len(pool) < POOL_LIMIT:
+            pool.append(node)
+
+    def _release_connection(self, connection):
+        for item, port in ((connection.start_item, connection.start_port),
+                           (connection.end_item, connection.end_port)):
+            if item is not None:
+                item.remove_connection(connection, port)
+        if connection.scene() is self.scene:
+            self.scene.removeItem(connection)
+        connection.reset()
+        if len(self._connection_pool) < POOL_LIMIT:
+            self._connection_pool.append(connection)
+
+    # ---- 选择 ----
+
+    def select(self, node_ids):
+        """选中节点：有图元的直接选中，其余记入 hidden_selection"""
+        scene = self.scene
+        for node_id in node_ids:
+            node = scene.node_item(node_id)
+            if node is not None:
+                node.setSelected(True)
+            elif node_id in scene.graph:
+                self.hidden_selection.add(node_id)
+
+    def move_hidden_selection(self, dx, dy):
+        """拖动选中的节点时，没有图元的选中节点随之移动"""
+        if not self.hidden_selection or (not dx and not dy):
+            return
+        scene = self.scene
+        graph = scene.graph
+        for node_id in self.hidden_selection:
+            record = graph.node(node_id)
+            if record is None:
+                continue
+            old_x, old_y = record.x, record.y
+            graph.move_node(node_id, old_x + dx, old_y + dy)
+            self.index.move(node_id, old_x, old_y, record.x, record.y)
+            scene.record_moved(node_id, old_x, old_y, record.x, record.y)
+
+    # ---- 概览 ----
+
+    def draw_overview(self, painter, rect):
+        """直接按模型绘制 rect 范围内的节点（纯色矩形；节点过多时按网格单元绘制密度）"""
+        cells = self.index.cells_in(rect.left() - NODE_EXTENT[0], rect.top() - NODE_EXTENT[1],
+                                    rect.right(), rect.bottom())
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(Qt.NoPen)
+        if sum(len(ids) for _, ids in cells) <= OVERVIEW_NODE_LIMIT:
+            nodes = self.scene.graph.nodes
+            width, height = NODE_EXTENT
+            rects = {}  # {节点类型: [QRectF, ...]}，每种颜色只设置一次画刷
+            for _, ids in cells:
+                for node_id in ids:
+                    record = nodes[node_id]
+                    rects.setdefault(record.type, []).append(QRectF(record.x, record.y, width, height))
+            for node_type, group in rects.items():
+                painter.setBrush(NODE_COLORS.get(node_type, NODE_COLORS['default'])['bg'])
+                painter.drawRects(group)
+        else:
+            size = self.index.cell_size
+            capacity = (size * size) / (NODE_EXTENT[0] * NODE_EXTENT[1])  # 一个单元能放下的节点数
+            color = NODE_COLORS['default']['bg']
+            for (cx, cy), ids in cells:
+                shade = color.toRgb()
+                shade.setAlphaF(min(1.0, 0.15 + len(ids) / capacity))
+                painter.fillRect(QRectF(cx * size, cy * size, size, size), shade)
+        painter.restore()
+
+
+def _record_port_pos(record, is_output, index):
+    """按节点记录计算端口位置（与 Node.port_local_pos 的排列一致，场景坐标）"""
+    count = len(record.outputs) if is_output else len(record.inputs)
+    width, height = NODE_EXTENT
+    return QPointF(record.x + (width if is_output else 0), record.y + height * (index + 1) / (max(count, 1) + 1))
@@ -1,18 +1,28 @@
 import sys
-from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
-from PySide6.QtCore import Qt
+import time
+from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QFileDialog, QMessageBox
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QAction, QKeySequence
 from editor.scene import NodeScene
 from editor.view import NodeView
+from editor.autosave import Autosave
 from widgets.node_palette import NodePalette
 from widgets.properties_panel import PropertiesPanel
+from widgets.search_panel import SearchPanel
 from nodes.base_nodes import InputNode, OutputNode, ProcessNode
+from model.flow_file import FlowFileError
+from model.flow_binary import BINARY_SUFFIX
+from model import journal
+from model.validation import PROBLEM_TEXT
+
+FLOW_FILE_FILTER = "流程文件 (*.flow *.json);;二进制流程文件 (*.nflow);;所有文件 (*)"
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Node Editor")
-        self.initUI()
         self.view = None  # 将在initUI中初始化
+        self.initUI()
         
     def initUI(self):
         # 创建中央部件
@@ -33,12 +43,177 @@ class MainWindow(QMainWindow):
         # 创建属性面板
         self.properties_panel = PropertiesPanel()
         self.addDockWidget(Qt.RightDockWidgetArea, self.properties_panel)
-        self.scene.nodeSelected.connect(self.properties_panel.showNodeProperties)
+        self.scene.set_properties_panel(self.properties_panel)
+        
+        # 创建搜索面板
+        self.search_panel = SearchPanel(self.scene)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.search_panel)
+        self.search_panel.nodeActivated.connect(self.jumpToNode)
+        self.search_panel.selectAllRequested.connect(self.scene.select_nodes)
+        
+        # 血缘追踪完成后在状态栏显示结果（Esc 清除高亮）
+        self.scene.lineageTraced.connect(
+            lambda nodes, edges: self.statusBar().showMessage(f"血缘：{nodes} 个节点，{edges} 条连接（Esc 清除）"))
+        
+        # 自动保存：窗口显示后检查上次的自动保存日志，再开始记录
+        self.autosave = Autosave(self.scene, parent=self)
+        QTimer.singleShot(0, self.startAutosave)
+        
+        # 创建文件菜单
+        self.initMenu()
         
         # 设置窗口大小
         #self.setGeometry(100, 100, 1200, 800)
         self.showMaximized()
         
+    def initMenu(self):
+        file_menu = self.menuBar().addMenu("文件")
+        
+        open_action = QAction("打开...", self)
+        open_action.setShortcut(QKeySequence.Open)
+        open_action.triggered.connect(self.openFlow)
+        file_menu.addAction(open_action)
+        
+        save_action = QAction("保存...", self)
+        save_action.setShortcut(QKeySequence.Save)
+        save_action.triggered.connect(self.saveFlow)
+        file_menu.addAction(save_action)
+        
+        edit_menu = self.menuBar().addMenu("编辑")
+        
+        self.undo_action = QAction("撤销", self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(self.undo_action)
+        
+        self.redo_action = QAction("重做", self)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(self.redo_action)
+        
+        find_action = QAction("查找节点...", self)
+        find_action.setShortcut(QKeySequence.Find)
+        find_action.triggered.connect(self.search_panel.focusSearch)
+        edit_menu.addAction(find_action)
+        
+        self.scene.undo_stack.changed.connect(self.updateUndoActions)
+        self.updateUndoActions()
+        
+        layout_menu = self.menuBar().addMenu("布局")
+        
+        layout_action = QAction("自动布局", self)
+        layout_action.setShortcut(QKeySequence("Ctrl+L"))
+        layout_action.triggered.connect(self.autoLayout)
+        layout_menu.addAction(layout_action)
+        
+        layout_new_action = QAction("布局新节点", self)
+        layout_new_action.setShortcut(QKeySequence("Ctrl+Shift+L"))
+        layout_new_action.triggered.connect(lambda: self.autoLayout(incremental=True))
+        layout_menu.addAction(layout_new_action)
+        
+        validate_action = QAction("校验流程", self)
+        validate_action.setShortcut(QKeySequence("F7"))
+        validate_action.triggered.connect(self.validateFlow)
+        layout_menu.addAction(validate_action)
+        
+    def updateUndoActions(self):
+        stack = self.scene.undo_stack
+        self.undo_action.setEnabled(stack.can_undo())
+        self.undo_action.setText(f"撤销 {stack.undo_text()}".strip())
+        self.redo_action.setEnabled(stack.can_redo())
+        self.redo_action.setText(f"重做 {stack.redo_text()}".strip())
+        
+    def undo(self):
+        self.scene.undo_stack.undo()
+        self.refreshProperties()
+        
+    def redo(self):
+        self.scene.undo_stack.redo()
+        self.refreshProperties()
+        
+    def jumpToNode(self, node_id):
+        """把节点移到视图中央并选中"""
+        if self.view.center_on_node(node_id):
+            self.scene.select_nodes([node_id])
+            
+    def autoLayout(self, incremental=False):
+        """选中了多个节点时只布局选中的节点，否则布局整个流程"""
+        node_ids = None
+        if not incremental:
+            selected = self.scene.selected_node_ids()
+            node_ids = selected if len(selected) > 1 else None
+        started = time.perf_counter()
+        count = self.scene.auto_layout(node_ids, incremental=incremental)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.statusBar().showMessage(f"已布局 {count} 个节点，用时 {elapsed:.0f} ms", 5000)
+        
+    def validateFlow(self):
+        """全量校验流程，有问题的节点和连接在场景中标出，汇总显示在状态栏"""
+        started = time.perf_counter()
+        summary = self.scene.validate_flow()
+        elapsed = (time.perf_counter() - started) * 1000
+        if summary:
+            text = "，".join(f"{PROBLEM_TEXT[kind]} {count}" for kind, count in summary.items())
+            self.statusBar().showMessage(f"校验完成（{elapsed:.0f} ms）：{text}")
+        else:
+            self.statusBar().showMessage(f"校验完成（{elapsed:.0f} ms）：没有发现问题", 5000)
+        
+    def refreshProperties(self):
+        """撤销/重做后让属性面板显示节点的当前值（节点已被删除时隐藏面板）"""
+        node = self.properties_panel.current_node
+        if node is not None:
+            self.properties_panel.showNodeProperties(node if node.scene() is self.scene else None)
+        
+    def openFlow(self):
+        path, _ = QFileDialog.getOpenFileName(self, "打开流程", "", FLOW_FILE_FILTER)
+        if not path:
+            return
+        try:
+            loader = self.scene.load_flow(path, self.view)
+        except (OSError, FlowFileError) as e:
+            QMessageBox.warning(self, "打开失败", str(e))
+            return
+        total = loader.total
+        self.statusBar().showMessage(f"正在加载 {total} 个节点...")
+        loader.firstFrameReady.connect(
+            lambda ms: self.statusBar().showMessage(f"已可操作（{ms:.0f} ms），正在创建其余 {total} 个节点..."))
+        loader.finished.connect(
+            lambda ms: self.statusBar().showMessage(f"加载完成：{total} 个节点，用时 {ms:.0f} ms", 5000))
+        
+    def saveFlow(self):
+        path, selected_filter = QFileDialog.getSaveFileName(self, "保存流程", "", FLOW_FILE_FILTER)
+        if not path:
+            return
+        # 选择二进制格式但没有写扩展名时补上，保存格式由扩展名决定
+        if BINARY_SUFFIX in selected_filter and not path.endswith(BINARY_SUFFIX):
+            path += BINARY_SUFFIX
+        try:
+            self.scene.save_flow(path, self.view)
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", str(e))
+            return
+        self.statusBar().showMessage(f"已保存到 {path}", 5000)
+        
+    def startAutosave(self):
+        directory = self.autosave.journal.directory
+        if journal.has_recovery(directory):
+            answer = QMessageBox.question(self, "恢复自动保存", "发现上次未保存的编辑，是否恢复？")
+            if answer == QMessageBox.Yes:
+                try:
+                    graph = journal.recover(directory)
+                except (OSError, ValueError, KeyError, IndexError) as e:
+                    QMessageBox.warning(self, "恢复失败", str(e))
+                else:
+                    self.scene.show_graph(graph, self.view)
+                    self.autosave.start(resume=True)
+                    return
+        self.autosave.start()
+        
+    def closeEvent(self, event):
+        # 写出最后一轮编辑，下次启动时仍可以恢复未保存的修改
+        self.autosave.stop()
+        super().closeEvent(event)
+        
     def createNode(self, node_type):
         if node_type == "Input":
             node = InputNode()
@@ -54,9 +229,8 @@ class MainWindow(QMainWindow):
         
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Delete:
-            # 删除选中的项目
-            for item in self.scene.selectedItems():
-                self.scene.removeItem(item)
+            # 删除选中的项目（连同节点的连接线，可以撤销）
+            self.scene.delete_selected()
 
 def main():
     app = QApplication(sys.argv)
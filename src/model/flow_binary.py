@@ -0,0 +1,331 @@
+"""紧凑的二进制流程文件格式（与 Qt 无关）
+
+与 flow_file 的 JSON 格式保存相同的内容，可以无损地互相转换，但按列存放定宽数组：
+
+    头部    magic、版本、节点/连接/端口/字符串数量、各数据段的 (偏移, 长度) 表
+    节点列  id、类型、标题、x、y、端口起始位置、输入端口数、属性偏移
+    端口列  名称、类型（每个节点的输入端口在前，输出端口在后）
+    连接列  id、source、source_port、target、target_port
+    字符串表  偏移数组 + UTF-8 数据（类型、标题、端口名称和类型只保存一份）
+    属性    每个节点的属性以 JSON 保存，由节点列中的偏移定位
+    附加信息  JSON 头部字段（例如保存时的视图状态）
+
+所有数值为小端序，每个数据段按 8 字节对齐。文件通过 mmap 打开，
+各列直接以 memoryview 访问：读取节点位置或连接关系不需要解析整个文件。
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from .flow_file import FLOW_FORMAT, FlowFileError, load_flow
+from .graph import FlowGraph, NodeRecord, bulk_update
+
+BINARY_MAGIC = b'NFLOWBIN'
+BINARY_VERSION = 1
+BINARY_SUFFIX = '.nflow'
+
+# 数据段：(名称, array 类型码)，类型码为 None 的是字节数据
+_SECTIONS = (
+    ('node_id', 'q'),
+    ('node_type', 'I'),
+    ('node_title', 'I'),
+    ('node_x', 'd'),
+    ('node_y', 'd'),
+    ('node_ports', 'I'),    # 节点 i 的端口为 ports[node_ports[i]:node_ports[i + 1]]
+    ('node_inputs', 'I'),   # 其中前 node_inputs[i] 个为输入端口
+    ('node_props', 'Q'),    # 节点 i 的属性为 props[node_props[i]:node_props[i + 1]]
+    ('port_name', 'I'),
+    ('port_type', 'I'),
+    ('edge_id', 'q'),
+    ('edge_source', 'q'),
+    ('edge_source_port', 'I'),
+    ('edge_target', 'q'),
+    ('edge_target_port', 'I'),
+    ('string_offsets', 'Q'),
+    ('string_data', None),
+    ('props', None),
+    ('meta', None),
+)
+
+_HEADER = struct.Struct('<8sII4Q')   # magic, 版本, 数据段数, 节点/连接/端口/字符串数量
+_SECTION_ENTRY = struct.Struct('<QQ')  # 数据段的偏移和字节长度
+_ALIGNMENT = 8
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def is_binary_flow(path):
+    """文件是否为二进制流程文件（检查文件开头的 magic）"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except OSError:
+        return False
+
+
+def save_flow_binary(graph, path, view=None):
+    """把流程保存为二进制格式
+
+    Args:
+        graph: FlowGraph
+        path: 文件路径
+        view: 可选的视图状态，与 flow_file.save_flow 相同
+    """
+    strings = {}
+
+    def intern(text):
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    columns = {name: array(code) for name, code in _SECTIONS if code is not None}
+    props = bytearray()
+    node_ports = columns['node_ports']
+    node_props = columns['node_props']
+    port_name = columns['port_name']
+    port_type = columns['port_type']
+    for record in graph.nodes.values():
+        columns['node_id'].append(record.id)
+        columns['node_type'].append(intern(record.type))
+        columns['node_title'].append(intern(record.title))
+        columns['node_x'].append(record.x)
+        columns['node_y'].append(record.y)
+        node_ports.append(len(port_name))
+        columns['node_inputs'].append(len(record.inputs))
+        for names, types in ((record.inputs, record.input_types), (record.outputs, record.output_types)):
+            for name, type_name in zip(names, types):
+                port_name.append(intern(name))
+                port_type.append(intern(type_name))
+        node_props.append(len(props))
+        if record.properties:
+            props += json.dumps(record.properties, ensure_ascii=False).encode('utf-8')
+    node_ports.append(len(port_name))
+    node_props.append(len(props))
+
+    for edge in graph.edges.values():
+        columns['edge_id'].append(edge.id)
+        columns['edge_source'].append(edge.source)
+        columns['edge_source_port'].append(edge.source_port)
+        columns['edge_target'].append(edge.target)
+        columns['edge_target_port'].append(edge.target_port)
+
+    string_data = bytearray()
+    string_offsets = columns['string_offsets']
+    for text in strings:
+        string_offsets.append(len(string_data))
+        string_data += text.encode('utf-8')
+    string_offsets.append(len(string_data))
+
+    meta = {'view': view} if view is not None else {}
+    blobs = {
+        'string_data': string_data,
+        'props': props,
+        'meta': json.dumps(meta, ensure_ascii=False).encode('utf-8'),
+    }
+
+    payloads = []
+    for name, code in _SECTIONS:
+        if code is None:
+            payloads.append(bytes(blobs[name]))
+        else:
+            column = columns[name]
+            if not _LITTLE_ENDIAN:
+                column.byteswap()
+            payloads.append(column.tobytes())
+
+    offset = _align(_HEADER.size + _SECTION_ENTRY.size * len(_SECTIONS))
+    table = []
+    for payload in payloads:
+        table.append((offset, len(payload)))
+        offset = _align(offset + len(payload))
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(_SECTIONS),
+                             len(graph.nodes), len(graph.edges), len(port_name), len(strings)))
+        for entry in table:
+            f.write(_SECTION_ENTRY.pack(*entry))
+        for (section_offset, _), payload in zip(table, payloads):
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(payload)
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class BinaryFlow:
+    """以 mmap 打开的二进制流程文件
+
+    节点和连接的各列是直接映射文件内容的 memoryview（例如 node_x、edge_source），
+    按下标访问即可，不会解析其余数据。用完后调用 close()，或作为上下文管理器使用。
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise FlowFileError("不是二进制流程文件") from None
+        self._views = []
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        data = self._mmap
+        if len(data) < _HEADER.size:
+            raise FlowFileError("不是二进制流程文件")
+        (magic, version, section_count, self.node_count, self.edge_count,
+         self.port_count, self.string_count) = _HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise FlowFileError("不是二进制流程文件")
+        if version > BINARY_VERSION:
+            raise FlowFileError(f"不支持的流程文件版本: {version}")
+        if section_count < len(_SECTIONS):
+            raise FlowFileError("二进制流程文件缺少数据段")
+
+        expected = {
+            'node': self.node_count, 'port': self.port_count, 'edge': self.edge_count,
+        }
+        position = _HEADER.size
+        for name, code in _SECTIONS:
+            offset, length = _SECTION_ENTRY.unpack_from(data, position)
+            position += _SECTION_ENTRY.size
+            if offset + length > len(data):
+                raise FlowFileError("二进制流程文件不完整")
+            view = memoryview(data)[offset:offset + length]
+            self._views.append(view)
+            if code is not None:
+                if length % array(code).itemsize:
+                    raise FlowFileError(f"二进制流程文件数据段长度错误: {name}")
+                view = view.cast(code)
+                self._views.append(view)
+                if not _LITTLE_ENDIAN:
+                    view = array(code, view)
+                    view.byteswap()
+                count = expected.get(name.partition('_')[0])
+                if name in ('node_ports', 'node_props'):
+                    count = self.node_count + 1
+                elif name == 'string_offsets':
+                    count = self.string_count + 1
+                if count is not None and len(view) != count:
+                    raise FlowFileError(f"二进制流程文件数据段长度错误: {name}")
+            setattr(self, name, view)
+        self.header = {'format': FLOW_FORMAT, 'version': BINARY_VERSION,
+                       'node_count': self.node_count, 'edge_count': self.edge_count}
+        self.header.update(json.loads(bytes(self.meta)) if len(self.meta) else {})
+
+    def close(self):
+        """释放映射（之后不能再访问各列）"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.node_count
+
+    def string(self, index):
+        """字符串表中的第 index 个字符串"""
+        offsets = self.string_offsets
+        return str(self.string_data[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def position(self, index):
+        """第 index 个节点的位置 (x, y)"""
+        return self.node_x[index], self.node_y[index]
+
+    def edge(self, index):
+        """第 index 个连接 (id, source, source_port, target, target_port)"""
+        return (self.edge_id[index], self.edge_source[index], self.edge_source_port[index],
+                self.edge_target[index], self.edge_target_port[index])
+
+    def node_record(self, index, strings=None):
+        """为第 index 个节点创建 NodeRecord（strings 为预先解码的字符串表）"""
+        string = strings.__getitem__ if strings is not None else self.string
+        record = NodeRecord(string(self.node_type[index]), string(self.node_title[index]),
+                            self.node_x[index], self.node_y[index], self.node_id[index])
+        start, end = self.node_ports[index], self.node_ports[index + 1]
+        split = start + self.node_inputs[index]
+        port_name, port_type = self.port_name, self.port_type
+        record.inputs = [string(port_name[i]) for i in range(start, split)]
+        record.input_types = [string(port_type[i]) for i in range(start, split)]
+        record.outputs = [string(port_name[i]) for i in range(split, end)]
+        record.output_types = [string(port_type[i]) for i in range(split, end)]
+        props_start, props_end = self.node_props[index], self.node_props[index + 1]
+        if props_end > props_start:
+            record.properties = json.loads(bytes(self.props[props_start:props_end]))
+        return record
+
+    def to_graph(self, graph=None):
+        """把全部节点和连接读入 FlowGraph"""
+        graph = FlowGraph() if graph is None else graph
+        strings = [self.string(i) for i in range(self.string_count)]
+        # 先把各列整体转换为列表，循环中按下标访问列表比访问 memoryview 快
+        port_names = [strings[i] for i in self.port_name.tolist()]
+        port_types = [strings[i] for i in self.port_type.tolist()]
+        node_ports = self.node_ports.tolist()
+        node_props = self.node_props.tolist()
+        props = self.props
+        insert_node = graph.insert_node
+        with bulk_update():
+            for index, (node_id, node_type, title, x, y, inputs) in enumerate(zip(
+                    self.node_id.tolist(), self.node_type.tolist(), self.node_title.tolist(),
+                    self.node_x.tolist(), self.node_y.tolist(), self.node_inputs.tolist())):
+                record = NodeRecord(strings[node_type], strings[title], x, y)
+                start, end = node_ports[index], node_ports[index + 1]
+                split = start + inputs
+                record.inputs = port_names[start:split]
+                record.input_types = port_types[start:split]
+                record.outputs = port_names[split:end]
+                record.output_types = port_types[split:end]
+                props_start, props_end = node_props[index], node_props[index + 1]
+                if props_end > props_start:
+                    record.properties = json.loads(bytes(props[props_start:props_end]))
+                insert_node(record, node_id)
+            add_edge = graph.add_edge
+            for edge in zip(self.edge_source.tolist(), self.edge_source_port.tolist(),
+                            self.edge_target.tolist(), self.edge_target_port.tolist(),
+                            self.edge_id.tolist()):
+                add_edge(*edge)
+        return graph
+
+
+def load_flow_binary(path, graph=None):
+    """加载二进制流程文件，返回值与 flow_file.load_flow 相同
+
+    Returns:
+        (graph, header)
+    """
+    with BinaryFlow(path) as flow:
+        try:
+            graph = flow.to_graph(graph)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            if isinstance(e, FlowFileError):
+                raise
+            raise FlowFileError(f"二进制流程文件数据错误: {e}") from e
+        return graph, flow.header
+
+
+def load_any_flow(path):
+    """加载流程文件，按文件开头的 magic 区分二进制格式和 JSON 格式
+
+    Returns:
+        (graph, header)
+    """
+    if is_binary_flow(path):
+        return load_flow_binary(path)
+    return load_flow(path)
@@ -0,0 +1,226 @@
+"""流程文件的保存和流式加载（与 Qt 无关）
+
+文件是一个 JSON 对象，头部字段在前，节点和连接数组在后：
+
+    {"format": "node-flow", "version": 1, "view": {...},
+     "nodes": [
+      {"id": 1, "type": "Input", "title": "Input", "x": 0, "y": 0,
+       "inputs": [], "outputs": [["output", "any"]], "properties": {}},
+      ...
+     ],
+     "edges": [
+      [1, 1, 0, 2, 0],
+      ...
+     ]}
+
+连接以 [id, source, source_port, target, target_port] 的紧凑数组保存（端口为序号）。
+加载时按块读取文件，逐个解析数组元素，不需要把整个文件读入内存再一次性解析。
+"""
+import json
+
+from .graph import FlowGraph, NodeRecord, bulk_update
+
+FLOW_FORMAT = "node-flow"
+FLOW_VERSION = 1
+FRAGMENT_FORMAT = "node-flow-fragment"  # 复制到剪贴板的流程片段
+READ_CHUNK_SIZE = 1 << 16  # 每次从文件读取的字符数
+
+_WHITESPACE = ' \t\r\n'
+
+
+class FlowFileError(ValueError):
+    """流程文件格式错误"""
+
+
+def node_to_dict(record):
+    return {
+        'id': record.id,
+        'type': record.type,
+        'title': record.title,
+        'x': record.x,
+        'y': record.y,
+        'inputs': [list(port) for port in zip(record.inputs, record.input_types)],
+        'outputs': [list(port) for port in zip(record.outputs, record.output_types)],
+        'properties': record.properties,
+    }
+
+
+def node_from_dict(data):
+    record = NodeRecord(data['type'], data.get('title'), data.get('x', 0.0), data.get('y', 0.0))
+    for name, port_type in data.get('inputs', ()):
+        record.add_port(False, name, port_type)
+    for name, port_type in data.get('outputs', ()):
+        record.add_port(True, name, port_type)
+    record.properties = dict(data.get('properties') or {})
+    return record
+
+
+def fragment_to_dict(graph, node_ids):
+    """节点子集及其内部连接的紧凑表示（剪贴板格式）
+
+    连接以 [source, source_port, target, target_port] 保存，节点 id 只在片段内部有意义，
+    粘贴时重新分配。
+    """
+    nodes = graph.nodes
+    records = [nodes[node_id] for node_id in node_ids if node_id in nodes]
+    edges = graph.internal_edges(record.id for record in records)
+    return {
+        'format': FRAGMENT_FORMAT,
+        'nodes': [node_to_dict(record) for record in records],
+        'edges': [[edge.source, edge.source_port, edge.target, edge.target_port] for edge in edges],
+    }
+
+
+def save_flow(graph, path, view=None):
+    """把流程写入文件（逐个节点写出，不在内存中拼出整个文档）
+
+    Args:
+        graph: FlowGraph
+        path: 文件路径
+        view: 可选的视图状态，例如 {"center": [x, y], "scale": 1.0}，加载时先显示这一区域
+    """
+    dumps = json.dumps
+    with open(path, 'w', encoding='utf-8') as f:
+        header = {'format': FLOW_FORMAT, 'version': FLOW_VERSION,
+                  'node_count': len(graph.nodes), 'edge_count': len(graph.edges)}
+        if view is not None:
+            header['view'] = view
+        f.write(dumps(header, ensure_ascii=False)[:-1])
+        f.write(',\n "nodes": [')
+        separator = '\n  '
+        for record in graph.nodes.values():
+            f.write(separator)
+            f.write(dumps(node_to_dict(record), ensure_ascii=False))
+            separator = ',\n  '
+        f.write('\n ],\n "edges": [')
+        separator = '\n  '
+        for edge in graph.edges.values():
+            f.write(separator)
+            f.write(f'[{edge.id}, {edge.source}, {edge.source_port}, {edge.target}, {edge.target_port}]')
+            separator = ',\n  '
+        f.write('\n ]}\n')
+
+
+class _StreamReader:
+    """在按块读入的文本上逐个解码 JSON 值"""
+
+    def __init__(self, f, chunk_size):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """读入下一块，返回是否读到了新数据"""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # 丢弃已经解析过的部分
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束时返回 ''）"""
+        while True:
+            buffer, pos = self._buffer, self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise FlowFileError(f"流程文件格式错误：此处应为 {char!r}")
+        self._pos += 1
+
+    def value(self):
+        """解码下一个完整的 JSON 值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # 值跨越了块边界，读入更多数据再试
+                if self._fill():
+                    continue
+                raise FlowFileError("流程文件不完整或格式错误") from None
+            if end == len(self._buffer) and not self._eof:
+                # 数字等值可能被块边界截断，确认后面还有内容再接受
+                if self._fill():
+                    continue
+            self._pos = end
+            return value
+
+
+def iter_flow(path, chunk_size=READ_CHUNK_SIZE):
+    """流式解析流程文件
+
+    Yields:
+        ('header', dict)，然后依次为 ('node', dict) 和 ('edge', list)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect('{')
+        header = {}
+        header_sent = False
+        while reader.peek() != '}':
+            key = reader.value()
+            reader.expect(':')
+            if key in ('nodes', 'edges'):
+                if not header_sent:
+                    yield 'header', header
+                    header_sent = True
+                kind = key[:-1]
+                reader.expect('[')
+                while reader.peek() != ']':
+                    yield kind, reader.value()
+                    if reader.peek() == ',':
+                        reader.expect(',')
+                reader.expect(']')
+            else:
+                header[key] = reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+            elif reader.peek() == '':
+                raise FlowFileError("流程文件不完整")
+        if not header_sent:
+            yield 'header', header
+
+
+def load_flow(path, graph=None, chunk_size=READ_CHUNK_SIZE):
+    """流式加载流程文件，构建 FlowGraph 模型（不创建任何图元）
+
+    Returns:
+        (graph, header)
+    """
+    graph = FlowGraph() if graph is None else graph
+    header = {}
+    with bulk_update():
+        for kind, data in iter_flow(path, chunk_size):
+            if kind == 'node':
+                try:
+                    graph.insert_node(node_from_dict(data), data['id'])
+                except (KeyError, TypeError, ValueError) as e:
+                    raise FlowFileError(f"无效的节点数据: {data!r}") from e
+            elif kind == 'edge':
+                try:
+                    edge_id, source, source_port, target, target_port = data
+                    graph.add_edge(source, source_port, target, target_port, edge_id)
+                except (KeyError, IndexError, TypeError, ValueError) as e:
+                    raise FlowFileError(f"无效的连接数据: {data!r}") from e
+            else:
+                header = data
+                if header.get('format') != FLOW_FORMAT:
+                    raise FlowFileError("不是流程文件")
+                if header.get('version', 0) > FLOW_VERSION:
+                    raise FlowFileError(f"不支持的流程文件版本: {header.get('version')}")
+    return graph, header
@@ -0,0 +1,321 @@
+"""流程编辑的追加式日志（自动保存和崩溃恢复，与 Qt 无关）
+
+自动保存不重写整个流程文件，而是把每次编辑以一行 JSON 追加到日志段中，
+写入量只与编辑的规模有关。自动保存目录的内容：
+
+    base.json              日志开始时的流程文件（打开或保存的文件，没有则为空流程）
+    snapshot-000007.nflow  压缩得到的快照，包含第 7 段及之前的全部日志
+    journal-000008.jsonl   日志段，每行一个操作
+
+恢复时加载最新的快照（没有快照时加载 base.json 指向的文件），再按顺序重放其后的日志段。
+日志段过大时，当前段被封存并开始新的一段，封存的段在后台线程中与上一个快照合并为新快照：
+后台线程只读写磁盘上的文件，不访问编辑中的 FlowGraph。
+"""
+import glob
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import flow_binary, flow_file
+from .flow_file import node_from_dict, node_to_dict
+from .graph import FlowGraph, bulk_update
+
+BASE_FILE = 'base.json'
+SEGMENT_PATTERN = 'journal-{:06d}.jsonl'
+SNAPSHOT_PATTERN = 'snapshot-{:06d}.nflow'
+
+
+def _sequence(path):
+    """文件名中的序号（journal-000008.jsonl -> 8）"""
+    name = os.path.basename(path)
+    return int(name[name.index('-') + 1:name.index('.')])
+
+
+def _files(directory, pattern):
+    """目录中符合命名规则的文件，按序号排列"""
+    paths = glob.glob(os.path.join(directory, pattern.replace('{:06d}', '[0-9]' * 6)))
+    return sorted(paths, key=_sequence)
+
+
+def apply_operation(graph, operation):
+    """在 FlowGraph 上重放一条日志操作"""
+    kind = operation[0]
+    if kind == 'add_node':
+        data = operation[1]
+        graph.insert_node(node_from_dict(data), data['id'])
+    elif kind == 'remove_node':
+        graph.remove_node(operation[1])
+    elif kind == 'move_node':
+        _, node_id, x, y = operation
+        if node_id in graph:
+            graph.move_node(node_id, x, y)
+    elif kind == 'update_node':
+        data = operation[1]
+        record = graph.node(data['id'])
+        if record is not None:
+            updated = node_from_dict(data)
+            record.title = updated.title
+            record.inputs, record.input_types = updated.inputs, updated.input_types
+            record.outputs, record.output_types = updated.outputs, updated.output_types
+            record.properties = updated.properties
+    elif kind == 'add_edge':
+        _, edge_id, source, source_port, target, target_port = operation
+        graph.add_edge(source, source_port, target, target_port, edge_id)
+    elif kind == 'remove_edge':
+        graph.remove_edge(operation[1])
+    elif kind == 'clear':
+        graph.clear()
+    else:
+        raise flow_file.FlowFileError(f"未知的日志操作: {kind!r}")
+
+
+def replay(graph, path):
+    """按顺序重放一个日志段，返回重放的操作数
+
+    最后一行可能在崩溃时只写了一半，无法解析时忽略。
+    """
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    with bulk_update():
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                operation = json.loads(line)
+            except json.JSONDecodeError:
+                if number == len(lines):
+                    break
+                raise flow_file.FlowFileError(f"日志损坏: {path} 第 {number} 行") from None
+            apply_operation(graph, operation)
+            count += 1
+    return count
+
+
+def _load_base(directory, up_to=None):
+    """加载恢复的起点：序号不超过 up_to 的最新快照，没有快照时为 base.json 指向的流程
+
+    Returns:
+        (graph, 快照包含的最后一个日志段序号)
+    """
+    snapshots = [path for path in _files(directory, SNAPSHOT_PATTERN)
+                 if up_to is None or _sequence(path) <= up_to]
+    if snapshots:
+        graph, _ = flow_binary.load_flow_binary(snapshots[-1])
+        return graph, _sequence(snapshots[-1])
+    base_path = os.path.join(directory, BASE_FILE)
+    if os.path.exists(base_path):
+        with open(base_path, 'r', encoding='utf-8') as f:
+            source = json.load(f).get('path')
+        if source:
+            graph, _ = flow_binary.load_any_flow(source)
+            return graph, 0
+    return FlowGraph(), 0
+
+
+def has_recovery(directory):
+    """自动保存目录中是否有可以恢复的日志"""
+    for path in _files(directory, SEGMENT_PATTERN):
+        if os.path.getsize(path) > 0:
+            return True
+    return False
+
+
+def recover(directory):
+    """由快照（或起始文件）和其后的日志段恢复流程，返回 FlowGraph"""
+    graph, included = _load_base(directory)
+    for path in _files(directory, SEGMENT_PATTERN):
+        if _sequence(path) > included:
+            replay(graph, path)
+    return graph
+
+
+def compact(directory, up_to):
+    """把序号不超过 up_to 的日志段合并到新快照中，并删除被合并的段和旧快照
+
+    只读写磁盘上的文件，可以在后台线程中运行。新快照先写入临时文件再改名，
+    任何时刻崩溃，恢复都能得到完整的状态。
+
+    Returns:
+        新快照的路径
+    """
+    graph, included = _load_base(directory, up_to)
+    for path in _files(directory, SEGMENT_PATTERN):
+        if included < _sequence(path) <= up_to:
+            replay(graph, path)
+    snapshot = os.path.join(directory, SNAPSHOT_PATTERN.format(up_to))
+    temporary = snapshot + '.tmp'
+    flow_binary.save_flow_binary(graph, temporary)
+    os.replace(temporary, snapshot)
+    # 新快照就位后，被它包含的日志段和旧快照都不再需要
+    for path in _files(directory, SEGMENT_PATTERN) + _files(directory, SNAPSHOT_PATTERN):
+        if _sequence(path) <= up_to and path != snapshot:
+            os.remove(path)
+    return snapshot
+
+
+class FlowJournal:
+    """记录 FlowGraph 编辑操作的追加式日志
+
+    增删节点和连接的操作按发生顺序缓存；节点的移动和属性修改只记下节点 id，
+    flush() 时按节点的当前状态各写一条，拖动和逐字输入因此自然合并。
+    flush() 一次性追加本轮的全部记录，耗时与编辑量成正比，与流程规模无关。
+    """
+
+    def __init__(self, directory, durable=False):
+        """
+        Args:
+            directory: 自动保存目录
+            durable: flush() 后是否调用 fsync（防止断电丢失，代价是每次写入等待磁盘）
+        """
+        self.directory = directory
+        self.durable = durable
+        self.graph = None
+        self._operations = []
+        self._moved = set()
+        self._changed = set()
+        self._file = None
+        self._sequence = 0
+        self._executor = None
+        self._compaction = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ---- 日志的开始 ----
+
+    def reset(self, graph, base=None):
+        """丢弃已有的日志，从 graph 的当前状态重新开始
+
+        Args:
+            graph: 被记录的 FlowGraph
+            base: graph 当前内容对应的流程文件（刚打开或刚保存的文件）。
+                  graph 非空又没有对应文件时，同步写一个快照作为起点。
+        """
+        self._wait_compaction()
+        self._close_segment()
+        self._discard_pending()
+        for path in _files(self.directory, SEGMENT_PATTERN) + _files(self.directory, SNAPSHOT_PATTERN):
+            os.remove(path)
+        with open(os.path.join(self.directory, BASE_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'path': os.path.abspath(base) if base else None}, f, ensure_ascii=False)
+        self.graph = graph
+        self._sequence = 1
+        if base is None and len(graph):
+            flow_binary.save_flow_binary(graph, os.path.join(self.directory, SNAPSHOT_PATTERN.format(1)))
+            self._sequence = 2
+        self._open_segment()
+
+    def resume(self, graph):
+        """保留已有的快照和日志（graph 是由它们恢复的），在新的日志段中继续记录"""
+        self._wait_compaction()
+        self._close_segment()
+        self._discard_pending()
+        self.graph = graph
+        files = _files(self.directory, SEGMENT_PATTERN) + _files(self.directory, SNAPSHOT_PATTERN)
+        self._sequence = max((_sequence(path) for path in files), default=0) + 1
+        self._open_segment()
+
+    # ---- 记录操作 ----
+
+    def node_added(self, record):
+        self._operations.append(['add_node', node_to_dict(record)])
+
+    def node_removed(self, node_id):
+        self._moved.discard(node_id)
+        self._changed.discard(node_id)
+        self._operations.append(['remove_node', node_id])
+
+    def node_moved(self, node_id):
+        self._moved.add(node_id)
+
+    def node_changed(self, node_id):
+        """节点的标题、端口名称或属性被修改"""
+        self._changed.add(node_id)
+
+    def edge_added(self, edge):
+        self._operations.append(['add_edge', edge.id, edge.source, edge.source_port,
+                                 edge.target, edge.target_port])
+
+    def edge_removed(self, edge_id):
+        self._operations.append(['remove_edge', edge_id])
+
+    def cleared(self):
+        self._discard_pending()
+        self._operations.append(['clear'])
+
+    def has_pending(self):
+        return bool(self._operations or self._moved or self._changed)
+
+    def flush(self):
+        """把缓存的操作追加到当前日志段，返回写入的字节数"""
+        if self._file is None or not self.has_pending():
+            return 0
+        lines = [json.dumps(operation, ensure_ascii=False) for operation in self._operations]
+        nodes = self.graph.nodes
+        for node_id in self._changed:
+            record = nodes.get(node_id)
+            if record is not None:
+                lines.append(json.dumps(['update_node', node_to_dict(record)], ensure_ascii=False))
+        for node_id in self._moved:
+            record = nodes.get(node_id)
+            if record is not None:
+                lines.append(json.dumps(['move_node', node_id, record.x, record.y]))
+        self._discard_pending()
+        text = '\n'.join(lines) + '\n'
+        self._file.write(text)
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        return len(text)
+
+    def segment_size(self):
+        """当前日志段的字节数"""
+        return self._file.tell() if self._file is not None else 0
+
+    # ---- 压缩 ----
+
+    def compact(self):
+        """封存当前日志段并在后台线程中把它合并到快照
+
+        Returns:
+            concurrent.futures.Future（结果为新快照的路径）；上一次压缩尚未完成时返回 None
+        """
+        if self._compaction is not None and not self._compaction.done():
+            return None
+        self.flush()
+        sealed = self._sequence
+        self._close_segment()
+        self._sequence += 1
+        self._open_segment()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal-compaction')
+        self._compaction = self._executor.submit(compact, self.directory, sealed)
+        return self._compaction
+
+    def close(self):
+        """写出缓存的操作并等待后台压缩结束"""
+        self.flush()
+        self._wait_compaction()
+        self._close_segment()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _wait_compaction(self):
+        """等待后台压缩结束（压缩失败不会丢失数据：被封存的日志段仍然保留）"""
+        if self._compaction is not None:
+            self._compaction.exception()
+            self._compaction = None
+
+    def _discard_pending(self):
+        self._operations = []
+        self._moved = set()
+        self._changed = set()
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, SEGMENT_PATTERN.format(self._sequence))
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
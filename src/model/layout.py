@@ -0,0 +1,388 @@
+"""分层自动布局（与 Qt 无关）
+
+按 Sugiyama 方法把流程排成从左到右的若干层：
+    1. 分层：按拓扑顺序的最长路径给每个节点分配层号，环中的回边不参与分层；
+    2. 减少交叉：跨越多层的连接拆成经过中间层的虚拟节点，逐层按重心排序，
+       上下交替扫描若干遍，保留交叉数最少的顺序；
+    3. 坐标分配：节点向相邻节点的平均高度靠拢，同一层内保持顺序和最小间距。
+交叉数统计和坐标分配的每一轮都是对全部节点的 NumPy 数组运算，一万个节点的流程在一秒左右完成。
+增量布局（incremental_layout）只为新加入的节点安排位置，已有节点保持不动。
+"""
+from collections import deque
+
+import numpy as np
+
+from .spatial import GridIndex
+
+NODE_SIZE = (140, 60)  # 节点大小（与 Node 图元一致）
+LAYER_GAP = 80         # 相邻两层节点之间的水平间距
+NODE_GAP = 30          # 同一层相邻节点之间的垂直间距
+DUMMY_GAP = 10         # 虚拟节点（长连接经过的位置）占用的垂直间距
+ORDER_SWEEPS = 24      # 减少交叉时上下扫描的最多遍数
+COORDINATE_ROUNDS = 8  # 坐标分配的迭代轮数
+
+
+def layered_layout(graph, node_ids=None, origin=None, node_size=NODE_SIZE):
+    """计算分层布局
+
+    Args:
+        graph: FlowGraph
+        node_ids: 参与布局的节点 id，默认为全部节点；只考虑两端都在其中的连接
+        origin: 布局左上角的位置 (x, y)，默认为这些节点当前范围的左上角（原地布局）
+        node_size: 节点的 (宽, 高)
+
+    Returns:
+        {node_id: (x, y)}，节点左上角的新位置
+    """
+    nodes = graph.nodes
+    if node_ids is None:
+        ids = list(nodes)
+        edges = graph.edges.values()
+    else:
+        ids = [node_id for node_id in dict.fromkeys(node_ids) if node_id in nodes]
+        edges = graph.internal_edges(ids)
+    n = len(ids)
+    if not n:
+        return {}
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    source = np.fromiter((index[edge.source] for edge in edges), dtype=np.int64)
+    target = np.fromiter((index[edge.target] for edge in edges), dtype=np.int64)
+    xs = np.fromiter((nodes[node_id].x for node_id in ids), dtype=np.float64, count=n)
+    ys = np.fromiter((nodes[node_id].y for node_id in ids), dtype=np.float64, count=n)
+
+    rank = _assign_ranks(n, source, target)
+    upper, lower, vertex_rank, vertex_y = _split_long_edges(rank, source, target, ys)
+    position = _order_layers(vertex_rank, vertex_y, upper, lower)
+
+    width, height = node_size
+    heights = np.zeros(len(vertex_rank))
+    heights[:n] = height
+    gaps = np.full(len(vertex_rank), float(DUMMY_GAP))
+    gaps[:n] = NODE_GAP
+    top = _assign_coordinates(vertex_rank, position, upper, lower, heights, gaps)
+
+    if origin is None:
+        origin = (xs.min(), ys.min())
+    left = origin[0] + rank * float(width + LAYER_GAP)
+    top = top[:n] - top[:n].min() + origin[1]
+    return {node_id: (float(x), float(y)) for node_id, x, y in zip(ids, left.tolist(), top.tolist())}
+
+
+def incremental_layout(graph, node_ids, hops=1, node_size=NODE_SIZE):
+    """增量布局：只为 node_ids 计算位置，流程中已有的节点作为锚点保持不动
+
+    先对 node_ids 及其 hops 步以内的上下游（见 expand_region）做分层布局，确定新节点所在的层；
+    新节点按层从左到右放置：有已放置的上游（锚点或前面的新节点）时排在最右的上游之后一层，
+    否则排在最左的已放置下游之前一层，y 取这些相邻节点高度的平均值；
+    没有已放置的相邻节点时按全部锚点从布局位置到当前位置的平均偏移平移；
+    最后与其余节点重叠的新节点沿 y 方向移到最近的空位。
+
+    Returns:
+        {node_id: (x, y)}，只包含 node_ids 中的节点
+    """
+    nodes = graph.nodes
+    new_ids = [node_id for node_id in dict.fromkeys(node_ids) if node_id in nodes]
+    if not new_ids:
+        return {}
+    new = set(new_ids)
+    layout = layered_layout(graph, expand_region(graph, new, hops), node_size=node_size)
+    offsets = {}  # {锚点 id: (当前位置 - 布局位置)}
+    for node_id, (x, y) in layout.items():
+        if node_id not in new:
+            record = nodes[node_id]
+            offsets[node_id] = (record.x - x, record.y - y)
+    if offsets:
+        mean = (sum(dx for dx, _ in offsets.values()) / len(offsets),
+                sum(dy for _, dy in offsets.values()) / len(offsets))
+    else:
+        mean = (0.0, 0.0)
+    step = node_size[0] + LAYER_GAP
+    placed = {}
+
+    def position(node_id):
+        if node_id in placed:
+            return placed[node_id]
+        record = nodes[node_id]
+        return (record.x, record.y)
+
+    for node_id in sorted(new_ids, key=lambda node_id: layout[node_id][0]):
+        upstream = [position(other) for other in graph.predecessors(node_id)
+                    if other in offsets or other in placed]
+        downstream = [position(other) for other in graph.successors(node_id)
+                      if other in offsets or other in placed]
+        if upstream:
+            x = max(x for x, _ in upstream) + step
+        elif downstream:
+            x = min(x for x, _ in downstream) - step
+        near = upstream + downstream
+        if near:
+            y = sum(y for _, y in near) / len(near)
+        else:
+            x, y = layout[node_id][0] + mean[0], layout[node_id][1] + mean[1]
+        placed[node_id] = (x, y)
+    return _resolve_overlaps(graph, placed, node_size)
+
+
+def _resolve_overlaps(graph, placed, node_size):
+    """把与其他节点（含已放好的新节点）重叠的节点沿 y 方向移到最近的空位（向上或向下）"""
+    width, height = node_size
+    nodes = graph.nodes
+    index = GridIndex()
+    index.rebuild(graph)
+    for node_id in placed:
+        record = nodes[node_id]
+        index.remove(node_id, record.x, record.y)
+    positions = {}  # 已放好的新节点；其余节点的位置在 NodeRecord 中
+
+    def free_y(x, y, step):
+        """从 y 开始沿 step 的方向（+1 向下，-1 向上）找到的第一个不重叠的高度"""
+        while True:
+            # 索引按左上角登记，左上角落在这个范围内的节点才可能与 (x, y) 处的节点重叠
+            found = y
+            for other in index.query(x - width, y - height - NODE_GAP, x + width, y + height + NODE_GAP):
+                ox, oy = positions[other] if other in positions else (nodes[other].x, nodes[other].y)
+                if abs(ox - x) < width and abs(oy - y) < height + NODE_GAP:
+                    shifted = oy + step * (height + NODE_GAP)
+                    found = max(found, shifted) if step > 0 else min(found, shifted)
+            if found == y:
+                return y
+            y = found
+
+    for node_id, (x, y) in sorted(placed.items(), key=lambda item: (item[1][1], item[1][0])):
+        down, up = free_y(x, y, 1), free_y(x, y, -1)
+        y = down if down - y <= y - up else up
+        positions[node_id] = (x, y)
+        index.insert(node_id, x, y)
+    return positions
+
+
+def expand_region(graph, node_ids, hops=1):
+    """node_ids 及其 hops 步以内的上下游节点（增量布局的范围）"""
+    region = {node_id for node_id in node_ids if node_id in graph}
+    frontier = region
+    for _ in range(hops):
+        found = set()
+        for node_id in frontier:
+            found |= graph.successors(node_id)
+            found |= graph.predecessors(node_id)
+        frontier = found - region
+        if not frontier:
+            break
+        region |= frontier
+    return region
+
+
+def count_crossings(rank, position, upper, lower):
+    """相邻两层之间的连接交叉数
+
+    把每一对相邻层之间的连接按 (层号, 上端位置, 下端位置) 排序后，
+    交叉数就是下端位置序列中的逆序对数（不同层对之间加偏移，互不影响）。
+    """
+    if not len(upper):
+        return 0
+    layer = rank[upper]
+    order = np.lexsort((position[lower], position[upper], layer))
+    span = int(position.max()) + 1
+    return _count_inversions(layer[order] * span + position[lower][order])
+
+
+def _count_inversions(values):
+    """整数序列中的逆序对数：自底向上归并，每一层归并都是整个数组上的向量运算"""
+    values = np.asarray(values, dtype=np.int64)
+    n = len(values)
+    if n < 2:
+        return 0
+    values = values - values.min()
+    span = int(values.max()) + 1
+    indices = np.arange(n)
+    total = 0
+    width = 1
+    while width < n:
+        # 每个长度为 width 的块内已有序；相邻两块（左块、右块）为一组
+        block = indices // width
+        group = block >> 1
+        keys = group * span + values
+        is_right = (block & 1).astype(bool)
+        left_keys = keys[~is_right]  # 组号递增、组内有序，整体有序
+        right_group = group[is_right]
+        # 右块中每个元素与左块中比它大的元素各构成一个逆序对
+        left_end = np.searchsorted(left_keys, (right_group + 1) * span)
+        not_greater = np.searchsorted(left_keys, keys[is_right], side='right')
+        total += int((left_end - not_greater).sum())
+        width <<= 1
+        values = np.sort(keys) - (indices // width) * span
+    return total
+
+
+def _assign_ranks(n, source, target):
+    """按拓扑顺序的最长路径分层；有环时从剩余编号最小的节点断开，回边不参与分层"""
+    order = np.argsort(source, kind='stable')
+    successors = target[order].tolist()
+    starts = np.searchsorted(source[order], np.arange(n + 1)).tolist()
+    in_degree = np.bincount(target, minlength=n).tolist()
+    rank = [0] * n
+    done = bytearray(n)
+    queue = deque(i for i in range(n) if not in_degree[i])
+    forced = 0
+    remaining = n
+    while remaining:
+        if not queue:
+            while done[forced]:
+                forced += 1
+            queue.append(forced)
+        u = queue.popleft()
+        if done[u]:
+            continue
+        done[u] = 1
+        remaining -= 1
+        next_rank = rank[u] + 1
+        for v in successors[starts[u]:starts[u + 1]]:
+            if not done[v]:
+                if rank[v] < next_rank:
+                    rank[v] = next_rank
+                in_degree[v] -= 1
+                if not in_degree[v]:
+                    queue.append(v)
+    rank = np.array(rank, dtype=np.int64)
+
+    # 只有出边的节点（例如输入节点）靠近它最近的下游节点，而不是都挤在第 0 层
+    if len(source):
+        sources = np.bincount(target, minlength=n) == 0
+        nearest = np.full(n, np.iinfo(np.int64).max)
+        np.minimum.at(nearest, source, rank[target])
+        movable = sources & (nearest > rank + 1) & (nearest != np.iinfo(np.int64).max)
+        rank[movable] = nearest[movable] - 1
+    return rank - rank.min()
+
+
+def _split_long_edges(rank, source, target, ys):
+    """把跨越多层的连接拆成经过中间层虚拟节点的若干段
+
+    虚拟节点编号接在真实节点之后，初始高度按两端节点的高度线性插值。
+
+    Returns:
+        (upper, lower, vertex_rank, vertex_y)：每一段连接上端（层号小）和下端的顶点编号，
+        以及全部顶点（真实节点在前）的层号和初始高度
+    """
+    lo = np.minimum(rank[source], rank[target])
+    hi = np.maximum(rank[source], rank[target])
+    keep = hi > lo  # 同层的连接（只可能来自回边）不参与排序
+    a = np.where(rank[source] <= rank[target], source, target)[keep]
+    b = np.where(rank[source] <= rank[target], target, source)[keep]
+    steps = hi[keep] - lo[keep]
+    lo = lo[keep]
+
+    n = len(rank)
+    dummies = steps - 1
+    first_dummy = n + np.cumsum(dummies) - dummies
+    edge = np.repeat(np.arange(len(steps)), steps)
+    j = np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps)
+    last = j + 1 == steps[edge]
+    upper = np.where(j == 0, a[edge], first_dummy[edge] + j - 1)
+    lower = np.where(last, b[edge], first_dummy[edge] + j)
+
+    dummy_edge = edge[~last]
+    dummy_step = (j + 1)[~last]
+    fraction = dummy_step / steps[dummy_edge]
+    vertex_rank = np.concatenate((rank, lo[dummy_edge] + dummy_step))
+    vertex_y = np.concatenate((ys, ys[a[dummy_edge]] + (ys[b[dummy_edge]] - ys[a[dummy_edge]]) * fraction))
+    return upper, lower, vertex_rank, vertex_y
+
+
+def _layers(vertex_rank, key):
+    """按层号分组、层内按 key 排序的顶点编号 [array, ...]"""
+    order = np.lexsort((key, vertex_rank))
+    bounds = np.searchsorted(vertex_rank[order], np.arange(int(vertex_rank.max()) + 2))
+    return [order[bounds[r]:bounds[r + 1]] for r in range(len(bounds) - 1)]
+
+
+def _order_layers(vertex_rank, vertex_y, upper, lower):
+    """重心法减少交叉，返回每个顶点在所在层中的位置"""
+    layers = _layers(vertex_rank, vertex_y)
+    position = np.empty(len(vertex_rank), dtype=np.int64)
+    for layer in layers:
+        position[layer] = np.arange(len(layer))
+    best = position.copy()
+    best_crossings = count_crossings(vertex_rank, position, upper, lower)
+
+    # 按下端所在层分组的连接段（向下扫描）和按上端所在层分组的连接段（向上扫描）
+    down = _group_segments(vertex_rank[lower], len(layers))
+    up = _group_segments(vertex_rank[upper], len(layers))
+    stale = 0
+    for sweep in range(ORDER_SWEEPS):
+        if not best_crossings:
+            break
+        if sweep % 2 == 0:
+            for r in range(1, len(layers)):
+                segments = down[0][down[1][r]:down[1][r + 1]]
+                layers[r] = _reorder(layers[r], position, lower[segments], upper[segments])
+        else:
+            for r in range(len(layers) - 2, -1, -1):
+                segments = up[0][up[1][r]:up[1][r + 1]]
+                layers[r] = _reorder(layers[r], position, upper[segments], lower[segments])
+        crossings = count_crossings(vertex_rank, position, upper, lower)
+        if crossings < best_crossings:
+            best_crossings = crossings
+            best = position.copy()
+            stale = 0
+        else:
+            stale += 1
+            if stale >= 2:
+                break
+    return best
+
+
+def _group_segments(layer_of_segment, layer_count):
+    """按层号分组的连接段编号：(排序后的段编号, 每层的起止下标)"""
+    order = np.argsort(layer_of_segment, kind='stable')
+    bounds = np.searchsorted(layer_of_segment[order], np.arange(layer_count + 1))
+    return order, bounds
+
+
+def _reorder(layer, position, vertices, neighbours):
+    """按相邻层中邻居位置的平均值（重心）重排一层，没有邻居的顶点保持原位置"""
+    size = len(layer)
+    local = position[vertices]
+    counts = np.bincount(local, minlength=size)
+    sums = np.bincount(local, weights=position[neighbours], minlength=size)
+    current = np.arange(size, dtype=np.float64)
+    barycenter = np.where(counts > 0, sums / np.maximum(counts, 1), current)
+    layer = layer[np.argsort(position[layer])]  # 按当前位置排列
+    layer = layer[np.argsort(barycenter, kind='stable')]
+    position[layer] = np.arange(size)
+    return layer
+
+
+def _assign_coordinates(vertex_rank, position, upper, lower, heights, gaps):
+    """顶点的纵坐标（顶边）：每轮先向相邻顶点的平均中心靠拢，再在层内按顺序排开
+
+    排开时分别从上往下（累计最大值）和从下往上（累计最小值）求满足最小间距的位置，
+    取两者的平均，结果仍满足间距且不偏向任何一侧。各层之间用层号偏移隔开，
+    整个图一次数组运算即可完成。
+    """
+    count = len(vertex_rank)
+    sequence = np.lexsort((position, vertex_rank))  # 按层、层内按顺序
+    layer = vertex_rank[sequence]
+    first = np.r_[True, layer[1:] != layer[:-1]]
+    # 层内每个顶点之前所需的累计高度
+    step = heights[sequence] + gaps[sequence]
+    total = np.cumsum(step) - step
+    offset = total - np.maximum.accumulate(np.where(first, total, 0))
+
+    centers = np.empty(count)
+    centers[sequence] = offset + heights[sequence] / 2
+    ends = np.concatenate((upper, lower))
+    others = np.concatenate((lower, upper))
+    degree = np.bincount(ends, minlength=count)
+    for _ in range(COORDINATE_ROUNDS):
+        sums = np.bincount(ends, weights=centers[others], minlength=count)
+        wanted = np.where(degree > 0, sums / np.maximum(degree, 1), centers)
+        wanted = (wanted + centers) / 2
+        shifted = (wanted - heights / 2)[sequence] - offset
+        spread = shifted.max() - shifted.min() + 1
+        keyed = shifted - shifted.min() + layer * spread
+        downward = np.maximum.accumulate(keyed)
+        upward = np.minimum.accumulate(keyed[::-1])[::-1]
+        tops = (downward + upward) / 2 - layer * spread + shifted.min() + offset
+        centers[sequence] = tops + heights[sequence] / 2
+    return centers - heights / 2
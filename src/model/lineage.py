@@ -0,0 +1,78 @@
+"""节点血缘追踪（与 Qt 无关）
+
+从一个节点出发沿连接做广度优先遍历，找出向它提供数据的全部上游节点和
+它的数据流向的全部下游节点。遍历可以分步执行（每步处理有限个节点），
+超大流程上由调用方把遍历分散到多个空闲时间片中，并可以随时放弃。
+"""
+from collections import deque
+
+UPSTREAM = 'upstream'
+DOWNSTREAM = 'downstream'
+BOTH = 'both'
+
+
+class LineageTrace:
+    """一次血缘追踪的状态和结果
+
+    nodes / edges 是目前为止找到的节点 id 和连接 id（含起点），遍历结束后即为完整结果。
+    上游和下游分别遍历：同时追踪两个方向时，结果是祖先与后代的并集，
+    不包括只通过旁支与起点相连的节点。
+    """
+
+    def __init__(self, graph, node_id, direction=BOTH):
+        self.graph = graph
+        self.node_id = node_id
+        self.direction = direction
+        self.nodes = {node_id}
+        self.edges = set()
+        self.cancelled = False
+        self._seen = {False: {node_id}, True: {node_id}}  # {是否向下游: 已访问的节点 id}
+        self._queue = deque()
+        if direction in (UPSTREAM, BOTH):
+            self._queue.append((node_id, False))
+        if direction in (DOWNSTREAM, BOTH):
+            self._queue.append((node_id, True))
+
+    @property
+    def done(self):
+        return not self._queue
+
+    def cancel(self):
+        """放弃遍历（已找到的结果保留）"""
+        self.cancelled = True
+        self._queue.clear()
+
+    def step(self, limit=None):
+        """继续遍历，最多处理 limit 个节点（None 表示直到结束），返回是否已经结束"""
+        queue = self._queue
+        graph = self.graph
+        records, edge_records = graph.nodes, graph.edges
+        port_edge_ids = graph.port_edge_ids
+        nodes, edges = self.nodes, self.edges
+        count = 0
+        while queue and (limit is None or count < limit):
+            node_id, downstream = queue.popleft()
+            count += 1
+            record = records.get(node_id)
+            if record is None:
+                continue
+            seen = self._seen[downstream]
+            # 直接遍历端口上的连接 id，不为每个节点构造连接记录列表
+            for port in record.port_ids(downstream):
+                edge_ids = port_edge_ids(node_id, port)
+                if not edge_ids:
+                    continue
+                edges.update(edge_ids)
+                for edge_id in edge_ids:
+                    edge = edge_records[edge_id]
+                    other = edge.target if downstream else edge.source
+                    if other not in seen:
+                        seen.add(other)
+                        nodes.add(other)
+                        queue.append((other, downstream))
+        return not queue
+
+    def run(self):
+        """一次遍历到结束，返回 self"""
+        self.step()
+        return self
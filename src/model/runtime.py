@@ -0,0 +1,207 @@
+"""流程执行运行时（与 Qt 无关）
+
+把 FlowGraph 编译为 asyncio 消息传递引擎：每个节点对应一个处理函数和一个任务，
+连接决定消息的去向。消息从哪个输出端口发出，就只发给连在这个端口上的节点；
+一个输出端口连到多个节点时消息复制给每个下游（扇出），
+多条连接进入同一个节点时按到达顺序合并到它的队列（扇入）。
+
+节点之间传递的是消息批（列表）而不是单条消息：每个节点的输入队列有界（背压），
+入队、出队和任务切换的开销分摊到一整批消息上。
+"""
+import asyncio
+import inspect
+
+from .validation import FlowValidator
+
+DEFAULT_QUEUE_SIZE = 16   # 每个节点的输入队列最多缓存的消息批数
+DEFAULT_BATCH_SIZE = 256  # 没有上游的节点每批发出的最多消息数
+
+_END = object()  # 一条上游连接结束的标记
+
+
+class FlowRuntimeError(Exception):
+    """流程无法执行（例如有环），或节点处理消息时出错"""
+
+
+class _CompiledNode:
+    """编译后的节点：处理函数和各输出端口的下游"""
+    __slots__ = ('node_id', 'handler', 'is_async', 'routed', 'upstream', 'targets')
+
+    def __init__(self, node_id, handler, output_count):
+        self.node_id = node_id
+        self.handler = handler
+        self.is_async = handler is not None and inspect.iscoroutinefunction(handler)
+        # 有多个输出端口时处理函数按端口返回消息
+        self.routed = handler is not None and output_count > 1
+        self.upstream = 0   # 进入该节点的连接数（结束标记的数量）
+        # 每个输出端口上各条连接的目标节点 id（同一个目标的多条连接各出现一次）
+        self.targets = [[] for _ in range(output_count)]
+
+    def has_targets(self):
+        return any(self.targets)
+
+
+class FlowRuntime:
+    """把流程编译为可执行的消息传递引擎
+
+    handlers 按节点 id 或节点类型名（NodeRecord.type）指定处理函数，节点 id 优先。
+    处理函数接收一条消息，返回发往下游的消息，返回 None 表示丢弃；
+    可以是普通函数或 async 函数。节点有多个输出端口时，处理函数返回按端口排列的 list 或 tuple
+    （第 i 项发往第 i 个输出端口，None 或缺少的项表示该端口不发出消息），
+    返回其他类型的值时执行以 FlowRuntimeError 结束。
+    没有指定处理函数的节点把消息原样转发到每个输出端口。
+    没有出边的节点（通常是 Output）返回的值收集为执行结果。
+
+    编译使用构造时模型的快照，之后修改模型需要重新创建运行时。
+
+    Raises:
+        FlowRuntimeError: 流程中有环
+    """
+
+    def __init__(self, graph, handlers=None, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.graph = graph
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.nodes = {}  # {节点 id: _CompiledNode}
+        self._compile(handlers or {})
+
+    def _compile(self, handlers):
+        graph = self.graph
+        if FlowValidator(graph).validate().get('cycle'):
+            raise FlowRuntimeError("流程中有环，无法执行")
+        nodes = self.nodes
+        for node_id, record in graph.nodes.items():
+            handler = handlers.get(node_id, handlers.get(record.type))
+            nodes[node_id] = _CompiledNode(node_id, handler, len(record.outputs))
+        for edge in graph.edges.values():
+            source = nodes.get(edge.source)
+            target = nodes.get(edge.target)
+            if source is None or target is None or edge.source_port >= len(source.targets):
+                # 端点节点或端口不存在的连接不传递消息
+                continue
+            source.targets[edge.source_port].append(edge.target)
+            target.upstream += 1
+
+    def sources(self):
+        """没有上游连接的节点 id（从 run() 的 sources 参数读取消息）"""
+        return [node_id for node_id, node in self.nodes.items() if not node.upstream]
+
+    def execute(self, sources=None):
+        """在新的事件循环中执行流程，参数和返回值同 run()"""
+        return asyncio.run(self.run(sources))
+
+    async def run(self, sources=None):
+        """执行流程直到所有消息处理完毕
+
+        Args:
+            sources: {节点 id: 消息的可迭代对象或异步可迭代对象}，只对没有上游连接的节点有效，
+                没有给出的节点不发出消息
+
+        Returns:
+            {没有出边的节点 id: [消息, ...]}
+
+        Raises:
+            FlowRuntimeError: 节点处理消息时出错（其余节点的任务随之取消）
+        """
+        sources = sources or {}
+        inboxes = {node_id: asyncio.Queue(self.queue_size)
+                   for node_id, node in self.nodes.items() if node.upstream}
+        results = {node_id: [] for node_id, node in self.nodes.items() if not node.has_targets()}
+        tasks = []
+        for node_id, node in self.nodes.items():
+            outputs = [[inboxes[target] for target in targets] for targets in node.targets]
+            if node.upstream:
+                coroutine = self._run_node(node, inboxes[node_id], outputs, results.get(node_id))
+            else:
+                coroutine = self._run_source(node, sources.get(node_id, ()), outputs, results.get(node_id))
+            tasks.append(asyncio.ensure_future(coroutine))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return results
+
+    async def _run_source(self, node, messages, outputs, collected):
+        """没有上游的节点：把 messages 分批处理后发出"""
+        size = self.batch_size
+        batch = []
+        if hasattr(messages, '__aiter__'):
+            async for message in messages:
+                batch.append(message)
+                if len(batch) >= size:
+                    await self._emit(node, batch, outputs, collected)
+                    batch = []
+        else:
+            for message in messages:
+                batch.append(message)
+                if len(batch) >= size:
+                    await self._emit(node, batch, outputs, collected)
+                    batch = []
+        if batch:
+            await self._emit(node, batch, outputs, collected)
+        await self._finish(outputs)
+
+    async def _run_node(self, node, inbox, outputs, collected):
+        """有上游的节点：处理队列中的消息批，直到每条上游连接都已结束"""
+        remaining = node.upstream
+        get = inbox.get
+        while remaining:
+            batch = await get()
+            if batch is _END:
+                remaining -= 1
+                continue
+            await self._emit(node, batch, outputs, collected)
+        await self._finish(outputs)
+
+    async def _finish(self, outputs):
+        """通知每条出边的下游：这条连接不会再有消息"""
+        for queues in outputs:
+            for queue in queues:
+                await queue.put(_END)
+
+    async def _emit(self, node, batch, outputs, collected):
+        """用节点的处理函数处理一批消息，把结果发往各输出端口的下游（或收集为结果）
+
+        同一个结果列表会发给一个端口上的全部下游，处理函数不应修改收到的消息。
+        outputs 为每个输出端口上各条连接的目标队列。
+        """
+        handler = node.handler
+        try:
+            if handler is None:
+                out = batch
+            elif node.is_async:
+                out = []
+                for message in batch:
+                    result = await handler(message)
+                    if result is not None:
+                        out.append(result)
+            else:
+                out = [result for result in map(handler, batch) if result is not None]
+        except Exception as exc:
+            raise FlowRuntimeError(f"节点 {node.node_id} 处理消息时出错: {exc}") from exc
+        if not out:
+            return
+        if node.routed:
+            for result in out:
+                if not isinstance(result, (list, tuple)):
+                    raise FlowRuntimeError(f"节点 {node.node_id} 有多个输出端口，处理函数应返回按端口排列的 "
+                                           f"list 或 tuple，实际返回了 {type(result).__name__}")
+        if collected is not None:
+            collected.extend(out)
+            return
+        if not node.routed:
+            for queues in outputs:
+                for queue in queues:
+                    await queue.put(out)
+            return
+        for index, queues in enumerate(outputs):
+            if not queues:
+                continue
+            port_out = [result[index] for result in out
+                        if index < len(result) and result[index] is not None]
+            if port_out:
+                for queue in queues:
+                    await queue.put(port_out)
@@ -0,0 +1,168 @@
+"""节点搜索索引（与 Qt 无关）
+
+对节点的标题、端口名称、端口类型和自定义属性值分词后建立倒排索引，
+随节点的增删和修改增量更新，查询时不需要遍历全部节点。
+"""
+import re
+from bisect import bisect_left, insort
+
+from .graph import bulk_update
+
+_WORD = re.compile(r'\w+')
+_GRAM = 3  # 子串匹配使用的 n-gram 长度
+
+
+def node_terms(record):
+    """节点记录中参与搜索的词（小写、去重）"""
+    texts = [record.title]
+    texts.extend(record.inputs)
+    texts.extend(record.outputs)
+    texts.extend(record.input_types)
+    texts.extend(record.output_types)
+    texts.extend(str(value) for value in record.properties.values())
+    terms = set()
+    for text in texts:
+        terms.update(_WORD.findall(str(text).lower()))
+    return terms
+
+
+def _grams(term):
+    return {term[i:i + _GRAM] for i in range(len(term) - _GRAM + 1)}
+
+
+class SearchIndex:
+    """节点搜索的倒排索引
+
+    _postings 按词存放包含该词的节点 id；不同的词另外保存为有序列表（用于前缀查找）
+    和 3-gram 索引（用于子串查找）。节点数很多时不同的词通常少得多（标题、端口名大量重复），
+    查询只在词上进行，再合并对应节点的集合。
+    """
+
+    def __init__(self):
+        self._postings = {}  # {词: {node_id, ...}}
+        self._terms = {}     # {node_id: frozenset(词)}，更新和删除节点时使用
+        self._sorted = []    # 全部不同的词，有序
+        self._grams = {}     # {3-gram: {词, ...}}
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, node_id):
+        return node_id in self._terms
+
+    # ---- 维护 ----
+
+    def rebuild(self, graph):
+        """按 FlowGraph 中的全部节点重建索引"""
+        self.clear()
+        postings = self._postings
+        with bulk_update():
+            for node_id, record in graph.nodes.items():
+                terms = frozenset(node_terms(record))
+                self._terms[node_id] = terms
+                for term in terms:
+                    ids = postings.get(term)
+                    if ids is None:
+                        postings[term] = {node_id}
+                    else:
+                        ids.add(node_id)
+            self._sorted = sorted(postings)
+            grams = self._grams
+            for term in self._sorted:
+                for gram in _grams(term):
+                    grams.setdefault(gram, set()).add(term)
+
+    def clear(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._sorted = []
+        self._grams.clear()
+
+    def add(self, record):
+        """加入节点，已存在时等同于 update()"""
+        self.update(record)
+
+    def update(self, record):
+        """节点的标题、端口或属性被修改后重新登记（只处理增减的词）"""
+        node_id = record.id
+        old = self._terms.get(node_id, frozenset())
+        new = frozenset(node_terms(record))
+        self._terms[node_id] = new
+        for term in old - new:
+            self._discard(term, node_id)
+        for term in new - old:
+            ids = self._postings.get(term)
+            if ids is None:
+                self._postings[term] = {node_id}
+                insort(self._sorted, term)
+                for gram in _grams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+            else:
+                ids.add(node_id)
+
+    def remove(self, node_id):
+        for term in self._terms.pop(node_id, ()):
+            self._discard(term, node_id)
+
+    def _discard(self, term, node_id):
+        ids = self._postings[term]
+        ids.discard(node_id)
+        if ids:
+            return
+        # 不再有节点使用这个词
+        del self._postings[term]
+        del self._sorted[bisect_left(self._sorted, term)]
+        for gram in _grams(term):
+            terms = self._grams[gram]
+            terms.discard(term)
+            if not terms:
+                del self._grams[gram]
+
+    # ---- 查询 ----
+
+    def matching_terms(self, word):
+        """以 word 开头或包含 word 的词：(前缀匹配的词列表, 其余子串匹配的词列表)"""
+        word = word.lower()
+        terms = self._sorted
+        start = bisect_left(terms, word)
+        end = bisect_left(terms, word + '\U0010ffff')
+        prefixed = terms[start:end]
+        if len(word) >= _GRAM:
+            # 先取最小的 gram 集合，再与其余求交，最后确认确实包含整个 word
+            sets = sorted((self._grams.get(gram, ()) for gram in _grams(word)), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:])
+            candidates.difference_update(prefixed)
+            contained = [term for term in candidates if word in term]
+        else:
+            # 太短的词没有 gram，直接检查前缀范围之外的全部词
+            contained = [term for term in terms[:start] if word in term]
+            contained.extend(term for term in terms[end:] if word in term)
+        return prefixed, contained
+
+    def search(self, text):
+        """搜索节点：text 中的每个词都必须匹配节点的某个词（前缀或子串）
+
+        Returns:
+            匹配的节点 id 列表：节点的词与查询完全相同的在前，其次是前缀匹配，最后是子串匹配，
+            同一级内按 id 排序
+        """
+        words = _WORD.findall(text.lower())
+        if not words:
+            return []
+        postings = self._postings.__getitem__
+        matched = exact = prefix = None
+        for word in words:
+            prefixed, contained = self.matching_terms(word)
+            # 每个集合都包含下一个：完全相同 ⊆ 前缀匹配 ⊆ 全部匹配
+            word_prefix = set().union(*map(postings, prefixed))
+            word_matched = word_prefix.union(*map(postings, contained))
+            word_exact = self._postings.get(word, frozenset())
+            if matched is None:
+                matched, exact, prefix = word_matched, set(word_exact), word_prefix
+            else:
+                matched &= word_matched
+                exact &= word_exact
+                prefix &= word_prefix
+            if not matched:
+                return []
+        return sorted(exact) + sorted(prefix - exact) + sorted(matched - prefix)
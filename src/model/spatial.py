@@ -0,0 +1,108 @@
+"""节点位置的空间索引（与 Qt 无关）
+
+虚拟化场景只为视口附近的节点创建图元，需要在不遍历全部节点的情况下
+找出某个矩形范围内的节点。索引按节点左上角所在的网格单元存放节点 id。
+"""
+import math
+
+from .graph import bulk_update
+
+DEFAULT_CELL_SIZE = 512  # 网格单元的边长（场景坐标）
+
+
+class GridIndex:
+    """均匀网格空间索引
+
+    每个节点只登记在其左上角所在的单元中，查询时返回与矩形相交的单元里的全部节点，
+    结果可能包含少量矩形之外的节点（同一单元内），调用方需要时自行精确过滤。
+    索引不保存节点的位置（位置在 NodeRecord 中），移动和删除时由调用方给出原来的位置。
+    插入、移动和删除都是 O(1)；节点移动但没有跨出所在单元时不需要更新任何结构。
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}  # {(cx, cy): {node_id, ...}}
+        self._count = 0
+
+    def _cell(self, x, y):
+        size = self.cell_size
+        return (math.floor(x / size), math.floor(y / size))
+
+    def insert(self, node_id, x, y):
+        cell = self._cell(x, y)
+        ids = self._cells.get(cell)
+        if ids is None:
+            self._cells[cell] = {node_id}
+        elif node_id not in ids:
+            ids.add(node_id)
+        else:
+            return
+        self._count += 1
+
+    def move(self, node_id, old_x, old_y, x, y):
+        """节点由 (old_x, old_y) 移动到 (x, y)"""
+        if self._cell(old_x, old_y) != self._cell(x, y):
+            self.remove(node_id, old_x, old_y)
+            self.insert(node_id, x, y)
+
+    def remove(self, node_id, x, y):
+        """移除位于 (x, y) 的节点"""
+        cell = self._cell(x, y)
+        ids = self._cells.get(cell)
+        if ids is None or node_id not in ids:
+            return
+        ids.discard(node_id)
+        if not ids:
+            del self._cells[cell]
+        self._count -= 1
+
+    def rebuild(self, graph):
+        """按 FlowGraph 中全部节点的当前位置重建索引"""
+        self.clear()
+        size = self.cell_size
+        floor = math.floor
+        cells = self._cells
+        with bulk_update():
+            for node_id, record in graph.nodes.items():
+                cell = (floor(record.x / size), floor(record.y / size))
+                ids = cells.get(cell)
+                if ids is None:
+                    cells[cell] = {node_id}
+                else:
+                    ids.add(node_id)
+        self._count = len(graph.nodes)
+
+    def clear(self):
+        self._cells.clear()
+        self._count = 0
+
+    def cells_in(self, left, top, right, bottom):
+        """与矩形相交的非空单元 [((cx, cy), {node_id, ...}), ...]"""
+        x0, y0 = self._cell(left, top)
+        x1, y1 = self._cell(right, bottom)
+        cells = self._cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            # 矩形覆盖的单元比非空单元还多（视图缩得很小），直接遍历非空单元
+            return [(cell, ids) for cell, ids in cells.items()
+                    if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1]
+        found = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                ids = cells.get((cx, cy))
+                if ids:
+                    found.append(((cx, cy), ids))
+        return found
+
+    def query(self, left, top, right, bottom):
+        """与矩形相交的单元中的节点 id 列表"""
+        found = []
+        for _, ids in self.cells_in(left, top, right, bottom):
+            found.extend(ids)
+        return found
+
+    def count(self, left, top, right, bottom):
+        """query() 会返回的节点数（不构造列表）"""
+        return sum(len(ids) for _, ids in self.cells_in(left, top, right, bottom))
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,379 @@
+"""流程的整体校验（与 Qt 无关）
+
+检查整个流程中的问题：
+    type_mismatch      连接两端的端口类型不兼容
+    dangling           连接的端点节点或端口不存在（例如旧版本文件中残留的连接）
+    cycle              连接使流程形成环
+    unconnected_input  节点的输入端口没有任何连接
+
+端口没有“可选”标记，所有输入端口都视为必需：刚放下、还没有连线的 Process / Output
+节点也会得到 unconnected_input 警告。
+
+FlowValidator 在全量校验之后随每次编辑增量更新：连接的类型检查结果按连接缓存，
+只在连接加入或端点的端口变化时重新计算；环的检测维护一个增量拓扑序
+（Pearce-Kelly 算法），加入连接时只调整两端之间受影响的节点。
+"""
+from .graph import bulk_update, types_compatible
+
+ERROR = 'error'
+WARNING = 'warning'
+
+PROBLEM_SEVERITY = {
+    'type_mismatch': ERROR,
+    'dangling': ERROR,
+    'cycle': ERROR,
+    'unconnected_input': WARNING,
+}
+
+PROBLEM_TEXT = {
+    'type_mismatch': "端口类型不兼容",
+    'dangling': "连接的端点不存在",
+    'cycle': "连接形成环",
+    'unconnected_input': "输入端口没有连接",
+}
+
+
+class FlowValidator:
+    """增量维护流程中的问题
+
+    edge_problems 为 {连接 id: 问题类型}，node_problems 为 {节点 id: (未连接的输入端口序号, ...)}。
+    问题状态发生变化的节点和连接记在 changed_nodes / changed_edges 中，
+    由显示方调用 take_changes() 取走后统一刷新。
+
+    active 为 False 时（模型整体替换后、第一次全量校验之前）增量接口不做任何事，
+    因为增量维护依赖全量校验得到的拓扑序。
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.edge_problems = {}
+        self.node_problems = {}
+        self.changed_nodes = set()
+        self.changed_edges = set()
+        self._checks = {}        # {连接 id: 类型检查结果（None 或问题类型）}
+        self._type_cache = {}    # {(输出端口类型, 输入端口类型): 是否兼容}
+        self._order = {}         # {节点 id: 拓扑序号}，只考虑不在 _cycle_edges 中的连接
+        self._next_order = 0
+        self._cycle_edges = set()
+        self.active = True
+
+    # ---- 全量 ----
+
+    def validate(self):
+        """重新校验整个流程，返回 summary()"""
+        with bulk_update():
+            self._validate()
+        self.active = True
+        return self.summary()
+
+    def _validate(self):
+        graph = self.graph
+        nodes = graph.nodes
+        old_edges = set(self.edge_problems)
+        old_nodes = set(self.node_problems)
+
+        # 类型检查（与 _check_edge 相同，展开以减少大流程上的函数调用）
+        checks = {}
+        problems = {}
+        successors = {}  # {节点 id: [(下游节点 id, 连接 id), ...]}，不含端点不存在的连接
+        type_cache = self._type_cache
+        for edge_id, edge in graph.edges.items():
+            source = nodes.get(edge.source)
+            target = nodes.get(edge.target)
+            problem = None
+            if source is None or target is None:
+                problem = 'dangling'
+            else:
+                source_types = source.output_types
+                target_types = target.input_types
+                if edge.source_port < len(source_types) and edge.target_port < len(target_types):
+                    key = (source_types[edge.source_port], target_types[edge.target_port])
+                    compatible = type_cache.get(key)
+                    if compatible is None:
+                        compatible = type_cache[key] = types_compatible(*key)
+                    if not compatible:
+                        problem = 'type_mismatch'
+                else:
+                    problem = 'dangling'
+            checks[edge_id] = problem
+            if problem is None:
+                successors.setdefault(edge.source, []).append((edge.target, edge_id))
+            elif problem == 'dangling':
+                problems[edge_id] = problem
+                continue
+            else:
+                problems[edge_id] = problem
+                successors.setdefault(edge.source, []).append((edge.target, edge_id))
+        self._checks = checks
+        self._full_order(successors)
+        for edge_id in self._cycle_edges:
+            problems.setdefault(edge_id, 'cycle')
+        self.edge_problems = problems
+
+        connected = graph.connected_ports()
+        self.node_problems = {}
+        for node_id, record in nodes.items():
+            if record.inputs:
+                missing = tuple(index for index in range(len(record.inputs))
+                                if (node_id, index << 1) not in connected)
+                if missing:
+                    self.node_problems[node_id] = missing
+
+        self.changed_edges |= old_edges | set(self.edge_problems)
+        self.changed_nodes |= old_nodes | set(self.node_problems)
+
+    def clear(self):
+        self.changed_edges |= set(self.edge_problems)
+        self.changed_nodes |= set(self.node_problems)
+        self.edge_problems = {}
+        self.node_problems = {}
+        self._checks.clear()
+        self._order.clear()
+        self._next_order = 0
+        self._cycle_edges.clear()
+
+    def _full_order(self, successors):
+        """求拓扑序和形成环的连接
+
+        先用 Kahn 算法排出不在环上、也不在环下游的节点；剩余的节点再做深度优先搜索，
+        回边（指向搜索栈上节点的连接）即为形成环的连接，完成顺序的逆序排在前面的节点之后。
+        """
+        in_degree = dict.fromkeys(self.graph.nodes, 0)
+        for targets in successors.values():
+            for target, _ in targets:
+                in_degree[target] += 1
+        ordered = [node_id for node_id, degree in in_degree.items() if not degree]
+        for node_id in ordered:  # 遍历过程中追加
+            for target, _ in successors.get(node_id, ()):
+                degree = in_degree[target] - 1
+                in_degree[target] = degree
+                if not degree:
+                    ordered.append(target)
+        self._order = order = dict(zip(ordered, range(len(ordered))))
+
+        cycles = set()
+        state = dict.fromkeys(ordered, 2)  # 1：在搜索栈上，2：已完成
+        finished = []
+        for root in in_degree:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(successors.get(root, ())))]
+            while stack:
+                node_id, children = stack[-1]
+                for target, edge_id in children:
+                    visited = state.get(target)
+                    if visited is None:
+                        state[target] = 1
+                        stack.append((target, iter(successors.get(target, ()))))
+                        break
+                    if visited == 1:
+                        cycles.add(edge_id)
+                else:
+                    state[node_id] = 2
+                    finished.append(node_id)
+                    stack.pop()
+        # 完成顺序的逆序即拓扑序
+        base = len(ordered)
+        count = len(finished)
+        for i, node_id in enumerate(finished):
+            order[node_id] = base + count - 1 - i
+        self._next_order = base + count
+        self._cycle_edges = cycles
+
+    # ---- 增量 ----
+
+    def node_added(self, record):
+        if not self.active:
+            return
+        self._order[record.id] = self._next_order
+        self._next_order += 1
+        self._update_node(record.id)
+
+    def node_changed(self, node_id):
+        """节点的端口发生变化：重新检查它的连接和输入端口"""
+        graph = self.graph
+        record = graph.node(node_id)
+        if record is None or not self.active:
+            return
+        for edge in graph.in_edges(node_id) + graph.out_edges(node_id):
+            old = self._checks.get(edge.id)
+            self._checks[edge.id] = check = self._check_edge(edge)
+            if old == 'dangling' and check != 'dangling':
+                # 端口补上后连接开始参与拓扑序
+                self._cycle_edges.discard(edge.id)
+                if not self._insert_order(edge):
+                    self._cycle_edges.add(edge.id)
+            elif check == 'dangling':
+                self._cycle_edges.discard(edge.id)
+            self._update_edge(edge.id)
+        self._update_node(node_id)
+
+    def edge_added(self, edge):
+        if not self.active:
+            return
+        self._checks[edge.id] = check = self._check_edge(edge)
+        if check != 'dangling' and not self._insert_order(edge):
+            self._cycle_edges.add(edge.id)
+        self._update_edge(edge.id)
+        self._update_node(edge.target)
+
+    def edge_removed(self, edge):
+        self.removed((), (edge,))
+
+    def removed(self, records, edges):
+        """节点和连接已从模型中移除（参数与 FlowGraph.remove_nodes 的返回值相同）"""
+        if not self.active:
+            return
+        retry = False
+        for edge in edges:
+            self._checks.pop(edge.id, None)
+            if edge.id in self._cycle_edges:
+                self._cycle_edges.discard(edge.id)
+            else:
+                retry = True
+            self._update_edge(edge.id)
+        for record in records:
+            self._order.pop(record.id, None)
+            self._update_node(record.id)
+        for edge in edges:
+            self._update_node(edge.target)
+        if retry and self._cycle_edges:
+            # 去掉的连接可能正是环的一部分，之前形成环的连接也许已经可以加入拓扑序
+            edges_by_id = self.graph.edges
+            for edge_id in list(self._cycle_edges):
+                edge = edges_by_id.get(edge_id)
+                if edge is None or self._insert_order(edge):
+                    self._cycle_edges.discard(edge_id)
+                    self._update_edge(edge_id)
+
+    def take_changes(self):
+        """取走问题状态发生变化的 (节点 id 集合, 连接 id 集合)"""
+        nodes, edges = self.changed_nodes, self.changed_edges
+        self.changed_nodes, self.changed_edges = set(), set()
+        return nodes, edges
+
+    # ---- 查询 ----
+
+    def node_problem(self, node_id):
+        """节点的问题 (严重程度, 说明文字)，没有问题时返回 None"""
+        missing = self.node_problems.get(node_id)
+        if not missing:
+            return None
+        record = self.graph.node(node_id)
+        names = ", ".join(record.inputs[index] for index in missing) if record is not None else ""
+        return WARNING, f"{PROBLEM_TEXT['unconnected_input']}: {names}（所有输入端口都是必需的）"
+
+    def edge_problem(self, edge_id):
+        """连接的问题 (严重程度, 说明文字)，没有问题时返回 None"""
+        problem = self.edge_problems.get(edge_id)
+        if problem is None:
+            return None
+        return PROBLEM_SEVERITY[problem], PROBLEM_TEXT[problem]
+
+    def summary(self):
+        """{问题类型: 数量}"""
+        counts = {}
+        for problem in self.edge_problems.values():
+            counts[problem] = counts.get(problem, 0) + 1
+        if self.node_problems:
+            counts['unconnected_input'] = sum(len(ports) for ports in self.node_problems.values())
+        return counts
+
+    # ---- 内部 ----
+
+    def _check_edge(self, edge):
+        nodes = self.graph.nodes
+        source = nodes.get(edge.source)
+        target = nodes.get(edge.target)
+        if source is None or target is None:
+            return 'dangling'
+        source_type = source.port_type(True, edge.source_port)
+        target_type = target.port_type(False, edge.target_port)
+        if source_type is None or target_type is None:
+            return 'dangling'
+        key = (source_type, target_type)
+        compatible = self._type_cache.get(key)
+        if compatible is None:
+            compatible = self._type_cache[key] = types_compatible(source_type, target_type)
+        return None if compatible else 'type_mismatch'
+
+    def _unconnected_inputs(self, node_id, record):
+        degree = self.graph.port_degree
+        return tuple(index for index in range(len(record.inputs)) if not degree(node_id, index << 1))
+
+    def _update_edge(self, edge_id):
+        """按缓存的检查结果和环的状态更新 edge_problems（类型问题优先于环）"""
+        problem = self._checks.get(edge_id)
+        if problem is None and edge_id in self._cycle_edges:
+            problem = 'cycle'
+        if self.edge_problems.get(edge_id) != problem:
+            if problem is None:
+                del self.edge_problems[edge_id]
+            else:
+                self.edge_problems[edge_id] = problem
+            self.changed_edges.add(edge_id)
+
+    def _update_node(self, node_id):
+        record = self.graph.node(node_id)
+        missing = self._unconnected_inputs(node_id, record) if record is not None else ()
+        if self.node_problems.get(node_id, ()) != missing:
+            if missing:
+                self.node_problems[node_id] = missing
+            else:
+                del self.node_problems[node_id]
+            self.changed_nodes.add(node_id)
+
+    def _insert_order(self, edge):
+        """把连接加入拓扑序，会形成环时返回 False（拓扑序保持不变）
+
+        Pearce-Kelly：只有 target 的序号小于 source 时才需要调整。从 target 向下游搜索
+        序号不超过 source 的节点，从 source 向上游搜索序号不小于 target 的节点，
+        再把这两组节点原来占用的序号重新分配，上游组排在前面。
+        """
+        order = self._order
+        source, target = edge.source, edge.target
+        if source == target:
+            return False
+        lower, upper = order[target], order[source]
+        if lower > upper:
+            return True
+        forward = self._affected(target, upper, True, stop=source)
+        if forward is None:
+            return False
+        backward = self._affected(source, lower, False)
+        forward.sort(key=order.__getitem__)
+        backward.sort(key=order.__getitem__)
+        moved = backward + forward
+        for node_id, slot in zip(moved, sorted(order[node_id] for node_id in moved)):
+            order[node_id] = slot
+        return True
+
+    def _affected(self, start, bound, downstream, stop=None):
+        """从 start 沿（不形成环的）连接搜索序号在 bound 以内的节点；遇到 stop 时返回 None"""
+        graph = self.graph
+        order = self._order
+        cycles = self._cycle_edges
+        checks = self._checks
+        found = [start]
+        seen = {start}
+        stack = [start]
+        while stack:
+            node_id = stack.pop()
+            edges = graph.out_edges(node_id) if downstream else graph.in_edges(node_id)
+            for edge in edges:
+                if edge.id in cycles or checks.get(edge.id) == 'dangling':
+                    continue
+                other = edge.target if downstream else edge.source
+                if other in seen:
+                    continue
+                position = order.get(other)
+                if position is None:
+                    continue
+                if other == stop:
+                    return None
+                if (position < bound) if downstream else (position > bound):
+                    seen.add(other)
+                    found.append(other)
+                    stack.append(other)
+        return found
@@ -15,3 +15,16 @@ class ProcessNode(Node):
         super().__init__(title)
         self.add_input_port("input")
         self.add_output_port("output")
+
+
+# 节点类型名称（NodeRecord.type）-> 节点类，加载流程文件等场合按类型名创建图元
+NODE_TYPES = {
+    'Input': InputNode,
+    'Output': OutputNode,
+    'Process': ProcessNode,
+}
+
+
+def node_class(node_type):
+    """类型名称对应的节点类，未知类型使用基础 Node"""
+    return NODE_TYPES.get(node_type, Node)
@@ -69,6 +69,7 @@ class PropertiesPanel(QDockWidget):
         super().__init__("Properties", parent)
         self.current_node = None
         self.property_widgets = {}
+        self.port_fields = {}  # 端口名称编辑项 {属性名: (is_output, 端口序号)}
         self.initUI()
         
     def initUI(self):
@@ -125,8 +126,10 @@ class PropertiesPanel(QDockWidget):
             # 添加端口信息
             for i, port in enumerate(node.ports_in):
                 self.add_property(f"input_{i}", port)
+                self.port_fields[f"input_{i}"] = (False, i)
             for i, port in enumerate(node.ports_out):
                 self.add_property(f"output_{i}", port)
+                self.port_fields[f"output_{i}"] = (True, i)
                 
             # 如果节点有自定义属性,也添加它们
             if hasattr(node, 'properties'):
@@ -155,28 +158,21 @@ class PropertiesPanel(QDockWidget):
             if item.widget():
                 item.widget().deleteLater()
         self.property_widgets.clear()
+        self.port_fields.clear()
         
     def _on_property_changed(self, name, value):
         """处理属性值改变"""
         if self.current_node:
             # 更新节点标题
             if name == "title":
-                self.current_node.title = value
-                self.current_node.update()
+                self.current_node.set_field("title", value)
             # 更新端口名称
-            elif name.startswith("input_"):
-                idx = int(name.split("_")[1])
-                if idx < len(self.current_node.ports_in):
-                    self.current_node.ports_in[idx] = value
-                    self.current_node.update()
-            elif name.startswith("output_"):
-                idx = int(name.split("_")[1])
-                if idx < len(self.current_node.ports_out):
-                    self.current_node.ports_out[idx] = value
-                    self.current_node.update()
+            elif name in self.port_fields:
+                is_output, idx = self.port_fields[name]
+                self.current_node.set_field(("port", is_output, idx), value)
             # 更新其他自定义属性
             elif hasattr(self.current_node, 'properties'):
-                self.current_node.properties[name] = value
+                self.current_node.set_field(("property", name), value)
                 
             # 发出属性改变信号
             self.propertyChanged.emit(name, value)
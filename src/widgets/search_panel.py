@@ -0,0 +1,84 @@
+from PySide6.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
+                             QListWidget, QListWidgetItem, QLabel, QPushButton)
+from PySide6.QtCore import Qt, Signal
+
+MAX_LISTED_RESULTS = 200  # 结果列表中最多列出的节点数（全部选中不受限制）
+
+
+class SearchPanel(QDockWidget):
+    """节点搜索面板：按标题、端口名称、端口类型和属性值查找节点
+
+    搜索由场景的 SearchIndex 完成，不遍历场景中的图元。
+    """
+    nodeActivated = Signal(int)      # 选择了某个结果（节点 id）
+    selectAllRequested = Signal(list)  # 选中全部匹配的节点（节点 id 列表）
+
+    def __init__(self, scene, parent=None):
+        super().__init__("Search", parent)
+        self.scene = scene
+        self.matches = []
+        self.initUI()
+
+    def initUI(self):
+        main_widget = QWidget()
+        layout = QVBoxLayout(main_widget)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索标题、端口或属性...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.search)
+        self.search_edit.returnPressed.connect(self.activateFirst)
+        layout.addWidget(self.search_edit)
+
+        status_layout = QHBoxLayout()
+        self.status_label = QLabel()
+        status_layout.addWidget(self.status_label, 1)
+        self.select_all_button = QPushButton("全部选中")
+        self.select_all_button.setEnabled(False)
+        self.select_all_button.clicked.connect(lambda: self.selectAllRequested.emit(self.matches))
+        status_layout.addWidget(self.select_all_button)
+        layout.addLayout(status_layout)
+
+        self.result_list = QListWidget()
+        self.result_list.itemActivated.connect(self._on_item_activated)
+        self.result_list.itemClicked.connect(self._on_item_activated)
+        layout.addWidget(self.result_list)
+
+        self.setWidget(main_widget)
+
+    def focusSearch(self):
+        """显示面板并把焦点放到搜索框"""
+        self.show()
+        self.raise_()
+        self.search_edit.setFocus()
+        self.search_edit.selectAll()
+
+    def search(self, text=None):
+        """按搜索框中的文字（或 text）更新结果列表"""
+        if text is None:
+            text = self.search_edit.text()
+        self.matches = self.scene.search_nodes(text) if text.strip() else []
+        nodes = self.scene.graph.nodes
+
+        self.result_list.clear()
+        for node_id in self.matches[:MAX_LISTED_RESULTS]:
+            record = nodes[node_id]
+            item = QListWidgetItem(f"{record.title}  ({record.type} #{node_id})")
+            item.setData(Qt.UserRole, node_id)
+            self.result_list.addItem(item)
+
+        count = len(self.matches)
+        if not text.strip():
+            self.status_label.clear()
+        elif count > MAX_LISTED_RESULTS:
+            self.status_label.setText(f"{count} 个匹配，列出前 {MAX_LISTED_RESULTS} 个")
+        else:
+            self.status_label.setText(f"{count} 个匹配")
+        self.select_all_button.setEnabled(bool(count))
+
+    def activateFirst(self):
+        if self.matches:
+            self.nodeActivated.emit(self.matches[0])
+
+    def _on_item_activated(self, item):
+        self.nodeActivated.emit(item.data(Qt.UserRole))